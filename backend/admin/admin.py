@@ -1,7 +1,22 @@
+import io
+
 from flask import Blueprint, request, jsonify
-from werkzeug.security import generate_password_hash
-from common.db import db_cursor, db_conn
-from common.requireRole import require_role
+from common.db import db_cursor, db_conn, read_only
+from common.requireRole import require_role, lock_user, unlock_user, revoke_user_tokens
+from common.cache import dashboard_cache, invalidate_dashboard
+from common.ledger import apply_balance_delta
+from common.serialize import RowSerializer, list_payload, wants_columns
+from common.search import MAX_SEARCH_PAGE, build_user_search, normalize_name
+from common.passwords import HashQueueFull, hash_password
+from common.user_import import (
+    IMPORT_CHUNK_SIZE, IMPORT_FORMATS, IMPORT_MAX_CHUNK, ImportFormatError, import_users, read_rows
+)
+from common.interest import clear_rate_schedules
+from common.refdata import get_products, get_products_by_id, get_configs, products_cache, configs_cache
+from common.pagination import (
+    DEFAULT_LIMIT, CursorError, parse_page_args, wants_stream, keyset_clause, keyset_params,
+    fetch_page, stream_ndjson
+)
 
 admin_bp = Blueprint('admin', __name__)
 
@@ -10,55 +25,75 @@ admin_bp = Blueprint('admin', __name__)
 #  1. DASHBOARD - THỐNG KÊ TỔNG QUAN
 # ============================================================
 
+# Các truy vấn tổng hợp của Dashboard (ASGI chạy song song từng câu, Flask gộp trong một lần)
+DASHBOARD_QUERIES = (
+    """
+        SELECT COALESCE(SUM(role = 'CUSTOMER'), 0), COALESCE(SUM(role = 'STAFF'), 0),
+               COALESCE(SUM(role = 'ADMIN'), 0), COALESCE(SUM(status = 'LOCKED'), 0)
+        FROM users
+    """,
+    """
+        SELECT COUNT(*), COALESCE(SUM(principal_balance), 0)
+        FROM savings_accounts WHERE status = 'ACTIVE'
+    """,
+    "SELECT COUNT(*) FROM transactions WHERE status = 'PENDING'",
+    "SELECT COUNT(*) FROM savings_products WHERE is_active = TRUE",
+)
+
+
+def _load_dashboard_stats():
+    """Tính toàn bộ số liệu Dashboard trong một lần truy vấn."""
+    db_cursor.execute("""
+        SELECT u.total_customers, u.total_staff, u.total_admins, u.locked_accounts,
+               s.active_savings, s.total_savings_amount,
+               t.pending_transactions, p.active_products
+        FROM (
+            SELECT COALESCE(SUM(role = 'CUSTOMER'), 0) AS total_customers,
+                   COALESCE(SUM(role = 'STAFF'), 0)    AS total_staff,
+                   COALESCE(SUM(role = 'ADMIN'), 0)    AS total_admins,
+                   COALESCE(SUM(status = 'LOCKED'), 0) AS locked_accounts
+            FROM users
+        ) u
+        CROSS JOIN (
+            SELECT COUNT(*) AS active_savings,
+                   COALESCE(SUM(principal_balance), 0) AS total_savings_amount
+            FROM savings_accounts WHERE status = 'ACTIVE'
+        ) s
+        CROSS JOIN (
+            SELECT COUNT(*) AS pending_transactions FROM transactions WHERE status = 'PENDING'
+        ) t
+        CROSS JOIN (
+            SELECT COUNT(*) AS active_products FROM savings_products WHERE is_active = TRUE
+        ) p
+    """)
+    return dashboard_stats(db_cursor.fetchone())
+
+
+def dashboard_stats(row):
+    """Chuyển dòng (customers, staff, admins, locked, active_savings, savings_amount, pending, products) thành dict."""
+    return {
+        'total_customers': int(row[0]),
+        'total_staff': int(row[1]),
+        'total_admins': int(row[2]),
+        'active_savings_accounts': int(row[4]),
+        'total_savings_amount': float(row[5]),
+        'pending_transactions': int(row[6]),
+        'active_products': int(row[7]),
+        'locked_accounts': int(row[3])
+    }
+
+
 @admin_bp.route('/api/admin/dashboard', methods=['GET'])
 @require_role(['ADMIN'])
+@read_only
 def admin_dashboard():
-    """Lấy thống kê tổng quan cho Admin Dashboard."""
+    """Lấy thống kê tổng quan cho Admin Dashboard (cache ngắn hạn trong bộ nhớ)."""
     try:
-        # Tổng số khách hàng
-        db_cursor.execute("SELECT COUNT(*) FROM users WHERE role = 'CUSTOMER'")
-        total_customers = db_cursor.fetchone()[0]
-
-        # Tổng số nhân viên
-        db_cursor.execute("SELECT COUNT(*) FROM users WHERE role = 'STAFF'")
-        total_staff = db_cursor.fetchone()[0]
-
-        # Tổng số admin
-        db_cursor.execute("SELECT COUNT(*) FROM users WHERE role = 'ADMIN'")
-        total_admins = db_cursor.fetchone()[0]
-
-        # Tổng số sổ tiết kiệm đang hoạt động
-        db_cursor.execute("SELECT COUNT(*) FROM savings_accounts WHERE status = 'ACTIVE'")
-        active_savings = db_cursor.fetchone()[0]
-
-        # Tổng tiền gốc đang gửi tiết kiệm
-        db_cursor.execute("SELECT COALESCE(SUM(principal_balance), 0) FROM savings_accounts WHERE status = 'ACTIVE'")
-        total_savings_amount = float(db_cursor.fetchone()[0])
-
-        # Tổng số giao dịch đang chờ duyệt
-        db_cursor.execute("SELECT COUNT(*) FROM transactions WHERE status = 'PENDING'")
-        pending_transactions = db_cursor.fetchone()[0]
-
-        # Số gói tiết kiệm đang hoạt động
-        db_cursor.execute("SELECT COUNT(*) FROM savings_products WHERE is_active = TRUE")
-        active_products = db_cursor.fetchone()[0]
-
-        # Tổng số tài khoản bị khóa
-        db_cursor.execute("SELECT COUNT(*) FROM users WHERE status = 'LOCKED'")
-        locked_accounts = db_cursor.fetchone()[0]
+        stats = dashboard_cache.get_or_set('stats', _load_dashboard_stats)
 
         return jsonify({
             'message': 'Thống kê tổng quan',
-            'data': {
-                'total_customers': total_customers,
-                'total_staff': total_staff,
-                'total_admins': total_admins,
-                'active_savings_accounts': active_savings,
-                'total_savings_amount': total_savings_amount,
-                'pending_transactions': pending_transactions,
-                'active_products': active_products,
-                'locked_accounts': locked_accounts
-            }
+            'data': stats
         }), 200
     except Exception as e:
         return jsonify({'message': 'Lỗi server!', 'error': str(e)}), 500
@@ -68,14 +103,20 @@ def admin_dashboard():
 #  2. QUẢN LÝ NGƯỜI DÙNG (USER MANAGEMENT)
 # ============================================================
 
-@admin_bp.route('/api/admin/users', methods=['GET'])
-@require_role(['ADMIN'])
-def get_all_users():
-    """Lấy danh sách tất cả người dùng, hỗ trợ filter theo role và status."""
-    role_filter = request.args.get('role')       # VD: ?role=STAFF
-    status_filter = request.args.get('status')   # VD: ?status=ACTIVE
-    search = request.args.get('search')          # VD: ?search=Nguyen
+USER_ROW = RowSerializer([
+    ('user_id',        'int'),
+    ('email',          'str'),
+    ('full_name',      'str'),
+    ('identity_card',  'str'),
+    ('role',           'str'),
+    ('wallet_balance', 'money'),
+    ('status',         'str'),
+    ('created_at',     'datetime'),
+])
+
 
+def users_query(role_filter, status_filter):
+    """Phần SELECT ... WHERE của danh sách người dùng (chưa có keyset/ORDER BY)."""
     query = """
         SELECT user_id, email, full_name, identity_card, role,
                wallet_balance, status, created_at
@@ -91,42 +132,104 @@ def get_all_users():
     if status_filter:
         query += " AND status = %s"
         params.append(status_filter)
+    return query, params
+
+
+def users_page_query(role_filter, status_filter, after):
+    """Danh sách người dùng phân trang keyset (created_at DESC, user_id DESC)."""
+    query, params = users_query(role_filter, status_filter)
+    if after:
+        query += keyset_clause('created_at', 'user_id')
+        params.extend(keyset_params(after))
+    query += " ORDER BY created_at DESC, user_id DESC"
+    return query, params
+
+
+def users_search_query(role_filter, status_filter, plan):
+    """Tìm kiếm người dùng theo kế hoạch của build_user_search (chưa có LIMIT/OFFSET)."""
+    query, params = users_query(role_filter, status_filter)
+    where_sql, where_params, order_sql, order_params = plan
+    return query + where_sql + order_sql, params + where_params + order_params
+
+
+def user_savings_accounts_query(user_id):
+    return """
+        SELECT account_id, product_id, principal_balance, opened_at, status
+        FROM savings_accounts
+        WHERE user_id = %s
+        ORDER BY opened_at DESC
+    """, [user_id]
+
+
+@admin_bp.route('/api/admin/users', methods=['GET'])
+@require_role(['ADMIN'])
+@read_only
+def get_all_users():
+    """Lấy danh sách người dùng (phân trang keyset), hỗ trợ filter theo role, status và tìm kiếm."""
+    role_filter = request.args.get('role')       # VD: ?role=STAFF
+    status_filter = request.args.get('status')   # VD: ?status=ACTIVE
+    search = request.args.get('search')          # VD: ?search=Nguyen
+    streaming = wants_stream(request.args)       # VD: ?format=ndjson
+
+    try:
+        after, limit = parse_page_args(request.args, streaming)
+    except CursorError as e:
+        return jsonify({'message': str(e)}), 400
 
     if search:
-        query += " AND (full_name LIKE %s OR email LIKE %s OR identity_card LIKE %s)"
-        like_pattern = f"%{search}%"
-        params.extend([like_pattern, like_pattern, like_pattern])
+        return _search_users(role_filter, status_filter, search, limit)
+
+    query, params = users_page_query(role_filter, status_filter, after)
 
-    query += " ORDER BY created_at DESC"
+    if streaming:
+        return stream_ndjson(query, params, limit, USER_ROW.to_dict, 'created_at', 'user_id')
+
+    columnar = wants_columns(request.args)
+    to_row, sort_key, id_key = USER_ROW.page_args(columnar, 'created_at', 'user_id')
+    try:
+        users, next_cursor = fetch_page(db_cursor, query, params, limit, to_row, sort_key, id_key)
+        return jsonify(list_payload('Danh sách người dùng', 'users', users,
+                                    USER_ROW, columnar, next_cursor=next_cursor)), 200
+    except Exception as e:
+        return jsonify({'message': 'Lỗi server!', 'error': str(e)}), 500
+
+
+def _search_users(role_filter, status_filter, search, limit):
+    """Tìm kiếm người dùng, kết quả xếp hạng theo độ liên quan, phân trang bằng ?page=."""
+    try:
+        page = int(request.args.get('page', 1))
+    except ValueError:
+        return jsonify({'message': 'Tham số page phải là số nguyên!'}), 400
+    if not 1 <= page <= MAX_SEARCH_PAGE:
+        return jsonify({'message': f'Tham số page phải từ 1 đến {MAX_SEARCH_PAGE}!'}), 400
+
+    limit = limit or DEFAULT_LIMIT
+    plan = build_user_search(search)
+    if plan is None:
+        return jsonify({'message': 'Từ khóa tìm kiếm không hợp lệ!'}), 400
+
+    query, params = users_search_query(role_filter, status_filter, plan)
+    query += " LIMIT %s OFFSET %s"
+    params += [limit + 1, (page - 1) * limit]
 
     try:
         db_cursor.execute(query, tuple(params))
         rows = db_cursor.fetchall()
-
-        users = [
-            {
-                'user_id': row[0],
-                'email': row[1],
-                'full_name': row[2],
-                'identity_card': row[3],
-                'role': row[4],
-                'wallet_balance': float(row[5]),
-                'status': row[6],
-                'created_at': str(row[7])
-            }
-            for row in rows
-        ]
-        return jsonify({
-            'message': 'Danh sách người dùng',
-            'total': len(users),
-            'users': users
-        }), 200
+        columnar = wants_columns(request.args)
+        to_row = USER_ROW.to_list if columnar else USER_ROW.to_dict
+        users = [to_row(row) for row in rows[:limit]]
+        return jsonify(list_payload(
+            'Kết quả tìm kiếm người dùng', 'users', users, USER_ROW, columnar,
+            page=page,
+            next_page=page + 1 if len(rows) > limit and page < MAX_SEARCH_PAGE else None
+        )), 200
     except Exception as e:
         return jsonify({'message': 'Lỗi server!', 'error': str(e)}), 500
 
 
 @admin_bp.route('/api/admin/users/<int:user_id>', methods=['GET'])
 @require_role(['ADMIN'])
+@read_only
 def get_user_detail(user_id):
     """Xem chi tiết thông tin một người dùng."""
     try:
@@ -140,33 +243,19 @@ def get_user_detail(user_id):
         if not row:
             return jsonify({'message': 'Không tìm thấy người dùng!'}), 404
 
-        user = {
-            'user_id': row[0],
-            'email': row[1],
-            'full_name': row[2],
-            'identity_card': row[3],
-            'role': row[4],
-            'wallet_balance': float(row[5]),
-            'status': row[6],
-            'created_at': str(row[7])
-        }
+        user = USER_ROW.to_dict(row)
 
         # Lấy thêm danh sách sổ tiết kiệm của user này
-        db_cursor.execute("""
-            SELECT s.account_id, p.name AS product_name, s.principal_balance,
-                   s.opened_at, s.status
-            FROM savings_accounts s
-            JOIN savings_products p ON s.product_id = p.product_id
-            WHERE s.user_id = %s
-            ORDER BY s.opened_at DESC
-        """, (user_id,))
+        query, params = user_savings_accounts_query(user_id)
+        db_cursor.execute(query, tuple(params))
         savings_rows = db_cursor.fetchall()
 
+        products = get_products_by_id()
         user['savings_accounts'] = [
             {
                 'account_id': sr[0],
-                'product_name': sr[1],
-                'principal_balance': float(sr[2]),
+                'product_name': products.get(sr[1], {}).get('name'),
+                'principal_balance': str(sr[2]),
                 'opened_at': str(sr[3]),
                 'status': sr[4]
             }
@@ -200,13 +289,17 @@ def create_user():
     if role not in ('CUSTOMER', 'STAFF', 'ADMIN'):
         return jsonify({'message': 'Role không hợp lệ! Chỉ chấp nhận: CUSTOMER, STAFF, ADMIN'}), 400
 
-    hashed_password = generate_password_hash(password, method='pbkdf2:sha256')
+    try:
+        hashed_password = hash_password(password)
+    except HashQueueFull as e:
+        return jsonify({'message': str(e)}), 503, {'Retry-After': '1'}
 
     try:
-        sql = """INSERT INTO users (email, password_hash, full_name, identity_card, role)
-                 VALUES (%s, %s, %s, %s, %s)"""
-        db_cursor.execute(sql, (email, hashed_password, full_name, identity_card, role))
+        sql = """INSERT INTO users (email, password_hash, full_name, full_name_search, identity_card, role)
+                 VALUES (%s, %s, %s, %s, %s, %s)"""
+        db_cursor.execute(sql, (email, hashed_password, full_name, normalize_name(full_name), identity_card, role))
         db_conn.commit()
+        invalidate_dashboard()
 
         return jsonify({
             'message': f'Tạo tài khoản {role} thành công!',
@@ -217,6 +310,32 @@ def create_user():
         return jsonify({'message': 'Email hoặc CMND/CCCD đã tồn tại!', 'error': str(e)}), 400
 
 
+@admin_bp.route('/api/admin/users/import', methods=['POST'])
+@require_role(['ADMIN'])
+def import_users_api():
+    """Nhập hàng loạt người dùng từ body CSV/NDJSON (đọc dần, không nạp cả file vào bộ nhớ)."""
+    fmt = request.args.get('format') or ('ndjson' if request.mimetype == 'application/x-ndjson' else 'csv')
+    if fmt not in IMPORT_FORMATS:
+        return jsonify({'message': 'Định dạng không hợp lệ! Chỉ chấp nhận: csv, ndjson'}), 400
+
+    chunk_size = request.args.get('chunk_size', IMPORT_CHUNK_SIZE, type=int)
+    if chunk_size is None or not 1 <= chunk_size <= IMPORT_MAX_CHUNK:
+        return jsonify({'message': f'chunk_size phải từ 1 đến {IMPORT_MAX_CHUNK}!'}), 400
+
+    stream = io.TextIOWrapper(request.stream, encoding='utf-8-sig', newline='')
+    try:
+        report = import_users(db_conn, read_rows(stream, fmt), chunk_size)
+        return jsonify({'message': 'Đã nhập danh sách người dùng', **report}), 200
+    except ImportFormatError as e:
+        return jsonify({'message': str(e)}), 400
+    except HashQueueFull as e:
+        # Các lô trước đó đã commit; gửi lại file sẽ bỏ qua các dòng đã nhập (báo trùng email)
+        return jsonify({'message': str(e)}), 503, {'Retry-After': '5'}
+    except Exception as e:
+        db_conn.rollback()
+        return jsonify({'message': 'Lỗi server!', 'error': str(e)}), 500
+
+
 @admin_bp.route('/api/admin/users/<int:user_id>/role', methods=['PUT'])
 @require_role(['ADMIN'])
 def change_user_role(user_id):
@@ -232,18 +351,34 @@ def change_user_role(user_id):
         return jsonify({'message': 'Không thể thay đổi role của chính mình!'}), 400
 
     try:
-        db_cursor.execute("SELECT user_id, role FROM users WHERE user_id = %s", (user_id,))
+        # Khóa dòng user: số dư ví không đổi (do duyệt phiếu song song) trước khi cộng/trừ vào tổng hệ thống
+        db_cursor.execute(
+            "SELECT user_id, role, wallet_balance, token_version FROM users WHERE user_id = %s FOR UPDATE",
+            (user_id,)
+        )
         user = db_cursor.fetchone()
 
         if not user:
+            db_conn.rollback()
             return jsonify({'message': 'Không tìm thấy người dùng!'}), 404
 
         old_role = user[1]
         if old_role == new_role:
+            db_conn.rollback()
             return jsonify({'message': f'Người dùng đã có role {new_role} rồi!'}), 400
 
-        db_cursor.execute("UPDATE users SET role = %s WHERE user_id = %s", (new_role, user_id))
+        # Tăng token_version cùng transaction: token cấp trước lần đổi này đều hết hiệu lực
+        db_cursor.execute("UPDATE users SET role = %s, token_version = token_version + 1 WHERE user_id = %s",
+                          (new_role, user_id))
+
+        # Ví của user chuyển vào/ra khỏi tổng ví khách hàng của hệ thống
+        if old_role == 'CUSTOMER':
+            apply_balance_delta(db_cursor, wallet_delta=-(user[2] or 0))
+        elif new_role == 'CUSTOMER':
+            apply_balance_delta(db_cursor, wallet_delta=user[2] or 0)
         db_conn.commit()
+        invalidate_dashboard()
+        revoke_user_tokens(user_id, user[3] + 1)   # Token cũ mang role cũ -> buộc đăng nhập lại
 
         return jsonify({
             'message': f'Đã thay đổi role từ {old_role} sang {new_role}!',
@@ -283,6 +418,13 @@ def toggle_user_status(user_id):
 
         db_cursor.execute("UPDATE users SET status = %s WHERE user_id = %s", (new_status, user_id))
         db_conn.commit()
+        invalidate_dashboard()
+
+        # Có hiệu lực ngay với các token đang dùng
+        if new_status == 'LOCKED':
+            lock_user(user_id)
+        else:
+            unlock_user(user_id)
 
         action = 'Khóa' if new_status == 'LOCKED' else 'Mở khóa'
         return jsonify({
@@ -305,25 +447,9 @@ def toggle_user_status(user_id):
 def get_all_products():
     """Lấy danh sách tất cả gói tiết kiệm (kể cả đã tắt)."""
     try:
-        db_cursor.execute("""
-            SELECT product_id, name, term_months, interest_rate,
-                   min_days_hold, is_active, description
-            FROM savings_products
-            ORDER BY term_months ASC
-        """)
-        rows = db_cursor.fetchall()
-
         products = [
-            {
-                'product_id': row[0],
-                'name': row[1],
-                'term_months': row[2],
-                'interest_rate': float(row[3]),
-                'min_days_hold': row[4],
-                'is_active': bool(row[5]),
-                'description': row[6]
-            }
-            for row in rows
+            dict(p, interest_rate=float(p['interest_rate']))
+            for p in get_products()
         ]
         return jsonify({
             'message': 'Danh sách gói tiết kiệm',
@@ -360,11 +486,16 @@ def create_product():
         sql = """INSERT INTO savings_products (name, term_months, interest_rate, min_days_hold, description)
                  VALUES (%s, %s, %s, %s, %s)"""
         db_cursor.execute(sql, (name, term_months, interest_rate, min_days_hold, description))
+        product_id = db_cursor.lastrowid    # Đọc trước khi bump() chạy câu lệnh khác trên cùng cursor
+        products_cache.bump(db_cursor)
         db_conn.commit()
+        products_cache.invalidate()
+        clear_rate_schedules()
+        invalidate_dashboard()
 
         return jsonify({
             'message': 'Thêm gói tiết kiệm thành công!',
-            'product_id': db_cursor.lastrowid
+            'product_id': product_id
         }), 201
     except Exception as e:
         db_conn.rollback()
@@ -399,7 +530,11 @@ def update_product(product_id):
         values.append(product_id)
         sql = f"UPDATE savings_products SET {', '.join(set_clauses)} WHERE product_id = %s"
         db_cursor.execute(sql, tuple(values))
+        products_cache.bump(db_cursor)
         db_conn.commit()
+        products_cache.invalidate()
+        clear_rate_schedules()
+        invalidate_dashboard()
 
         return jsonify({
             'message': 'Cập nhật gói tiết kiệm thành công!',
@@ -423,7 +558,11 @@ def toggle_product(product_id):
 
         new_active = not bool(row[1])
         db_cursor.execute("UPDATE savings_products SET is_active = %s WHERE product_id = %s", (new_active, product_id))
+        products_cache.bump(db_cursor)
         db_conn.commit()
+        products_cache.invalidate()
+        clear_rate_schedules()
+        invalidate_dashboard()
 
         status_text = 'Bật' if new_active else 'Tắt'
         return jsonify({
@@ -445,17 +584,7 @@ def toggle_product(product_id):
 def get_all_configs():
     """Lấy tất cả tham số cấu hình hệ thống."""
     try:
-        db_cursor.execute("SELECT config_key, config_value, description FROM system_configs ORDER BY config_key")
-        rows = db_cursor.fetchall()
-
-        configs = [
-            {
-                'config_key': row[0],
-                'config_value': row[1],
-                'description': row[2]
-            }
-            for row in rows
-        ]
+        configs = get_configs()
         return jsonify({
             'message': 'Danh sách tham số hệ thống',
             'total': len(configs),
@@ -493,7 +622,9 @@ def update_config(config_key):
                 (str(new_value), config_key)
             )
 
+        configs_cache.bump(db_cursor)
         db_conn.commit()
+        configs_cache.invalidate()
 
         return jsonify({
             'message': f'Cập nhật tham số {config_key} thành công!',
@@ -521,7 +652,9 @@ def create_config():
     try:
         sql = "INSERT INTO system_configs (config_key, config_value, description) VALUES (%s, %s, %s)"
         db_cursor.execute(sql, (config_key, str(config_value), description))
+        configs_cache.bump(db_cursor)
         db_conn.commit()
+        configs_cache.invalidate()
 
         return jsonify({
             'message': 'Thêm tham số hệ thống thành công!',
@@ -542,7 +675,9 @@ def delete_config(config_key):
             return jsonify({'message': f'Không tìm thấy tham số: {config_key}'}), 404
 
         db_cursor.execute("DELETE FROM system_configs WHERE config_key = %s", (config_key,))
+        configs_cache.bump(db_cursor)
         db_conn.commit()
+        configs_cache.invalidate()
 
         return jsonify({'message': f'Đã xóa tham số {config_key}!'}), 200
     except Exception as e:
@@ -1,18 +1,43 @@
+import os
+
 from flask import Flask, jsonify
 from flask_cors import CORS
 from common.auth import auth_bp
-from transactions import transactions_bp
+from staff.staff import transactions_bp
 from admin.admin import admin_bp
+from reports.reports import reports_bp
+from jobs.jobs import jobs_bp
+from customer.customer import customer_bp
+from common.health import health_bp
+from common import db, metrics, serialize
+import commands
 
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=[db.LAST_WRITE_HEADER])    # Client gửi lại mốc ghi cuối (read-your-writes)
 
 app.config['SECRET_KEY'] = 'mot_chuoi_bi_mat_rat_dai_va_kho_doan'
 
+# Mỗi request lấy kết nối riêng từ pool và trả lại khi kết thúc
+db.init_app(app)
+
+# jsonify dùng orjson nếu đã cài (JSON_BACKEND=json để tắt)
+serialize.init_app(app)
+
+# Đo thời gian theo route / câu lệnh SQL, xem tại /api/metrics (định dạng Prometheus,
+# cần Bearer METRICS_TOKEN hoặc JWT của ADMIN; số liệu cộng gộp mọi worker)
+metrics.init_app(app)
+
+# Lệnh quản trị: flask --app app <reconcile-balances | db-upgrade | explain-check | accrue-interest | refresh-rollups | import-users | export-data | run-jobs>
+commands.init_app(app)
+
 # Đăng ký các Blueprint
 app.register_blueprint(auth_bp)
 app.register_blueprint(transactions_bp)
 app.register_blueprint(admin_bp)
+app.register_blueprint(reports_bp)
+app.register_blueprint(jobs_bp)
+app.register_blueprint(customer_bp)
+app.register_blueprint(health_bp)
 
 
 @app.route('/api/ping', methods=['GET'])
@@ -20,5 +45,10 @@ def ping():
     return jsonify({'message': 'pong 🏓 – Server đang chạy!'}), 200
 
 
+# Chạy production (nhiều worker, reload không gián đoạn): gunicorn -c gunicorn.conf.py
 if __name__ == '__main__':
+    # Chế độ dev: runner job nền chạy chung tiến trình (chỉ ở tiến trình con của reloader)
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        from common.jobs import start_runner_thread
+        start_runner_thread(app)
     app.run(debug=True, port=5000)
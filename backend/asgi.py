@@ -0,0 +1,201 @@
+"""Chế độ chạy ASGI: các endpoint đọc nhiều chạy async trên aiomysql, phần còn lại do Flask xử lý.
+
+    cd backend
+    uvicorn asgi:app --host 0.0.0.0 --port 5000
+
+Các route async: /api/transactions, /api/users, /api/savings-accounts, /api/admin/users,
+/api/admin/dashboard, /api/balance-system (trừ ?format=ndjson và ?search= – chuyển cho Flask).
+Mọi route khác được chuyển nguyên vẹn cho app Flask (chạy trong thread pool qua a2wsgi).
+Các route async đọc từ read replica (DB_REPLICAS) như @read_only bên Flask, trừ khi user vừa ghi.
+Job nền không chạy trong tiến trình uvicorn: chạy kèm runner `flask --app app run-jobs`.
+"""
+import asyncio
+import contextlib
+
+import jwt
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Mount, Route
+
+from app import app as flask_app
+from admin.admin import DASHBOARD_QUERIES, USER_ROW, dashboard_stats, users_page_query
+from staff.staff import (
+    CUSTOMER_ROW, TRANSACTION_ROW, customers_query, savings_account_row, savings_accounts_query,
+    transactions_query
+)
+from common import aiodb
+from common.cache import dashboard_cache
+from common.db import LAST_WRITE_COOKIE, LAST_WRITE_HEADER, recently_wrote
+from common.health import warm_up
+from common.ledger import BALANCE_SLOTS, BALANCES_QUERY
+from common.pagination import CursorError, parse_page_args
+from common.refdata import get_products_by_id
+from common.requireRole import check_revoked, verify_token
+from common.serialize import dumps, list_payload, wants_columns
+
+WSGI_THREADS = 32   # Số luồng xử lý các route Flask
+
+flask_asgi = WSGIMiddleware(flask_app, workers=WSGI_THREADS)
+
+
+class JSONResponse(Response):
+    media_type = 'application/json'
+
+    def render(self, content):
+        return dumps(content).encode('utf-8')
+
+
+def _error(message, code, **extra):
+    return JSONResponse({'message': message, **extra}, status_code=code)
+
+
+def authorize(request, allowed_roles):
+    """Giống require_role: trả về (payload, None) hoặc (None, response lỗi)."""
+    auth_header = request.headers.get('Authorization')
+    if not auth_header or not auth_header.startswith('Bearer '):
+        return None, _error('Thiếu token hoặc sai định dạng!', 401)
+    try:
+        payload = verify_token(auth_header[7:], flask_app.config['SECRET_KEY'])
+    except jwt.ExpiredSignatureError:
+        return None, _error('Token đã hết hạn, vui lòng đăng nhập lại!', 401)
+    except jwt.InvalidTokenError:
+        return None, _error('Token không hợp lệ!', 401)
+
+    revoked = check_revoked(payload)
+    if revoked:
+        message, code = revoked
+        return None, _error(message, code)
+    if payload.get('role') not in allowed_roles:
+        return None, _error('Cấm truy cập: Bạn không đủ quyền!', 403)
+    return payload, None
+
+
+def _in_app_context(fn):
+    with flask_app.app_context():
+        return fn()
+
+
+async def run_sync(fn):
+    """Gọi hàm đồng bộ cần app context Flask (VD: cache gói tiết kiệm) trong thread riêng."""
+    return await asyncio.to_thread(_in_app_context, fn)
+
+
+def async_route(handler, roles, fallback=None):
+    """Tạo endpoint ASGI: kiểm tra quyền rồi gọi handler; chuyển cho Flask khi fallback(request) đúng."""
+    async def endpoint(scope, receive, send):
+        request = Request(scope, receive)
+        if fallback and fallback(request):
+            await flask_asgi(scope, receive, send)
+            return
+        payload, error = authorize(request, roles)
+        if error is None:
+            # Giống @read_only: đọc từ replica trừ khi user vừa ghi (mốc ghi cuối do Flask trả về)
+            token = request.headers.get(LAST_WRITE_HEADER) or request.cookies.get(LAST_WRITE_COOKIE)
+            if recently_wrote(token, payload.get('user_id'), flask_app.config['SECRET_KEY']):
+                aiodb.use_primary()
+            try:
+                response = await handler(request)
+            except CursorError as e:
+                response = _error(str(e), 400)
+            except Exception as e:
+                response = _error('Lỗi server!', 500, error=str(e))
+        else:
+            response = error
+        await response(scope, receive, send)
+    return endpoint
+
+
+def _streaming(request):
+    return request.query_params.get('format') == 'ndjson'
+
+
+async def _list(request, query, params, limit, serializer, sort_field, id_field, message, key):
+    columnar = wants_columns(request.query_params)
+    to_row, sort_key, id_key = serializer.page_args(columnar, sort_field, id_field)
+    items, next_cursor = await aiodb.fetch_page(query, params, limit, to_row, sort_key, id_key)
+    return JSONResponse(list_payload(message, key, items, serializer, columnar, next_cursor=next_cursor))
+
+
+async def list_transactions(request):
+    after, limit = parse_page_args(request.query_params)
+    query, params = transactions_query(request.query_params.get('status'), after)
+    return await _list(request, query, params, limit, TRANSACTION_ROW, 'created_at', 'transaction_id',
+                       'Danh sách lịch sử giao dịch', 'transactions')
+
+
+async def list_customers(request):
+    after, limit = parse_page_args(request.query_params)
+    query, params = customers_query(after)
+    return await _list(request, query, params, limit, CUSTOMER_ROW, 'created_at', 'user_id',
+                       'Danh sách khách hàng', 'users')
+
+
+async def list_savings_accounts(request):
+    after, limit = parse_page_args(request.query_params)
+    query, params = savings_accounts_query(after)
+    serializer = savings_account_row(await run_sync(get_products_by_id))
+    return await _list(request, query, params, limit, serializer, 'opened_at', 'account_id',
+                       'Danh sách sổ tiết kiệm', 'accounts')
+
+
+async def list_users(request):
+    after, limit = parse_page_args(request.query_params)
+    query, params = users_page_query(request.query_params.get('role'), request.query_params.get('status'), after)
+    return await _list(request, query, params, limit, USER_ROW, 'created_at', 'user_id',
+                       'Danh sách người dùng', 'users')
+
+
+async def _load_dashboard_stats():
+    # Bốn truy vấn tổng hợp độc lập chạy song song trên các kết nối khác nhau
+    users, savings, pending, products = await asyncio.gather(
+        *(aiodb.fetchone(query) for query in DASHBOARD_QUERIES)
+    )
+    return dashboard_stats(tuple(users) + tuple(savings) + tuple(pending) + tuple(products))
+
+
+async def admin_dashboard(request):
+    stats = dashboard_cache.get('stats')
+    if stats is None:
+        stats = await _load_dashboard_stats()
+        dashboard_cache.set('stats', stats)
+    return JSONResponse({'message': 'Thống kê tổng quan', 'data': stats})
+
+
+async def system_balance(request):
+    row = await aiodb.fetchone(BALANCES_QUERY, (BALANCE_SLOTS,))
+    total_wallet, total_savings = row if row and row[0] is not None else (0.0, 0.0)
+    return JSONResponse({
+        'message': 'Cân đối hệ thống',
+        'total_wallet_balance': float(total_wallet),
+        'total_savings_principal': float(total_savings)
+    })
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    await aiodb.init_pool()
+    await asyncio.to_thread(warm_up, flask_app)
+    yield
+    await aiodb.close_pool()
+
+
+STAFF_ROLES = ['STAFF', 'ADMIN']
+
+app = Starlette(
+    routes=[
+        Route('/api/transactions', async_route(list_transactions, STAFF_ROLES, _streaming), methods=['GET']),
+        Route('/api/users', async_route(list_customers, STAFF_ROLES, _streaming), methods=['GET']),
+        Route('/api/savings-accounts', async_route(list_savings_accounts, STAFF_ROLES, _streaming),
+              methods=['GET']),
+        Route('/api/admin/users',
+              async_route(list_users, ['ADMIN'],
+                          lambda r: _streaming(r) or bool(r.query_params.get('search'))),
+              methods=['GET']),
+        Route('/api/admin/dashboard', async_route(admin_dashboard, ['ADMIN']), methods=['GET']),
+        Route('/api/balance-system', async_route(system_balance, STAFF_ROLES), methods=['GET']),
+        Mount('/', app=flask_asgi),
+    ],
+    lifespan=lifespan,
+)
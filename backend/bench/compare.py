@@ -0,0 +1,70 @@
+"""So sánh hai file kết quả của bench.run, báo lỗi (exit 1) nếu có kịch bản chậm đi.
+
+    python -m bench.compare bench/results/base.json bench/results/new.json --threshold 10
+"""
+import argparse
+import json
+import sys
+
+# (chỉ số, True nếu lớn hơn là tệ hơn)
+METRICS = [
+    ('p50_ms', True),
+    ('p95_ms', True),
+    ('p99_ms', True),
+    ('throughput_rps', False),
+]
+
+
+def load(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def compare(baseline, candidate, threshold):
+    """Trả về (các dòng báo cáo, danh sách hồi quy)."""
+    lines, regressions = [], []
+    for name, base in baseline['scenarios'].items():
+        new = candidate['scenarios'].get(name)
+        if new is None:
+            lines.append(f'{name}: không có trong kết quả mới')
+            continue
+        for metric, higher_is_worse in METRICS:
+            old_value, new_value = base.get(metric), new.get(metric)
+            if not old_value or new_value is None:
+                continue
+            change = (new_value - old_value) / old_value * 100
+            worse = change > threshold if higher_is_worse else change < -threshold
+            flag = '  <-- HỒI QUY' if worse else ''
+            lines.append(f'{name:18} {metric:15} {old_value:>10} -> {new_value:>10} ({change:+.1f}%){flag}')
+            if worse:
+                regressions.append((name, metric, change))
+        if new.get('server_errors') and not base.get('server_errors'):
+            lines.append(f"{name:18} xuất hiện {new['server_errors']} lỗi 5xx  <-- HỒI QUY")
+            regressions.append((name, 'server_errors', new['server_errors']))
+    return lines, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='So sánh kết quả benchmark.')
+    parser.add_argument('baseline')
+    parser.add_argument('candidate')
+    parser.add_argument('--threshold', type=float, default=10,
+                        help='Phần trăm thay đổi tối đa cho phép (mặc định 10).')
+    args = parser.parse_args(argv)
+
+    baseline, candidate = load(args.baseline), load(args.candidate)
+    print(f"baseline:  {baseline['meta'].get('git_revision')} ({baseline['meta'].get('label')})")
+    print(f"candidate: {candidate['meta'].get('git_revision')} ({candidate['meta'].get('label')})")
+    if baseline['meta'].get('concurrency') != candidate['meta'].get('concurrency'):
+        print('CẢNH BÁO: hai lần đo dùng concurrency khác nhau.')
+
+    lines, regressions = compare(baseline, candidate, args.threshold)
+    print('\n'.join(lines))
+    if regressions:
+        print(f'{len(regressions)} chỉ số vượt ngưỡng {args.threshold}%.')
+        sys.exit(1)
+    print('OK – không có hồi quy.')
+
+
+if __name__ == '__main__':
+    main()
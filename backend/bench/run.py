@@ -0,0 +1,268 @@
+"""Chạy tải đồng thời vào server đang chạy và ghi kết quả ra JSON.
+
+    cd backend
+    python -m bench.run --base-url http://localhost:5000 --concurrency 16 --duration 30 \
+        --label 100k --output bench/results/100k-$(git rev-parse --short HEAD).json
+
+Kịch bản: login, list_transactions, dashboard, approve (chạy cuối vì làm thay đổi dữ liệu;
+mỗi phiếu PENDING chỉ duyệt được một lần – chạy lại bench.seed trước lần đo kế tiếp).
+"""
+import argparse
+import datetime
+import http.client
+import json
+import math
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlencode, urlsplit
+
+BENCH_PASSWORD = os.environ.get('BENCH_PASSWORD', 'bench123')   # Mật khẩu của mọi tài khoản do bench.seed tạo
+
+SCENARIOS = ('login', 'list_transactions', 'dashboard', 'approve')
+LIST_MAX_DEPTH = 20   # Số trang tối đa mỗi client đi theo next_cursor trước khi quay lại trang đầu
+
+
+class Client:
+    """Kết nối HTTP keep-alive riêng cho mỗi luồng."""
+
+    def __init__(self, base_url, token=None):
+        parts = urlsplit(base_url)
+        self._conn_cls = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self._netloc = parts.netloc
+        self._conn = None
+        self.token = token
+
+    def request(self, method, path, body=None):
+        headers = {'Content-Type': 'application/json'}
+        if self.token:
+            headers['Authorization'] = f'Bearer {self.token}'
+        data = json.dumps(body) if body is not None else None
+        for attempt in (1, 2):
+            if self._conn is None:
+                self._conn = self._conn_cls(self._netloc, timeout=60)
+            try:
+                self._conn.request(method, path, body=data, headers=headers)
+                response = self._conn.getresponse()
+                return response.status, response.read()
+            except (http.client.HTTPException, ConnectionError):
+                # Server đóng kết nối keep-alive: mở lại một lần
+                self._conn.close()
+                self._conn = None
+                if attempt == 2:
+                    raise
+
+    def json(self, method, path, body=None):
+        status, raw = self.request(method, path, body)
+        return status, json.loads(raw) if raw else None
+
+
+def login(base_url, email):
+    status, body = Client(base_url).json('POST', '/api/login', {'email': email, 'password': BENCH_PASSWORD})
+    if status != 200:
+        raise SystemExit(f'Đăng nhập {email} thất bại ({status}): {body}')
+    return body['token']
+
+
+def load_pending_ids(base_url, token):
+    """Đọc toàn bộ id phiếu PENDING qua endpoint stream NDJSON."""
+    status, raw = Client(base_url, token).request(
+        'GET', '/api/transactions?' + urlencode({'status': 'PENDING', 'format': 'ndjson'}))
+    if status != 200:
+        raise SystemExit(f'Không đọc được danh sách phiếu PENDING ({status})')
+    ids = queue.Queue()
+    for line in raw.splitlines():
+        item = json.loads(line)
+        if 'transaction_id' in item:
+            ids.put(item['transaction_id'])
+    return ids
+
+
+def make_scenario(name, base_url):
+    """Trả về hàm tạo worker: factory() -> step(client) -> mã HTTP (None = hết việc)."""
+    if name == 'login':
+        def factory():
+            client = Client(base_url)
+            return client, lambda: client.request(
+                'POST', '/api/login', {'email': 'bench_staff@bench.local', 'password': BENCH_PASSWORD})[0]
+        return factory
+
+    if name == 'dashboard':
+        token = login(base_url, 'bench_admin@bench.local')
+
+        def factory():
+            client = Client(base_url, token)
+            return client, lambda: client.request('GET', '/api/admin/dashboard')[0]
+        return factory
+
+    if name == 'list_transactions':
+        token = login(base_url, 'bench_staff@bench.local')
+
+        def factory():
+            client = Client(base_url, token)
+            state = {'cursor': None, 'depth': 0}
+
+            def step():
+                params = {'limit': 50}
+                if state['cursor'] and state['depth'] < LIST_MAX_DEPTH:
+                    params['after'] = state['cursor']
+                    state['depth'] += 1
+                else:
+                    state['depth'] = 0
+                status, body = client.json('GET', '/api/transactions?' + urlencode(params))
+                state['cursor'] = body.get('next_cursor') if status == 200 else None
+                return status
+            return client, step
+        return factory
+
+    if name == 'approve':
+        token = login(base_url, 'bench_staff@bench.local')
+        pending = load_pending_ids(base_url, token)
+        log(f'approve: {pending.qsize()} phiếu PENDING')
+
+        def factory():
+            client = Client(base_url, token)
+
+            def step():
+                try:
+                    transaction_id = pending.get_nowait()
+                except queue.Empty:
+                    return None
+                return client.request('PUT', f'/api/transactions/{transaction_id}/approve')[0]
+            return client, step
+        return factory
+
+    raise ValueError(name)
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    # Nearest-rank
+    index = max(0, min(len(sorted_values) - 1, math.ceil(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def run_scenario(factory, concurrency, duration, max_requests):
+    latencies, statuses, errors = [], {}, []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+    remaining = [max_requests]
+
+    def worker():
+        _, step = factory()
+        local_latencies, local_statuses = [], {}
+        while time.perf_counter() < deadline:
+            if max_requests:
+                with lock:
+                    if remaining[0] <= 0:
+                        break
+                    remaining[0] -= 1
+            started = time.perf_counter()
+            try:
+                status = step()
+            except Exception as e:
+                with lock:
+                    errors.append(str(e))
+                continue
+            if status is None:
+                break
+            local_latencies.append(time.perf_counter() - started)
+            local_statuses[status] = local_statuses.get(status, 0) + 1
+        with lock:
+            latencies.extend(local_latencies)
+            for status, count in local_statuses.items():
+                statuses[status] = statuses.get(status, 0) + count
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    ok = sum(count for status, count in statuses.items() if status < 500)
+    ms = lambda v: None if v is None else round(v * 1000, 2)
+    return {
+        'requests': len(latencies),
+        'ok': ok,
+        'server_errors': len(latencies) - ok,
+        'client_errors': len(errors),
+        'error_samples': errors[:5],
+        'status_counts': {str(k): v for k, v in sorted(statuses.items())},
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(ok / elapsed, 2) if elapsed else None,
+        'mean_ms': ms(sum(latencies) / len(latencies)) if latencies else None,
+        'p50_ms': ms(percentile(latencies, 50)),
+        'p95_ms': ms(percentile(latencies, 95)),
+        'p99_ms': ms(percentile(latencies, 99)),
+        'max_ms': ms(latencies[-1]) if latencies else None,
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def log(message):
+    print(message, file=sys.stderr, flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark các API nóng.')
+    parser.add_argument('--base-url', default='http://localhost:5000')
+    parser.add_argument('--scenario', action='append', choices=SCENARIOS,
+                        help='Có thể lặp lại; mặc định chạy tất cả theo thứ tự.')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=30, help='Số giây mỗi kịch bản.')
+    parser.add_argument('--requests', type=int, default=0, help='Giới hạn số request mỗi kịch bản (0 = không).')
+    parser.add_argument('--warmup', type=float, default=3, help='Số giây chạy nóng (không tính) trước mỗi kịch bản.')
+    parser.add_argument('--label', default='', help='Nhãn tự do, VD: quy mô dữ liệu.')
+    parser.add_argument('--output', help='File JSON kết quả (mặc định in ra stdout).')
+    args = parser.parse_args(argv)
+
+    scenarios = args.scenario or list(SCENARIOS)
+    results = {
+        'meta': {
+            'label': args.label,
+            'git_revision': git_revision(),
+            'base_url': args.base_url,
+            'concurrency': args.concurrency,
+            'duration_s': args.duration,
+            'max_requests': args.requests,
+            'started_at': datetime.datetime.now().isoformat(timespec='seconds'),
+        },
+        'scenarios': {},
+    }
+
+    for name in scenarios:
+        factory = make_scenario(name, args.base_url)
+        if args.warmup and name != 'approve':
+            run_scenario(factory, args.concurrency, args.warmup, 0)
+        log(f'{name}: {args.concurrency} client trong {args.duration}s...')
+        result = run_scenario(factory, args.concurrency, args.duration, args.requests)
+        results['scenarios'][name] = result
+        log(f"  {result['throughput_rps']} req/s  p50={result['p50_ms']}ms  "
+            f"p95={result['p95_ms']}ms  p99={result['p99_ms']}ms  lỗi 5xx={result['server_errors']}")
+
+    output = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+        log(f'Đã ghi kết quả vào {args.output}')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
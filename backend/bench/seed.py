@@ -0,0 +1,205 @@
+"""Tạo database benchmark từ smart_savings.sql và sinh dữ liệu giả lập.
+
+    cd backend
+    python -m bench.seed --scale 100k            # 10k | 100k | 1m (số phiếu giao dịch)
+    DB_NAME=modern_savings_bench python app.py   # chạy server trỏ vào database vừa tạo
+
+Tài khoản có sẵn (mật khẩu BENCH_PASSWORD): bench_admin@bench.local, bench_staff@bench.local
+và các khách hàng customer<N>@bench.local.
+"""
+import argparse
+import datetime
+import os
+import random
+import sys
+import time
+from decimal import Decimal
+
+import mysql.connector
+from werkzeug.security import generate_password_hash
+
+from bench.run import BENCH_PASSWORD
+from common import ledger, rollups, schema
+from common.db import DB_CONFIG
+from common.passwords import DEFAULT_ITERATIONS, hash_method
+from common.search import normalize_name
+
+SCALES = {'10k': 10_000, '100k': 100_000, '1m': 1_000_000}
+
+BENCH_DB       = os.environ.get('BENCH_DB_NAME', 'modern_savings_bench')
+SCHEMA_FILE    = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                              'smart_savings.sql')
+
+INSERT_BATCH    = 5000
+HISTORY_DAYS    = 365
+PENDING_SHARE   = 0.10    # Tỉ lệ phiếu PENDING (dùng cho kịch bản duyệt phiếu)
+TXN_PER_USER    = 10      # Số phiếu trung bình mỗi khách hàng
+ACCOUNT_SHARE   = 0.25    # Số sổ tiết kiệm so với số phiếu
+
+PRODUCTS = [
+    ('Không kỳ hạn', 0, Decimal('0.50'), 0),
+    ('1 tháng', 1, Decimal('3.00'), 15),
+    ('3 tháng', 3, Decimal('4.00'), 30),
+    ('6 tháng', 6, Decimal('5.20'), 30),
+    ('12 tháng', 12, Decimal('6.00'), 30),
+]
+APPROVED_TYPES = ['DEPOSIT_TO_WALLET'] * 5 + ['WITHDRAW_FROM_WALLET'] * 3 + ['OPEN_SAVINGS', 'CLOSE_SAVINGS']
+PENDING_TYPES  = ['DEPOSIT_TO_WALLET'] * 7 + ['WITHDRAW_FROM_WALLET'] * 3
+
+
+def log(message):
+    print(message, file=sys.stderr, flush=True)
+
+
+def connect(database=None):
+    config = dict(DB_CONFIG)
+    config.pop('database', None)
+    if database:
+        config['database'] = database
+    return mysql.connector.connect(**config)
+
+
+def create_schema():
+    """Chạy smart_savings.sql (đổi tên database) rồi áp dụng toàn bộ migration."""
+    with open(SCHEMA_FILE, encoding='utf-8') as f:
+        script = f.read().replace('modern_savings_db', BENCH_DB)
+
+    conn = connect()
+    cursor = conn.cursor()
+    for statement in schema._split_sql(script):
+        cursor.execute(statement)
+    conn.commit()
+    cursor.close()
+    conn.close()
+
+    conn = connect(BENCH_DB)
+    applied = schema.upgrade(conn)
+    conn.close()
+    log(f'Đã tạo database {BENCH_DB} và áp dụng {len(applied)} migration.')
+
+
+def insert_batches(conn, sql, rows):
+    cursor = conn.cursor()
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= INSERT_BATCH:
+            cursor.executemany(sql, batch)
+            conn.commit()
+            batch = []
+    if batch:
+        cursor.executemany(sql, batch)
+        conn.commit()
+    cursor.close()
+
+
+def _timestamp(rng, start, index, total):
+    # Thời gian tăng dần theo id, có nhiễu nhỏ, trải đều trên HISTORY_DAYS ngày
+    seconds = HISTORY_DAYS * 86400 * index / max(total, 1) + rng.random() * 60
+    return start + datetime.timedelta(seconds=seconds)
+
+
+def seed(transactions, rng):
+    customers = max(100, transactions // TXN_PER_USER)
+    accounts  = int(transactions * ACCOUNT_SHARE)
+    start     = datetime.datetime.now() - datetime.timedelta(days=HISTORY_DAYS + 1)
+    password_hash = generate_password_hash(BENCH_PASSWORD, hash_method(DEFAULT_ITERATIONS))
+
+    conn = connect(BENCH_DB)
+    cursor = conn.cursor()
+    cursor.executemany(
+        "INSERT INTO savings_products (name, term_months, interest_rate, min_days_hold) VALUES (%s, %s, %s, %s)",
+        PRODUCTS
+    )
+    cursor.execute("SELECT product_id FROM savings_products ORDER BY product_id")
+    product_ids = [row[0] for row in cursor.fetchall()]
+    conn.commit()
+    cursor.close()
+
+    user_sql = """
+        INSERT INTO users (email, password_hash, full_name, full_name_search, identity_card,
+                           role, wallet_balance, created_at)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+    """
+    staff = [
+        ('bench_admin@bench.local', password_hash, 'Bench Admin', 'bench admin', None, 'ADMIN', 0, start),
+        ('bench_staff@bench.local', password_hash, 'Bench Staff', 'bench staff', None, 'STAFF', 0, start),
+    ]
+    insert_batches(conn, user_sql, staff)
+    staff_id = 2
+
+    first_names = ['Nguyễn', 'Trần', 'Lê', 'Phạm', 'Hoàng', 'Vũ', 'Đặng', 'Bùi']
+    last_names  = ['An', 'Bình', 'Châu', 'Dũng', 'Đức', 'Hà', 'Lan', 'Minh', 'Nam', 'Thảo']
+
+    def customer_rows():
+        for i in range(customers):
+            name = f'{rng.choice(first_names)} Văn {rng.choice(last_names)} {i}'
+            balance = Decimal(rng.randrange(1_000_000, 500_000_000, 1000))
+            yield (f'customer{i}@bench.local', password_hash, name, normalize_name(name),
+                   f'{100000000000 + i}', 'CUSTOMER', balance, _timestamp(rng, start, i, customers))
+
+    t0 = time.perf_counter()
+    insert_batches(conn, user_sql, customer_rows())
+    first_customer = staff_id + 1
+    log(f'{customers} khách hàng ({time.perf_counter() - t0:.1f}s)')
+
+    def account_rows():
+        for i in range(accounts):
+            status = 'ACTIVE' if rng.random() < 0.8 else 'CLOSED'
+            yield (first_customer + rng.randrange(customers), rng.choice(product_ids),
+                   Decimal(rng.randrange(1_000_000, 200_000_000, 100000)),
+                   _timestamp(rng, start, i, accounts), status)
+
+    t0 = time.perf_counter()
+    insert_batches(conn, """
+        INSERT INTO savings_accounts (user_id, product_id, principal_balance, opened_at, status)
+        VALUES (%s, %s, %s, %s, %s)
+    """, account_rows())
+    log(f'{accounts} sổ tiết kiệm ({time.perf_counter() - t0:.1f}s)')
+
+    def transaction_rows():
+        for i in range(transactions):
+            user_id = first_customer + rng.randrange(customers)
+            if rng.random() < PENDING_SHARE:
+                txn_type, status, processed_by = rng.choice(PENDING_TYPES), 'PENDING', None
+                amount = Decimal(rng.randrange(100_000, 1_000_000, 1000))
+            else:
+                txn_type = rng.choice(APPROVED_TYPES)
+                status = 'APPROVED' if rng.random() < 0.9 else 'REJECTED'
+                processed_by = staff_id
+                amount = Decimal(rng.randrange(100_000, 50_000_000, 1000))
+            account_id = 1 + rng.randrange(accounts) if txn_type in ('OPEN_SAVINGS', 'CLOSE_SAVINGS') else None
+            yield (user_id, account_id, amount, txn_type, status, processed_by,
+                   _timestamp(rng, start, i, transactions))
+
+    t0 = time.perf_counter()
+    insert_batches(conn, """
+        INSERT INTO transactions (user_id, account_id, amount, transaction_type, status, processed_by, created_at)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
+    """, transaction_rows())
+    log(f'{transactions} phiếu giao dịch ({time.perf_counter() - t0:.1f}s)')
+
+    # Đồng bộ các bảng tổng hợp với dữ liệu vừa sinh
+    cursor = conn.cursor(buffered=True)
+    ledger.reconcile(cursor, fix=True)
+    conn.commit()
+    cursor.execute("ANALYZE TABLE users, savings_accounts, transactions")
+    cursor.fetchall()
+    cursor.close()
+    rollups.refresh_daily_rollups(conn)
+    conn.close()
+    log('Đã cập nhật system_balances, daily_ledger_rollups và thống kê index.')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Sinh dữ liệu benchmark.')
+    parser.add_argument('--scale', choices=sorted(SCALES), default='10k')
+    parser.add_argument('--seed', type=int, default=42, help='Seed ngẫu nhiên (dữ liệu lặp lại được).')
+    args = parser.parse_args(argv)
+
+    create_schema()
+    seed(SCALES[args.scale], random.Random(args.seed))
+
+
+if __name__ == '__main__':
+    main()
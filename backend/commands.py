@@ -0,0 +1,143 @@
+import datetime
+import os
+import signal
+
+import click
+from flask import current_app
+
+from common.db import db_conn, db_cursor
+from common import export, interest, jobs, ledger, rollups, schema, user_import
+from common.passwords import HashQueueFull
+
+
+@click.command('reconcile-balances')
+@click.option('--fix', is_flag=True, help='Ghi đè tổng số dư bằng số liệu quét thực tế nếu bị lệch.')
+def reconcile_balances_command(fix):
+    """Đối soát bảng system_balances với số liệu quét toàn bộ users/savings_accounts."""
+    report = ledger.reconcile(db_cursor, fix=fix)
+    db_conn.commit()
+
+    for key in ('total_wallet_balance', 'total_savings_principal'):
+        item = report[key]
+        click.echo(f"{key}: stored={item['stored']} actual={item['actual']} drift={item['drift']}")
+
+    if report['ok']:
+        click.echo('OK – không có chênh lệch.')
+    elif fix:
+        click.echo('Đã cập nhật lại system_balances theo số liệu thực tế.')
+    else:
+        click.echo('Phát hiện chênh lệch! Chạy lại với --fix để sửa.')
+        raise SystemExit(1)
+
+
+@click.command('db-upgrade')
+def db_upgrade_command():
+    """Áp dụng các migration trong thư mục migrations/ chưa được chạy."""
+    applied = schema.upgrade(db_conn, on_apply=lambda v: click.echo(f'Đang áp dụng {v}...'))
+    click.echo(f'Đã áp dụng {len(applied)} migration.' if applied else 'Database đã ở phiên bản mới nhất.')
+
+
+@click.command('explain-check')
+def explain_check_command():
+    """Kiểm tra EXPLAIN của các truy vấn nóng, báo lỗi nếu có truy vấn quét toàn bảng."""
+    queries = schema.hot_queries()
+    problems = schema.find_full_scans(db_cursor, queries)
+    if not problems:
+        click.echo(f'OK – {len(queries)} truy vấn đều dùng index.')
+        return
+
+    for endpoint, table, rows in problems:
+        click.echo(f'FULL SCAN: {endpoint} -> bảng {table} (~{rows} dòng)')
+    raise SystemExit(1)
+
+
+@click.command('accrue-interest')
+@click.option('--as-of', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help='Ngày tính lãi (mặc định: hôm nay).')
+@click.option('--chunk-size', type=int, default=interest.ACCRUAL_CHUNK_SIZE, show_default=True)
+def accrue_interest_command(as_of, chunk_size):
+    """Tính lãi dự thu, ngày đáo hạn và điều kiện rút trước hạn cho toàn bộ sổ ACTIVE."""
+    as_of = as_of.date() if as_of else datetime.date.today()
+    total = interest.run_accrual(db_conn, as_of=as_of, chunk_size=chunk_size,
+                                 on_chunk=lambda n: click.echo(f'... {n} sổ'))
+    click.echo(f'Đã tính lãi cho {total} sổ tiết kiệm (ngày {as_of}).')
+
+
+@click.command('refresh-rollups')
+def refresh_rollups_command():
+    """Cộng dồn các phiếu mới được duyệt/từ chối vào bảng tổng hợp theo ngày."""
+    folded = rollups.refresh_daily_rollups(db_conn)
+    click.echo(f'Đã cộng dồn {folded} phiếu vào daily_ledger_rollups.')
+
+
+@click.command('import-users')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(user_import.IMPORT_FORMATS), default=None,
+              help='Mặc định đoán theo đuôi file (.ndjson/.jsonl -> ndjson, còn lại csv).')
+@click.option('--chunk-size', type=click.IntRange(1, user_import.IMPORT_MAX_CHUNK),
+              default=user_import.IMPORT_CHUNK_SIZE, show_default=True)
+def import_users_command(path, fmt, chunk_size):
+    """Nhập hàng loạt người dùng (và số dư ví đầu kỳ) từ file CSV/NDJSON."""
+    if fmt is None:
+        fmt = 'ndjson' if os.path.splitext(path)[1].lower() in ('.ndjson', '.jsonl') else 'csv'
+
+    def on_chunk(report):
+        click.echo(f"... {report['total_rows']} dòng, {report['imported']} thành công, {report['failed']} lỗi")
+
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        try:
+            report = user_import.import_users(db_conn, user_import.read_rows(f, fmt), chunk_size, on_chunk)
+        except (user_import.ImportFormatError, HashQueueFull) as e:
+            raise click.ClickException(str(e))
+
+    for error in report['errors']:
+        click.echo(f"Dòng {error['line']} ({error['email']}): {error['error']}")
+    if report['errors_truncated']:
+        click.echo(f"... chỉ hiển thị {user_import.IMPORT_MAX_ERRORS} lỗi đầu tiên.")
+    click.echo(f"Đã nhập {report['imported']}/{report['total_rows']} dòng, {report['failed']} lỗi.")
+
+
+@click.command('export-data')
+@click.argument('dataset', type=click.Choice(list(export.DATASETS)))
+@click.argument('path', type=click.Path(dir_okay=False, writable=True))
+@click.option('--format', 'fmt', type=click.Choice(export.EXPORT_FORMATS), default=None,
+              help='Mặc định đoán theo đuôi file (.parquet -> parquet, còn lại csv).')
+@click.option('--from', 'date_from', type=click.DateTime(formats=['%Y-%m-%d']), default=None)
+@click.option('--to', 'date_to', type=click.DateTime(formats=['%Y-%m-%d']), default=None)
+def export_data_command(dataset, path, fmt, date_from, date_to):
+    """Xuất transactions / savings_accounts ra file CSV hoặc Parquet."""
+    if fmt is None:
+        fmt = 'parquet' if path.lower().endswith('.parquet') else 'csv'
+    try:
+        count = export.export_to_file(
+            db_conn, dataset, fmt, path,
+            date_from=date_from.date() if date_from else None,
+            date_to=date_to.date() if date_to else None,
+            on_batch=lambda n: click.echo(f'... {n} dòng')
+        )
+    except export.ExportError as e:
+        raise click.ClickException(str(e))
+    click.echo(f'Đã xuất {count} dòng {dataset} ra {path}.')
+
+
+@click.command('run-jobs')
+@click.option('--workers', type=int, default=None, help='Số job chạy song song (mặc định JOB_WORKERS).')
+def run_jobs_command(workers):
+    """Tiến trình runner chạy job nền (Gunicorn tự khởi động; với uvicorn chạy riêng lệnh này)."""
+    # SIGTERM/SIGINT: ngừng nhận job, job đang chạy được trả về hàng đợi rồi mới thoát
+    signal.signal(signal.SIGTERM, lambda *_: jobs.shutdown())
+    signal.signal(signal.SIGINT, lambda *_: jobs.shutdown())
+    click.echo(f'Runner job nền (pid {os.getpid()}) bắt đầu nhận việc.')
+    jobs.run_worker(current_app._get_current_object(), workers)
+    click.echo('Runner job nền đã dừng.')
+
+
+def init_app(app):
+    app.cli.add_command(reconcile_balances_command)
+    app.cli.add_command(db_upgrade_command)
+    app.cli.add_command(explain_check_command)
+    app.cli.add_command(accrue_interest_command)
+    app.cli.add_command(refresh_rollups_command)
+    app.cli.add_command(import_users_command)
+    app.cli.add_command(export_data_command)
+    app.cli.add_command(run_jobs_command)
@@ -0,0 +1,132 @@
+import asyncio
+import contextvars
+import logging
+import os
+import random
+
+import aiomysql
+
+from common.db import DB_CONFIG, POOL_RECYCLE, get_replicas
+from common.pagination import make_cursor
+
+# Pool riêng cho chế độ ASGI (asgi.py); mỗi kết nối chỉ giữ trong thời gian một câu truy vấn
+AIO_POOL_MIN = int(os.environ.get('AIO_DB_POOL_MIN', 5))
+AIO_POOL_MAX = int(os.environ.get('AIO_DB_POOL_MAX', 50))
+# Pool cho mỗi read replica (DB_REPLICAS); mở khi replica được chọn lần đầu
+AIO_REPLICA_POOL_MIN = int(os.environ.get('AIO_DB_REPLICA_POOL_MIN', 1))
+AIO_REPLICA_POOL_MAX = int(os.environ.get('AIO_DB_REPLICA_POOL_MAX', AIO_POOL_MAX))
+
+replica_log = logging.getLogger('replica')
+
+_pool = None
+_replica_pools = {}     # Replica.name -> pool aiomysql
+
+# Request (task) hiện tại phải đọc từ primary: user vừa ghi, replica có thể chưa có dữ liệu đó
+_use_primary = contextvars.ContextVar('aiodb_use_primary', default=False)
+
+
+async def _create_pool(host, port, minsize, maxsize, **extra):
+    return await aiomysql.create_pool(
+        host=host,
+        port=port,
+        user=DB_CONFIG['user'],
+        password=DB_CONFIG['password'],
+        db=DB_CONFIG['database'],
+        minsize=minsize,
+        maxsize=maxsize,
+        pool_recycle=int(POOL_RECYCLE),
+        autocommit=True,    # Chỉ dùng cho các endpoint đọc
+        charset='utf8mb4',
+        **extra
+    )
+
+
+async def init_pool():
+    global _pool
+    if _pool is None:
+        _pool = await _create_pool(DB_CONFIG['host'], DB_CONFIG['port'], AIO_POOL_MIN, AIO_POOL_MAX)
+        # Đo độ trễ replica (kết nối đồng bộ) ngoài event loop; luồng đo chạy nền sau đó
+        await asyncio.to_thread(get_replicas)
+    return _pool
+
+
+async def close_pool():
+    global _pool
+    pools = list(_replica_pools.values())
+    _replica_pools.clear()
+    if _pool is not None:
+        pools.append(_pool)
+        _pool = None
+    for pool in pools:
+        pool.close()
+        await pool.wait_closed()
+
+
+def use_primary():
+    """Các truy vấn còn lại của request hiện tại đọc từ primary (read-your-writes)."""
+    _use_primary.set(True)
+
+
+async def _replica_pool(replica):
+    pool = _replica_pools.get(replica.name)
+    if pool is None:
+        pool = await _create_pool(replica.host, replica.port, AIO_REPLICA_POOL_MIN, AIO_REPLICA_POOL_MAX,
+                                  connect_timeout=2)
+        existing = _replica_pools.setdefault(replica.name, pool)
+        if existing is not pool:
+            # Coroutine khác đã mở pool cho replica này trong lúc chờ
+            pool.close()
+            await pool.wait_closed()
+            pool = existing
+    return pool
+
+
+async def _pick_replica():
+    """(replica, pool) đủ mới để đọc, hoặc None nếu phải đọc từ primary."""
+    if _use_primary.get():
+        return None
+    candidates = [r for r in get_replicas() if r.available]
+    if not candidates:
+        return None
+    replica = random.choice(candidates)
+    try:
+        return replica, await _replica_pool(replica)
+    except Exception as e:
+        replica.mark_down()
+        replica_log.warning('Replica %s lỗi, đọc từ primary: %s', replica.name, e)
+        return None
+
+
+async def _fetchall(pool, query, params):
+    async with pool.acquire() as conn:
+        async with conn.cursor() as cursor:
+            await cursor.execute(query, tuple(params))
+            return await cursor.fetchall()
+
+
+async def fetchall(query, params=()):
+    """Chạy câu SELECT trên một replica đủ mới (DB_REPLICAS), không có thì trên primary."""
+    picked = await _pick_replica()
+    if picked is not None:
+        replica, pool = picked
+        try:
+            return await _fetchall(pool, query, params)
+        except aiomysql.OperationalError as e:
+            replica.mark_down()
+            replica_log.warning('Replica %s lỗi, đọc từ primary: %s', replica.name, e)
+    return await _fetchall(await init_pool(), query, params)
+
+
+async def fetchone(query, params=()):
+    rows = await fetchall(query, params)
+    return rows[0] if rows else None
+
+
+async def fetch_page(query, params, limit, to_row, sort_key, id_key):
+    """Bản async của common.pagination.fetch_page – trả về (items, next_cursor)."""
+    rows = await fetchall(query + " LIMIT %s", tuple(params) + (limit + 1,))
+    items = [to_row(row) for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = make_cursor(items[-1], sort_key, id_key)
+    return items, next_cursor
@@ -1,6 +1,8 @@
 from flask import Blueprint, request, jsonify, current_app
-from werkzeug.security import generate_password_hash, check_password_hash
 from common.db import db_cursor, db_conn
+from common.cache import invalidate_dashboard
+from common.search import normalize_name
+from common.passwords import HashQueueFull, hash_password, verify_password, needs_rehash
 import jwt
 import datetime
 
@@ -19,13 +21,17 @@ def register():
     if not email or not password or not full_name:
         return jsonify({'message': 'Vui lòng điền đủ thông tin!'}), 400
 
-    hashed_password = generate_password_hash(password, method='pbkdf2:sha256')
+    try:
+        hashed_password = hash_password(password)
+    except HashQueueFull as e:
+        return jsonify({'message': str(e)}), 503, {'Retry-After': '1'}
 
     try:
-        sql = """INSERT INTO users (email, password_hash, full_name, identity_card)
-                 VALUES (%s, %s, %s, %s)"""
-        db_cursor.execute(sql, (email, hashed_password, full_name, identity_card))
+        sql = """INSERT INTO users (email, password_hash, full_name, full_name_search, identity_card)
+                 VALUES (%s, %s, %s, %s, %s)"""
+        db_cursor.execute(sql, (email, hashed_password, full_name, normalize_name(full_name), identity_card))
         db_conn.commit()
+        invalidate_dashboard()
         return jsonify({'message': 'Đăng ký thành công!'}), 201
     except Exception as e:
         return jsonify({'message': 'Email hoặc CMND/CCCD đã tồn tại!', 'error': str(e)}), 400
@@ -38,7 +44,7 @@ def login():
     password = data.get('password')
 
     db_cursor.execute(
-        "SELECT user_id, password_hash, role, status FROM users WHERE email = %s",
+        "SELECT user_id, password_hash, role, status, token_version FROM users WHERE email = %s",
         (email,)
     )
     user = db_cursor.fetchone()
@@ -46,16 +52,33 @@ def login():
     if not user:
         return jsonify({'message': 'Tài khoản không tồn tại!'}), 404
 
-    user_id, password_hash, role, status = user
+    user_id, password_hash, role, status, token_version = user
 
     if status == 'LOCKED':
         return jsonify({'message': 'Tài khoản đã bị khóa!'}), 403
 
-    if check_password_hash(password_hash, password):
+    try:
+        password_ok = verify_password(password_hash, password)
+    except HashQueueFull as e:
+        return jsonify({'message': str(e)}), 503, {'Retry-After': '1'}
+
+    if password_ok:
+        # Băm lại khi cấu hình PASSWORD_HASH_ITERATIONS đã thay đổi
+        if needs_rehash(password_hash):
+            try:
+                db_cursor.execute("UPDATE users SET password_hash = %s WHERE user_id = %s",
+                                  (hash_password(password), user_id))
+                db_conn.commit()
+            except HashQueueFull:
+                pass    # Để lần đăng nhập sau
+
+        now = datetime.datetime.utcnow()
         payload = {
             'user_id': user_id,
             'role':    role,
-            'exp':     datetime.datetime.utcnow() + datetime.timedelta(hours=2)
+            'ver':     token_version,   # Đổi role -> token_version tăng, token này bị từ chối
+            'iat':     now,
+            'exp':     now + datetime.timedelta(hours=2)
         }
         token = jwt.encode(payload, current_app.config['SECRET_KEY'], algorithm='HS256')
         return jsonify({
@@ -0,0 +1,69 @@
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Cache trong bộ nhớ tiến trình, an toàn đa luồng.
+
+    Mỗi khóa có hạn dùng riêng (mặc định `ttl` giây); khi vượt `maxsize`
+    thì loại bỏ khóa ít được dùng nhất (LRU).
+    """
+
+    def __init__(self, ttl, maxsize=1024):
+        self.ttl     = ttl
+        self.maxsize = maxsize
+        self._data   = OrderedDict()   # key -> (expires_at, value)
+        self._lock   = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING:
+                return default
+            expires_at, value = item
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_or_set(self, key, loader, ttl=None):
+        """Đọc từ cache; nếu chưa có thì gọi loader() và lưu lại kết quả."""
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = loader()
+            self.set(key, value, ttl)
+        return value
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+# Thống kê Admin Dashboard – bị xóa ngay khi dữ liệu liên quan thay đổi
+DASHBOARD_TTL = 10
+dashboard_cache = TTLCache(ttl=DASHBOARD_TTL, maxsize=1)
+
+
+def invalidate_dashboard():
+    dashboard_cache.clear()
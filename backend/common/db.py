@@ -1,10 +1,529 @@
+import hashlib
+import hmac
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
 import mysql.connector
+from mysql.connector.constants import ClientFlag
+from flask import current_app, g, has_request_context, request
+from werkzeug.local import LocalProxy
+
+from common import metrics
+
+# ⚠️ Sửa password cho đúng môi trường của bạn (hoặc đặt qua biến môi trường)
+DB_CONFIG = {
+    'host':     os.environ.get('DB_HOST', 'localhost'),
+    'port':     int(os.environ.get('DB_PORT', 3306)),
+    'user':     os.environ.get('DB_USER', 'root'),
+    'password': os.environ.get('DB_PASSWORD', ''),
+    'database': os.environ.get('DB_NAME', 'modern_savings_db'),
+    # rowcount của UPDATE = số dòng khớp điều kiện (kể cả khi giá trị không đổi)
+    'client_flags': [ClientFlag.FOUND_ROWS],
+}
+
+# Cấu hình pool
+POOL_SIZE         = int(os.environ.get('DB_POOL_SIZE', 10))        # Số kết nối giữ sẵn
+POOL_MAX_OVERFLOW = int(os.environ.get('DB_POOL_MAX_OVERFLOW', 10))  # Số kết nối tạm mở thêm khi pool cạn
+POOL_TIMEOUT      = float(os.environ.get('DB_POOL_TIMEOUT', 30))    # Số giây chờ khi pool đã đầy
+POOL_RECYCLE      = float(os.environ.get('DB_POOL_RECYCLE', 3600))  # Đóng kết nối cũ hơn (phải < wait_timeout của MySQL)
+POOL_PING_IDLE    = float(os.environ.get('DB_POOL_PING_IDLE', 10))  # Ping lại nếu kết nối rảnh lâu hơn
+
+# Deadlock (1213) và hết thời gian chờ khóa (1205) có thể thử lại an toàn
+RETRYABLE_ERRNOS = (1213, 1205)
+DEADLOCK_RETRIES = int(os.environ.get('DB_DEADLOCK_RETRIES', 3))
+
+# Câu lệnh chạy lâu hơn ngưỡng này (ms) được ghi log kèm kết quả EXPLAIN
+SLOW_QUERY_MS      = float(os.environ.get('DB_SLOW_QUERY_MS', 200))
+SLOW_QUERY_EXPLAIN = os.environ.get('DB_SLOW_QUERY_EXPLAIN', '1') == '1'
+EXPLAINABLE        = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+# Read replica: DB_REPLICAS="host1:3306,host2:3306" (cùng user/password/database với primary)
+REPLICA_HOSTS          = [h.strip() for h in os.environ.get('DB_REPLICAS', '').split(',') if h.strip()]
+REPLICA_POOL_SIZE      = int(os.environ.get('DB_REPLICA_POOL_SIZE', POOL_SIZE))
+REPLICA_MAX_LAG        = float(os.environ.get('DB_REPLICA_MAX_LAG', 5))         # Trễ hơn ngưỡng này (giây) thì không đọc từ replica
+REPLICA_CHECK_INTERVAL = float(os.environ.get('DB_REPLICA_CHECK_INTERVAL', 2))  # Chu kỳ đo độ trễ
+REPLICA_RETRY_AFTER    = 10    # Replica lỗi kết nối: tạm bỏ qua trong N giây
+# Sau khi user ghi (commit), các request đọc của user đó đi vào primary trong N giây
+# để luôn thấy dữ liệu mình vừa ghi. Nên lớn hơn REPLICA_MAX_LAG.
+READ_STICKY_SECONDS    = float(os.environ.get('DB_READ_STICKY_SECONDS', 2 * REPLICA_MAX_LAG))
+# Mốc ghi cuối (đã ký) trả về client qua cookie và header; client gửi lại ở request sau,
+# nên worker nào, máy nào nhận request cũng biết user vừa ghi
+LAST_WRITE_COOKIE      = 'last_write'
+LAST_WRITE_HEADER      = 'X-Last-Write'
+
+slow_query_log = logging.getLogger('slow_query')
+replica_log    = logging.getLogger('replica')
+
+
+class PoolTimeout(Exception):
+    """Hết thời gian chờ lấy kết nối từ pool."""
+
+
+class ConnectionPool:
+    """Pool kết nối MySQL an toàn đa luồng.
+
+    Giữ tối đa `pool_size` kết nối rảnh, cho phép mở thêm `max_overflow`
+    kết nối khi tải cao. Mỗi lần lấy ra (checkout) sẽ kiểm tra sức khỏe
+    kết nối và tự kết nối lại nếu MySQL đã cắt do `wait_timeout`.
+    """
+
+    def __init__(self, config, pool_size=POOL_SIZE, max_overflow=POOL_MAX_OVERFLOW,
+                 timeout=POOL_TIMEOUT, recycle=POOL_RECYCLE, ping_idle=POOL_PING_IDLE):
+        self.config       = dict(config)
+        self.pool_size    = pool_size
+        self.max_overflow = max_overflow
+        self.timeout      = timeout
+        self.recycle      = recycle
+        self.ping_idle    = ping_idle
+
+        self._idle  = queue.LifoQueue(maxsize=pool_size)   # (conn, created_at, last_used)
+        self._slots = threading.BoundedSemaphore(pool_size + max_overflow)
+        self._meta  = {}                                   # id(conn) -> created_at
+        self._lock  = threading.Lock()
+
+    def _connect(self):
+        conn = mysql.connector.connect(**self.config)
+        with self._lock:
+            self._meta[id(conn)] = time.monotonic()
+        return conn
+
+    def _discard(self, conn):
+        with self._lock:
+            self._meta.pop(id(conn), None)
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _is_healthy(self, conn, created_at, last_used):
+        now = time.monotonic()
+        if self.recycle and now - created_at > self.recycle:
+            return False
+        if now - last_used > self.ping_idle:
+            try:
+                # Tự kết nối lại nếu server đã đóng kết nối (wait_timeout)
+                conn.ping(reconnect=True, attempts=2, delay=0.2)
+            except mysql.connector.Error:
+                return False
+        return True
+
+    def checkout(self, timeout=None):
+        """Lấy một kết nối khỏe mạnh từ pool (chặn tối đa `timeout` giây; 0 = không chờ)."""
+        timeout = self.timeout if timeout is None else timeout
+        acquired = self._slots.acquire(timeout=timeout) if timeout > 0 else self._slots.acquire(blocking=False)
+        if not acquired:
+            raise PoolTimeout('Hết kết nối trong pool, vui lòng thử lại!')
+        try:
+            while True:
+                try:
+                    conn, created_at, last_used = self._idle.get_nowait()
+                except queue.Empty:
+                    return self._connect()
+                if self._is_healthy(conn, created_at, last_used):
+                    return conn
+                self._discard(conn)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def checkin(self, conn):
+        """Trả kết nối về pool; rollback mọi transaction còn dang dở."""
+        try:
+            try:
+                conn.rollback()
+            except mysql.connector.Error:
+                self._discard(conn)
+                return
+            created_at = self._meta.get(id(conn), time.monotonic())
+            try:
+                self._idle.put_nowait((conn, created_at, time.monotonic()))
+            except queue.Full:
+                # Kết nối overflow: đóng luôn
+                self._discard(conn)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """Dùng ngoài request (CLI, job nền): `with pool.connection() as conn:`."""
+        conn = self.checkout(timeout)
+        try:
+            yield conn
+        finally:
+            self.checkin(conn)
+
+    def dispose(self):
+        """Đóng toàn bộ kết nối rảnh (VD: sau khi fork tiến trình)."""
+        while True:
+            try:
+                conn, _, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+
+
+def _explain(operation, params, pool=None):
+    """EXPLAIN trên một kết nối khác của cùng pool (cursor gốc có thể đang stream dở kết quả).
+
+    Không chờ kết nối: khi pool đã cạn (thường chính là lúc truy vấn chậm) thì bỏ qua EXPLAIN
+    thay vì giữ request thêm tới POOL_TIMEOUT giây.
+    """
+    if not operation.lstrip()[:7].upper().startswith(EXPLAINABLE):
+        return None
+    try:
+        with (pool or get_pool()).connection(timeout=0) as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute('EXPLAIN ' + operation, params or ())
+                columns = cursor.column_names
+                return [dict(zip(columns, row)) for row in cursor.fetchall()]
+            finally:
+                cursor.close()
+    except PoolTimeout:
+        return 'Bỏ qua EXPLAIN: pool không còn kết nối rảnh'
+    except Exception as e:
+        return f'Không chạy được EXPLAIN: {e}'
+
+
+def _redact(params):
+    """Chỉ giữ số lượng tham số để log, không lộ dữ liệu."""
+    if params is None:
+        return '-'
+    if isinstance(params, dict):
+        return f'<{len(params)} tham số: {", ".join(sorted(params))}>'
+    return f'<{len(params)} tham số>'
+
+
+def _observe(operation, params, duration, explain=True, pool=None):
+    metrics.record_query(duration)
+    if duration * 1000 < SLOW_QUERY_MS:
+        return
+    metrics.record_slow_query()
+    plan = _explain(operation, params, pool) if explain and SLOW_QUERY_EXPLAIN else None
+    # Không ghi giá trị tham số: có thể là email, CMND/CCCD, password_hash...
+    slow_query_log.warning('Câu lệnh chậm %.1f ms [%s]: %s | params=%s | explain=%s',
+                           duration * 1000, metrics.current_endpoint(),
+                           ' '.join(operation.split()), _redact(params), plan)
+
+
+class InstrumentedCursor:
+    """Bọc cursor của mysql-connector: đo thời gian mỗi execute/executemany."""
+
+    def __init__(self, cursor, pool=None):
+        self._cursor = cursor
+        self._pool   = pool     # EXPLAIN câu lệnh chậm trên cùng server (primary hoặc replica)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._cursor.close()
+
+    def execute(self, operation, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return self._cursor.execute(operation, *args, **kwargs)
+        finally:
+            params = args[0] if args else kwargs.get('params')
+            _observe(operation, params, time.perf_counter() - started, pool=self._pool)
+
+    def executemany(self, operation, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return self._cursor.executemany(operation, *args, **kwargs)
+        finally:
+            _observe(operation, None, time.perf_counter() - started, explain=False)
+
+
+class InstrumentedConnection:
+    """Bọc kết nối của request: cursor tạo ra đều được đo; commit/rollback cũng tính là round trip."""
+
+    def __init__(self, conn, pool=None):
+        self.raw  = conn
+        self.pool = pool    # Pool sở hữu kết nối (primary hoặc một replica)
+
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
+
+    def cursor(self, *args, **kwargs):
+        return InstrumentedCursor(self.raw.cursor(*args, **kwargs), self.pool)
+
+    def commit(self):
+        started = time.perf_counter()
+        try:
+            result = self.raw.commit()
+        finally:
+            _observe('COMMIT', None, time.perf_counter() - started, explain=False)
+        if self.pool is None or self.pool is _pool:
+            _note_write()
+        return result
+
+    def rollback(self):
+        started = time.perf_counter()
+        try:
+            return self.raw.rollback()
+        finally:
+            _observe('ROLLBACK', None, time.perf_counter() - started, explain=False)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Khởi tạo pool lần đầu khi cần (không mở kết nối lúc import)."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(DB_CONFIG)
+    return _pool
+
+
+class Replica:
+    """Một read replica: pool riêng và độ trễ đo được gần nhất."""
+
+    def __init__(self, host_port):
+        host, _, port = host_port.partition(':')
+        self.name = host_port
+        self.host = host
+        self.port = int(port or 3306)
+        self.pool = ConnectionPool(dict(DB_CONFIG, host=self.host, port=self.port, connection_timeout=2),
+                                   pool_size=REPLICA_POOL_SIZE, timeout=1)
+        self.lag  = None            # Giây; None = chưa đo được / replication đang dừng
+        self.down_until = 0.0
+
+    @property
+    def available(self):
+        return (self.lag is not None and self.lag <= REPLICA_MAX_LAG
+                and time.monotonic() >= self.down_until)
+
+    def mark_down(self):
+        self.down_until = time.monotonic() + REPLICA_RETRY_AFTER
+
+    def check_lag(self):
+        """Đọc Seconds_Behind_Source (MySQL >= 8.0.22) hoặc Seconds_Behind_Master."""
+        try:
+            with self.pool.connection() as conn:
+                cursor = conn.cursor(dictionary=True)
+                try:
+                    try:
+                        cursor.execute("SHOW REPLICA STATUS")
+                    except mysql.connector.ProgrammingError:
+                        cursor.execute("SHOW SLAVE STATUS")
+                    row = cursor.fetchone()
+                finally:
+                    cursor.close()
+        except Exception as e:
+            self.lag = None
+            replica_log.warning('Không đo được độ trễ replica %s: %s', self.name, e)
+            return
+        if row is None:
+            self.lag = None     # Không phải replica
+            return
+        lag = row.get('Seconds_Behind_Source', row.get('Seconds_Behind_Master'))
+        self.lag = None if lag is None else float(lag)
+
+
+_replicas = None
+_replica_lock = threading.Lock()
+
+
+def _monitor_replicas(replicas):
+    while True:
+        for replica in replicas:
+            replica.check_lag()
+        time.sleep(REPLICA_CHECK_INTERVAL)
+
+
+def get_replicas():
+    """Danh sách replica (rỗng nếu không cấu hình); lần đầu gọi sẽ khởi động luồng đo độ trễ."""
+    global _replicas
+    if _replicas is None:
+        with _replica_lock:
+            if _replicas is None:
+                replicas = [Replica(h) for h in REPLICA_HOSTS]
+                if replicas:
+                    for replica in replicas:
+                        replica.check_lag()
+                    threading.Thread(target=_monitor_replicas, args=(replicas,),
+                                     name='replica-lag', daemon=True).start()
+                _replicas = replicas
+    return _replicas
+
+
+def replica_status():
+    return [{'replica': r.name, 'lag': r.lag, 'available': r.available} for r in get_replicas()]
+
+
+def reset_pool():
+    """Bỏ pool hiện tại (gọi ngay sau fork): tiến trình con không được dùng chung socket với tiến trình cha."""
+    global _pool, _replicas
+    with _pool_lock:
+        old, _pool = _pool, None
+    with _replica_lock:
+        replicas, _replicas = _replicas or [], None
+    for p in [old] + [r.pool for r in replicas]:
+        if p is not None:
+            p.dispose()
+
+
+def _current_user_id():
+    if not has_request_context():
+        return None
+    user_data = getattr(request, 'user_data', None)
+    return user_data.get('user_id') if user_data else None
+
+
+def _last_write_signature(user_id, written_ms, secret_key):
+    message = f'{int(user_id)}:{int(written_ms)}'.encode()
+    return hmac.new(secret_key.encode(), message, hashlib.sha256).hexdigest()[:32]
+
+
+def sign_last_write(user_id, written_at, secret_key):
+    """Mốc ghi cuối của user dạng '<mili giây>.<chữ ký>': client không sửa được để ép đọc replica cũ."""
+    written_ms = int(written_at * 1000)
+    return f'{written_ms}.{_last_write_signature(user_id, written_ms, secret_key)}'
+
+
+def read_last_write(token, user_id, secret_key):
+    """Thời điểm ghi cuối (epoch giây) trong token hợp lệ của đúng user này, ngược lại None."""
+    if not token or user_id is None:
+        return None
+    written_ms, _, signature = token.partition('.')
+    if not written_ms.isdigit():
+        return None
+    if not hmac.compare_digest(signature, _last_write_signature(user_id, written_ms, secret_key)):
+        return None
+    return int(written_ms) / 1000
+
+
+def recently_wrote(token, user_id, secret_key):
+    """User vừa ghi trong READ_STICKY_SECONDS: phải đọc từ primary."""
+    written_at = read_last_write(token, user_id, secret_key)
+    return written_at is not None and time.time() - written_at < READ_STICKY_SECONDS
+
+
+def _note_write():
+    """Ghi nhận user vừa commit; mốc được gửi cho client khi trả response (_send_last_write)."""
+    if REPLICA_HOSTS and _current_user_id() is not None:
+        g.db_last_write = time.time()
+
+
+def _send_last_write(response):
+    written_at = g.pop('db_last_write', None)
+    user_id = _current_user_id()
+    if written_at is None or user_id is None:
+        return response
+    token = sign_last_write(user_id, written_at, current_app.config['SECRET_KEY'])
+    response.headers[LAST_WRITE_HEADER] = token
+    response.set_cookie(LAST_WRITE_COOKIE, token, max_age=int(READ_STICKY_SECONDS) + 1,
+                        httponly=True, samesite='Lax')
+    return response
+
+
+def _is_sticky(user_id):
+    token = request.headers.get(LAST_WRITE_HEADER) or request.cookies.get(LAST_WRITE_COOKIE)
+    return recently_wrote(token, user_id, current_app.config['SECRET_KEY'])
+
+
+def read_only(f):
+    """Đánh dấu route chỉ đọc: được phục vụ từ read replica nếu có replica đủ mới.
+
+    Đặt dưới @require_role. Request vẫn dùng primary khi user vừa ghi dữ liệu
+    (mốc ghi cuối gửi kèm request còn trong READ_STICKY_SECONDS) hoặc khi mọi replica đều trễ/lỗi.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        g.db_read_only = True
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+def _pick_replica():
+    if not g.get('db_read_only'):
+        return None
+    replicas = get_replicas()
+    if not replicas:
+        return None
+    user_id = _current_user_id()
+    if user_id is not None and _is_sticky(user_id):
+        return None
+    candidates = [r for r in replicas if r.available]
+    return random.choice(candidates) if candidates else None
+
+
+def get_db():
+    """Kết nối riêng cho request hiện tại, tự trả về pool khi request kết thúc."""
+    if 'db_conn' not in g:
+        pool = get_pool()
+        replica = _pick_replica()
+        conn = None
+        if replica is not None:
+            try:
+                conn = replica.pool.checkout()
+                pool = replica.pool
+            except (PoolTimeout, mysql.connector.Error) as e:
+                replica.mark_down()
+                replica_log.warning('Replica %s lỗi, đọc từ primary: %s', replica.name, e)
+        if conn is None:
+            conn = pool.checkout()
+        g.db_conn = InstrumentedConnection(conn, pool)
+    return g.db_conn
+
+
+def get_cursor():
+    """Cursor dùng chung trong request hiện tại."""
+    if 'db_cursor' not in g:
+        g.db_cursor = get_db().cursor(buffered=True)
+    return g.db_cursor
+
+
+def close_db(exc=None):
+    cursor = g.pop('db_cursor', None)
+    if cursor is not None:
+        try:
+            cursor.close()
+        except Exception:
+            pass
+
+    conn = g.pop('db_conn', None)
+    if conn is not None:
+        conn.pool.checkin(conn.raw)
+
+
+def run_with_retry(fn, retries=DEADLOCK_RETRIES, backoff=0.05):
+    """Chạy fn() (tự commit bên trong); nếu MySQL báo deadlock/hết chờ khóa thì rollback và chạy lại."""
+    attempt = 0
+    while True:
+        try:
+            return fn()
+        except mysql.connector.Error as e:
+            db_conn.rollback()
+            if e.errno not in RETRYABLE_ERRNOS or attempt >= retries:
+                raise
+            attempt += 1
+            time.sleep(backoff * (2 ** attempt) * random.random())
+
+
+def init_app(app):
+    app.after_request(_send_last_write)
+    app.teardown_appcontext(close_db)
+
 
-# ⚠️ Sửa password cho đúng môi trường của bạn
-db_conn = mysql.connector.connect(
-    host='localhost',
-    user='root',
-    password='',
-    database='modern_savings_db'
-)
-db_cursor = db_conn.cursor()
+# Các handler vẫn dùng `db_conn` / `db_cursor` như cũ, nhưng mỗi request
+# sẽ nhận kết nối và cursor riêng lấy từ pool.
+db_conn = LocalProxy(get_db)
+db_cursor = LocalProxy(get_cursor)
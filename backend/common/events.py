@@ -0,0 +1,252 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from common.db import get_pool
+
+EVENT_BUFFER_SIZE     = int(os.environ.get('EVENT_BUFFER_SIZE', 1000))        # Số sự kiện giữ lại để client nối lại
+EVENT_POLL_INTERVAL   = float(os.environ.get('EVENT_POLL_INTERVAL', 0.5))     # Chu kỳ đọc khi có stream đang mở (giây)
+EVENT_IDLE_INTERVAL   = float(os.environ.get('EVENT_IDLE_INTERVAL', 10))      # Chu kỳ tối đa khi không có ai xem stream
+EVENT_RETENTION_HOURS = int(os.environ.get('EVENT_RETENTION_HOURS', 24))      # Xóa sự kiện cũ hơn
+EVENT_GAP_TIMEOUT     = 2.0     # event_id bị thiếu (insert chưa commit) quá lâu thì bỏ qua
+EVENT_PRUNE_INTERVAL  = 600
+
+log = logging.getLogger('events')
+
+
+class Event:
+    __slots__ = ('seq', 'event_type', 'data')
+
+    def __init__(self, seq, event_type, data):
+        self.seq        = seq
+        self.event_type = event_type
+        self.data       = data
+
+
+class EventBus:
+    """Bộ đệm vòng các sự kiện của một kênh, để stream chờ và client nối lại theo Last-Event-ID.
+
+    seq là event_id trong bảng app_events nên giống nhau trên mọi worker: client
+    nối lại vào worker khác vẫn tiếp tục được, miễn sự kiện còn trong bộ đệm.
+    """
+
+    def __init__(self, buffer_size=EVENT_BUFFER_SIZE):
+        self._events = deque(maxlen=buffer_size)
+        self._last   = 0
+        self._cond   = threading.Condition()
+
+    def event_id(self, event):
+        return str(event.seq)
+
+    def publish(self, seq, event_type, data):
+        with self._cond:
+            if seq <= self._last:
+                return None
+            event = Event(seq, event_type, data)
+            self._events.append(event)
+            self._last = seq
+            self._cond.notify_all()
+        return event
+
+    def parse_last_id(self, last_event_id):
+        """Vị trí bắt đầu từ Last-Event-ID; None nếu không thể nối tiếp (cần tải lại toàn bộ)."""
+        if not last_event_id:
+            return self._last
+        if not last_event_id.isdigit():
+            return None
+        seq = int(last_event_id)
+        with self._cond:
+            oldest = self._events[0].seq if self._events else self._last + 1
+            if seq < oldest - 1:
+                return None   # Đã trôi khỏi bộ đệm
+        # seq > _last: worker này chưa đọc tới sự kiện client đã thấy ở worker khác – chờ tiếp từ đó
+        return seq
+
+    def wait(self, after_seq, timeout):
+        """Chờ tối đa timeout giây, trả về các sự kiện có seq > after_seq."""
+        with self._cond:
+            if self._last <= after_seq:
+                self._cond.wait(timeout)
+            if self._last <= after_seq:
+                return []
+            return [e for e in self._events if e.seq > after_seq]
+
+
+# channel -> [(handler(event_id, event_type, data), replay_seconds)]
+_subscribers = {}
+_listener = {'pid': None}
+_listener_lock = threading.Lock()
+_wake = threading.Event()
+_watchers = {'count': 0}    # Số stream SSE đang mở trong tiến trình này
+_watchers_lock = threading.Lock()
+
+
+def subscribe(channel, handler, replay_seconds=0):
+    """Đăng ký nhận sự kiện của channel; khi worker khởi động sẽ nhận lại các sự kiện trong replay_seconds giây."""
+    _subscribers.setdefault(channel, []).append((handler, replay_seconds))
+
+
+def publish(channel, event_type, data):
+    """Ghi sự kiện vào nhật ký dùng chung (transaction riêng). Gọi SAU khi commit thay đổi."""
+    ensure_listener()
+    with get_pool().connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                "INSERT INTO app_events (channel, event_type, payload) VALUES (%s, %s, %s)",
+                (channel, event_type, json.dumps(data, default=str))
+            )
+            event_id = cursor.lastrowid
+            conn.commit()
+        finally:
+            cursor.close()
+    _wake.set()     # Worker hiện tại nhận sự kiện ngay, không chờ hết chu kỳ
+    return event_id
+
+
+@contextmanager
+def watching():
+    """Bao quanh vòng lặp của một stream: khi có người xem, luồng đọc chạy ở chu kỳ EVENT_POLL_INTERVAL."""
+    with _watchers_lock:
+        _watchers['count'] += 1
+    _wake.set()     # Đang nghỉ dài thì đọc lại ngay
+    try:
+        yield
+    finally:
+        with _watchers_lock:
+            _watchers['count'] -= 1
+
+
+def _next_interval(interval, got_events):
+    """Có stream đang mở hoặc vừa có sự kiện: đọc nhanh; nhàn rỗi: giãn dần tới EVENT_IDLE_INTERVAL."""
+    if _watchers['count'] or got_events:
+        return EVENT_POLL_INTERVAL
+    return min(interval * 2, EVENT_IDLE_INTERVAL)
+
+
+def _dispatch(rows):
+    for event_id, channel, event_type, payload in rows:
+        data = json.loads(payload) if isinstance(payload, (str, bytes)) else payload
+        for handler, _ in _subscribers.get(channel, ()):
+            try:
+                handler(event_id, event_type, data)
+            except Exception as e:
+                log.warning('Lỗi xử lý sự kiện %s/%s #%s: %s', channel, event_type, event_id, e)
+
+
+def _query(sql, params=()):
+    with get_pool().connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(sql, params)
+            if cursor.with_rows:
+                return cursor.fetchall()
+            conn.commit()
+            return cursor.rowcount
+        finally:
+            cursor.close()
+
+
+def _start_position():
+    """Mốc bắt đầu = event_id lớn nhất hiện tại, sau khi phát lại các sự kiện gần đây cho từng kênh."""
+    last_id = _query("SELECT COALESCE(MAX(event_id), 0) FROM app_events")[0][0]
+    for channel, subscribers in _subscribers.items():
+        replay_seconds = max(seconds for _, seconds in subscribers)
+        if replay_seconds > 0:
+            _dispatch(_query("""
+                SELECT event_id, channel, event_type, payload FROM app_events
+                WHERE channel = %s AND created_at >= NOW() - INTERVAL %s SECOND AND event_id <= %s
+                ORDER BY event_id
+            """, (channel, int(replay_seconds), last_id)))
+    return last_id
+
+
+def _poll(last_id, gap_since):
+    """Đọc và phát các sự kiện mới. Trả về (last_id, gap_since).
+
+    AUTO_INCREMENT cấp id trước khi commit, nên id nhỏ hơn có thể xuất hiện muộn hơn:
+    chỉ tiến qua chỗ bị thiếu id khi nó tồn tại quá EVENT_GAP_TIMEOUT giây.
+    """
+    rows = _query("""
+        SELECT event_id, channel, event_type, payload FROM app_events
+        WHERE event_id > %s ORDER BY event_id LIMIT 1000
+    """, (last_id,))
+    ready = []
+    for row in rows:
+        if row[0] != last_id + 1:
+            now = time.monotonic()
+            if gap_since is None:
+                gap_since = now
+            if now - gap_since < EVENT_GAP_TIMEOUT:
+                break
+        ready.append(row)
+        last_id = row[0]
+        gap_since = None
+    _dispatch(ready)
+    return last_id, gap_since
+
+
+def _listen(last_id):
+    """Vòng đọc nhật ký: 0.5 giây/lần khi có stream đang mở; khi nhàn rỗi giãn dần tới
+    EVENT_IDLE_INTERVAL (sự kiện khóa/thu hồi token từ worker khác trễ tối đa chừng đó).
+    Sự kiện do chính tiến trình này ghi được nhận ngay nhờ _wake."""
+    gap_since = None
+    pruned_at = time.monotonic()
+    interval = EVENT_POLL_INTERVAL
+    while True:
+        got_events = False
+        try:
+            if last_id is None:
+                last_id = _start_position()
+            previous = last_id
+            last_id, gap_since = _poll(last_id, gap_since)
+            got_events = last_id != previous or gap_since is not None
+            if time.monotonic() - pruned_at > EVENT_PRUNE_INTERVAL:
+                pruned_at = time.monotonic()
+                _query("DELETE FROM app_events WHERE created_at < NOW() - INTERVAL %s HOUR LIMIT 10000",
+                       (EVENT_RETENTION_HOURS,))
+        except Exception as e:
+            log.warning('Không đọc được nhật ký sự kiện: %s', e)
+        interval = _next_interval(interval, got_events)
+        if _wake.wait(interval):
+            interval = EVENT_POLL_INTERVAL
+        _wake.clear()
+
+
+def ensure_listener():
+    """Khởi động luồng đọc nhật ký sự kiện của tiến trình hiện tại (một lần sau mỗi fork)."""
+    if _listener['pid'] == os.getpid():
+        return
+    with _listener_lock:
+        if _listener['pid'] != os.getpid():
+            # Phát lại đồng bộ để request đầu tiên đã thấy trạng thái hiện tại (VD: token bị thu hồi)
+            try:
+                last_id = _start_position()
+            except Exception as e:
+                log.warning('Không đọc được nhật ký sự kiện: %s', e)
+                last_id = None
+            threading.Thread(target=_listen, args=(last_id,), name='event-listener', daemon=True).start()
+            _listener['pid'] = os.getpid()
+
+
+# Phiếu giao dịch được tạo / duyệt / từ chối
+TRANSACTION_REPLAY_SECONDS = 300
+transaction_events = EventBus()
+subscribe('transactions', transaction_events.publish, replay_seconds=TRANSACTION_REPLAY_SECONDS)
+
+
+def publish_transaction(event_type, transaction_id, status, **data):
+    """Gọi SAU khi commit. event_type: created | approved | rejected.
+
+    Lỗi ghi sự kiện không làm hỏng request (thay đổi đã commit); client sẽ nhận
+    `reset` khi nối lại nếu bị hụt sự kiện.
+    """
+    data.update(transaction_id=transaction_id, status=status)
+    try:
+        publish('transactions', event_type, data)
+    except Exception as e:
+        log.warning('Không ghi được sự kiện %s của phiếu #%s: %s', event_type, transaction_id, e)
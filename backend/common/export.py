@@ -0,0 +1,226 @@
+import csv
+import datetime
+import io
+
+EXPORT_FORMATS    = ('csv', 'parquet')
+EXPORT_BATCH_SIZE = 5000    # Số dòng mỗi lần fetchmany / mỗi row group Parquet
+
+# Kiểu cột: int | money (DECIMAL(15,2)) | str | bool | date | datetime
+DATASETS = {
+    'transactions': {
+        'table': 'transactions',
+        'date_column': 'created_at',
+        'id_column': 'transaction_id',
+        'columns': [
+            ('transaction_id', 'int'),
+            ('user_id', 'int'),
+            ('account_id', 'int'),
+            ('amount', 'money'),
+            ('transaction_type', 'str'),
+            ('status', 'str'),
+            ('processed_by', 'int'),
+            ('created_at', 'datetime'),
+        ],
+    },
+    'savings_accounts': {
+        'table': 'savings_accounts',
+        'date_column': 'opened_at',
+        'id_column': 'account_id',
+        'columns': [
+            ('account_id', 'int'),
+            ('user_id', 'int'),
+            ('product_id', 'int'),
+            ('principal_balance', 'money'),
+            ('accrued_interest', 'money'),
+            ('opened_at', 'datetime'),
+            ('maturity_date', 'date'),
+            ('early_withdrawal_eligible', 'bool'),
+            ('last_accrued_at', 'date'),
+            ('status', 'str'),
+        ],
+    },
+}
+
+
+class ExportError(ValueError):
+    """Tham số xuất dữ liệu không hợp lệ hoặc thiếu thư viện."""
+
+
+def build_query(dataset, date_from=None, date_to=None):
+    """Câu SELECT (sắp theo cột ngày + khóa chính để dùng index) và tham số lọc theo ngày."""
+    spec = DATASETS.get(dataset)
+    if spec is None:
+        raise ExportError(f"Dữ liệu không hợp lệ! Chỉ chấp nhận: {', '.join(DATASETS)}")
+
+    date_column = spec['date_column']
+    query = f"SELECT {', '.join(name for name, _ in spec['columns'])} FROM {spec['table']} WHERE 1=1"
+    params = []
+    if date_from:
+        query += f" AND {date_column} >= %s"
+        params.append(date_from)
+    if date_to:
+        query += f" AND {date_column} < %s"
+        params.append(date_to + datetime.timedelta(days=1))
+    query += f" ORDER BY {date_column}, {spec['id_column']}"
+    return query, params
+
+
+def iter_batches(conn, query, params, batch_size=EXPORT_BATCH_SIZE):
+    """Đọc kết quả bằng cursor không buffer, từng lô batch_size dòng (bộ nhớ không đổi)."""
+    cursor = conn.cursor()
+    try:
+        cursor.execute(query, tuple(params))
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        try:
+            # Đọc nốt phần còn lại nếu bị dừng giữa chừng để giải phóng kết nối
+            cursor.fetchall()
+        except Exception:
+            pass
+        cursor.close()
+
+
+def _csv_value(value):
+    # Decimal giữ nguyên dạng chuỗi ('1500000.50'), không qua float
+    if value is None:
+        return ''
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    return value
+
+
+def csv_chunks(dataset, batches):
+    """Sinh từng đoạn văn bản CSV (header + mỗi lô một đoạn)."""
+    columns = DATASETS[dataset]['columns']
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    writer.writerow([name for name, _ in columns])
+    yield buffer.getvalue()
+
+    for rows in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows([_csv_value(v) for v in row] for row in rows)
+        yield buffer.getvalue()
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ExportError('Xuất Parquet cần cài thêm thư viện pyarrow (pip install pyarrow)!')
+    return pyarrow, pyarrow.parquet
+
+
+def _arrow_schema(pa, columns):
+    types = {
+        'int': pa.int64(),
+        'money': pa.decimal128(15, 2),
+        'str': pa.string(),
+        'bool': pa.bool_(),
+        'date': pa.date32(),
+        'datetime': pa.timestamp('s'),
+    }
+    return pa.schema([(name, types[kind]) for name, kind in columns])
+
+
+class _ChunkSink:
+    """File giả để ParquetWriter ghi vào; phần đã ghi được lấy ra dần bằng drain()."""
+
+    def __init__(self):
+        self._buffer = io.BytesIO()
+        self._position = 0
+        self.closed = False
+
+    def write(self, data):
+        self._buffer.write(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def writable(self):
+        return True
+
+    def drain(self):
+        data = self._buffer.getvalue()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return data
+
+
+def parquet_chunks(dataset, batches):
+    """Sinh từng đoạn byte của file Parquet, mỗi lô là một row group."""
+    pa, pq = _pyarrow()
+    columns = DATASETS[dataset]['columns']
+    schema = _arrow_schema(pa, columns)
+
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    try:
+        for rows in batches:
+            arrays = [pa.array([row[i] for row in rows], type=schema.field(i).type)
+                      for i in range(len(columns))]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def _check_format(fmt):
+    if fmt not in EXPORT_FORMATS:
+        raise ExportError(f"Định dạng không hợp lệ! Chỉ chấp nhận: {', '.join(EXPORT_FORMATS)}")
+    if fmt == 'parquet':
+        _pyarrow()      # Báo lỗi thiếu thư viện trước khi bắt đầu truy vấn
+
+
+def export_chunks(conn, dataset, fmt, date_from=None, date_to=None, batch_size=EXPORT_BATCH_SIZE):
+    """Sinh nội dung file xuất (str với CSV, bytes với Parquet) theo từng lô."""
+    _check_format(fmt)
+    query, params = build_query(dataset, date_from, date_to)
+    batches = iter_batches(conn, query, params, batch_size)
+    if fmt == 'csv':
+        return csv_chunks(dataset, batches)
+    return parquet_chunks(dataset, batches)
+
+
+def export_to_file(conn, dataset, fmt, path, date_from=None, date_to=None,
+                   batch_size=EXPORT_BATCH_SIZE, on_batch=None):
+    """Ghi toàn bộ dữ liệu ra file, trả về số dòng đã ghi."""
+    _check_format(fmt)
+    query, params = build_query(dataset, date_from, date_to)
+
+    count = 0
+
+    def counted(batches):
+        nonlocal count
+        for rows in batches:
+            count += len(rows)
+            yield rows
+            if on_batch:
+                on_batch(count)
+
+    batches = counted(iter_batches(conn, query, params, batch_size))
+    if fmt == 'csv':
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            for chunk in csv_chunks(dataset, batches):
+                f.write(chunk)
+    else:
+        with open(path, 'wb') as f:
+            for chunk in parquet_chunks(dataset, batches):
+                f.write(chunk)
+    return count
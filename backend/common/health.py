@@ -0,0 +1,107 @@
+import logging
+import os
+import threading
+import time
+
+from flask import Blueprint, jsonify
+
+from common import events
+from common.db import REPLICA_HOSTS, get_pool, replica_status
+from common.refdata import get_configs, get_products
+from common.requireRole import set_locked_users
+
+health_bp = Blueprint('health', __name__)
+
+# Khóa/mở khóa được phát qua app_events; ngoài ra mỗi worker định kỳ nạp lại toàn bộ
+# danh sách user bị khóa từ DB để tự sửa nếu lỡ mất sự kiện (0 = tắt)
+LOCKED_USERS_REFRESH = float(os.environ.get('LOCKED_USERS_REFRESH', 30))
+
+log = logging.getLogger('health')
+
+_state = {'ready': False, 'draining': False, 'warmed_at': None}
+
+
+def load_locked_users():
+    with get_pool().connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT user_id FROM users WHERE status = 'LOCKED'")
+            user_ids = [row[0] for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+    set_locked_users(user_ids)
+    return len(user_ids)
+
+
+def _warm(app):
+    try:
+        with app.app_context():
+            get_products()
+            get_configs()
+        locked = load_locked_users()
+        events.ensure_listener()
+    except Exception as e:
+        log.warning('Worker %s nạp cache thất bại: %s', os.getpid(), e)
+        return
+    _state['ready'] = True
+    _state['warmed_at'] = time.time()
+    log.info('Worker %s đã nạp sẵn cache (%s user bị khóa)', os.getpid(), locked)
+
+
+def _refresh_loop(app):
+    while not _state['draining']:
+        time.sleep(LOCKED_USERS_REFRESH)
+        if not _state['ready']:
+            _warm(app)
+            continue
+        try:
+            load_locked_users()
+        except Exception as e:
+            log.warning('Không nạp lại được danh sách user bị khóa: %s', e)
+
+
+def warm_up(app):
+    """Nạp sẵn gói tiết kiệm, tham số hệ thống và danh sách user bị khóa trước khi nhận request.
+
+    Gọi trong từng worker (sau fork). Lỗi DB không làm worker chết: /api/health/ready
+    báo chưa sẵn sàng và luồng nền thử nạp lại sau mỗi LOCKED_USERS_REFRESH giây.
+    """
+    _warm(app)
+    if LOCKED_USERS_REFRESH > 0:
+        threading.Thread(target=_refresh_loop, args=(app,), name='locked-users-refresh', daemon=True).start()
+
+
+def mark_draining():
+    """Worker sắp tắt (reload/deploy): readiness trả 503 để load balancer ngừng gửi request mới."""
+    _state['draining'] = True
+
+
+@health_bp.route('/api/health/live', methods=['GET'])
+def liveness():
+    """Tiến trình còn sống và phục vụ được request (không chạm DB)."""
+    return jsonify({'status': 'alive', 'pid': os.getpid()}), 200
+
+
+@health_bp.route('/api/health/ready', methods=['GET'])
+def readiness():
+    """Worker đã nạp cache, không đang tắt và lấy được kết nối DB."""
+    checks = {'warmed': _state['ready'], 'draining': _state['draining'], 'database': False}
+    try:
+        with get_pool().connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("SELECT 1")
+                cursor.fetchall()
+            finally:
+                cursor.close()
+        checks['database'] = True
+    except Exception as e:
+        checks['database_error'] = str(e)
+
+    if REPLICA_HOSTS:
+        # Chỉ để theo dõi: replica trễ/lỗi thì request đọc tự chuyển về primary
+        checks['replicas'] = replica_status()
+
+    ok = checks['warmed'] and checks['database'] and not checks['draining']
+    return jsonify({'status': 'ready' if ok else 'not_ready', 'pid': os.getpid(), 'checks': checks}), \
+        200 if ok else 503
@@ -0,0 +1,283 @@
+import datetime
+import functools
+
+import numpy as np
+
+from common.refdata import get_products, get_products_by_id, get_config
+
+DAYS_PER_YEAR = 365
+
+# Lãi suất không kỳ hạn dùng khi rút trước hạn / sau khi đáo hạn:
+# lấy theo gói không kỳ hạn (term_months = 0) đang hoạt động, nếu không có thì dùng tham số hệ thống.
+NON_TERM_RATE_CONFIG_KEY = 'NON_TERM_INTEREST_RATE'
+
+ACCRUAL_CHUNK_SIZE = 50000
+SCHEDULE_CACHE_SIZE = 512
+
+
+def non_term_rate():
+    """Lãi suất không kỳ hạn hiện hành (%/năm)."""
+    rates = [p['interest_rate'] for p in get_products() if p['term_months'] == 0 and p['is_active']]
+    if rates:
+        return float(min(rates))
+    try:
+        return float(get_config(NON_TERM_RATE_CONFIG_KEY, 0))
+    except ValueError:
+        return 0.0
+
+
+def add_months(dates, months):
+    """Cộng số tháng cho mảng ngày (datetime64[D]); ngày cuối tháng được kẹp lại (31/01 + 1 tháng = 28/02)."""
+    month_start = dates.astype('datetime64[M]')
+    day_of_month = (dates - month_start.astype('datetime64[D]')).astype(np.int64)
+    target = month_start + months.astype('timedelta64[M]')
+    month_len = ((target + np.timedelta64(1, 'M')).astype('datetime64[D]')
+                 - target.astype('datetime64[D]')).astype(np.int64)
+    return target.astype('datetime64[D]') + np.minimum(day_of_month, month_len - 1).astype('timedelta64[D]')
+
+
+def compute_accrual(principal_cents, opened, rate, term_months, min_days_hold, as_of, non_term):
+    """Tính lãi dự thu cho cả mảng sổ cùng lúc (không lặp từng dòng).
+
+    Lãi dự thu = số tiền lãi nhận được nếu tất toán vào ngày as_of, theo cùng bảng
+    rate_schedule với báo giá tất toán (quote_accounts): chưa giữ đủ min_days_hold
+    thì 0, rút trước hạn hưởng lãi không kỳ hạn (non_term), sau đáo hạn cộng thêm
+    lãi không kỳ hạn cho các ngày vượt kỳ hạn.
+
+    Trả về dict các mảng: accrued_cents, maturity_date (NaT nếu không kỳ hạn),
+    days_held, matured, early_withdrawal_eligible.
+    """
+    as_of = np.datetime64(as_of, 'D')
+    days_held = np.maximum((as_of - opened).astype(np.int64), 0)
+
+    has_term = term_months > 0
+    maturity = add_months(opened, term_months)
+    term_days = (maturity - opened).astype(np.int64)
+    matured = has_term & (as_of >= maturity)
+
+    factors = interest_factors(rate, term_months, min_days_hold, non_term, term_days, days_held)
+    accrued = np.rint(principal_cents * factors).astype(np.int64)
+
+    return {
+        'accrued_cents': accrued,
+        'maturity_date': np.where(has_term, maturity, np.datetime64('NaT')),
+        'days_held': days_held,
+        'matured': matured,
+        'early_withdrawal_eligible': days_held >= min_days_hold,
+    }
+
+
+def _product_arrays(products):
+    """Bảng tra theo product_id: lãi suất, kỳ hạn, số ngày tối thiểu."""
+    size = max((p['product_id'] for p in products), default=0) + 1
+    rate = np.zeros(size, dtype=np.float64)
+    term = np.zeros(size, dtype=np.int64)
+    min_days = np.zeros(size, dtype=np.int64)
+    for p in products:
+        rate[p['product_id']] = float(p['interest_rate'])
+        term[p['product_id']] = p['term_months']
+        min_days[p['product_id']] = p['min_days_hold'] or 0
+    return rate, term, min_days
+
+
+def _to_date(value, default):
+    if value is None:
+        return default
+    return value.date() if isinstance(value, datetime.datetime) else value
+
+
+def _cents_to_str(cents):
+    return '%d.%02d' % divmod(int(cents), 100)
+
+
+def run_accrual(conn, as_of=None, chunk_size=ACCRUAL_CHUNK_SIZE, on_chunk=None):
+    """Chạy tính lãi cho toàn bộ sổ ACTIVE theo từng khối account_id, ghi lại bằng executemany.
+
+    Mỗi khối commit riêng. Trả về tổng số sổ đã xử lý.
+    """
+    as_of = as_of or datetime.date.today()
+    rate_by_pid, term_by_pid, min_days_by_pid = _product_arrays(get_products())
+    nt_rate = non_term_rate()
+
+    cursor = conn.cursor()
+    last_id = 0
+    processed = 0
+    try:
+        while True:
+            cursor.execute("""
+                SELECT account_id, product_id, principal_balance, opened_at
+                FROM savings_accounts
+                WHERE status = 'ACTIVE' AND account_id > %s
+                ORDER BY account_id
+                LIMIT %s
+            """, (last_id, chunk_size))
+            rows = cursor.fetchall()
+            if not rows:
+                break
+
+            account_id, product_id, principal, opened_at = zip(*rows)
+            pid = np.array(product_id, dtype=np.int64)
+            pid = np.where(pid < len(rate_by_pid), pid, 0)   # Gói không tồn tại -> lãi 0
+
+            result = compute_accrual(
+                principal_cents=np.array([int(p * 100) for p in principal], dtype=np.int64),
+                opened=np.array([_to_date(d, as_of) for d in opened_at], dtype='datetime64[D]'),
+                rate=rate_by_pid[pid],
+                term_months=term_by_pid[pid],
+                min_days_hold=min_days_by_pid[pid],
+                as_of=as_of,
+                non_term=nt_rate,
+            )
+
+            maturity = result['maturity_date'].astype(object)   # NaT -> None
+            # Sổ vừa bị tất toán giữa lúc tính (status khác ACTIVE) không bị ghi đè
+            cursor.executemany("""
+                UPDATE savings_accounts
+                SET accrued_interest = %s, maturity_date = %s, early_withdrawal_eligible = %s, last_accrued_at = %s
+                WHERE account_id = %s AND status = 'ACTIVE'
+            """, [
+                (_cents_to_str(result['accrued_cents'][i]), maturity[i],
+                 bool(result['early_withdrawal_eligible'][i]), as_of, account_id[i])
+                for i in range(len(rows))
+            ])
+            conn.commit()
+
+            processed += len(rows)
+            last_id = account_id[-1]
+            if on_chunk:
+                on_chunk(processed)
+    finally:
+        cursor.close()
+    return processed
+
+
+# ============================================================
+#  BÁO GIÁ TẤT TOÁN (QUOTE)
+# ============================================================
+
+@functools.lru_cache(maxsize=SCHEDULE_CACHE_SIZE)
+def rate_schedule(interest_rate, term_months, min_days_hold, non_term_rate, term_days):
+    """Bảng hệ số lãi theo số ngày đã gửi cho một gói (được memoize).
+
+    Trả về (table, tail_slope): hệ số lãi của ngày d là table[d]; sau cuối bảng
+    hệ số tăng tuyến tính thêm tail_slope mỗi ngày.
+
+    - Không kỳ hạn: lãi suất gói nếu đã giữ đủ min_days_hold, ngược lại 0.
+    - Có kỳ hạn, rút trước hạn: lãi không kỳ hạn nếu đã giữ đủ min_days_hold, ngược lại 0.
+    - Có kỳ hạn, đã đáo hạn: lãi hợp đồng cho cả kỳ + lãi không kỳ hạn cho các ngày sau đáo hạn.
+    """
+    daily_rate = interest_rate / 100.0 / DAYS_PER_YEAR
+    daily_non_term = non_term_rate / 100.0 / DAYS_PER_YEAR
+
+    if term_months == 0:
+        days = np.arange(min_days_hold + 1)
+        table = np.where(days >= min_days_hold, days * daily_rate, 0.0)
+        slope = daily_rate
+    else:
+        days = np.arange(term_days + 1)
+        table = np.where(days >= min_days_hold, days * daily_non_term, 0.0)
+        table[term_days] = term_days * daily_rate
+        slope = daily_non_term
+
+    table.setflags(write=False)
+    return table, slope
+
+
+def clear_rate_schedules():
+    """Xóa bảng hệ số đã memoize (gọi khi Admin thay đổi gói tiết kiệm)."""
+    rate_schedule.cache_clear()
+
+
+def _schedule_factors(schedule, days):
+    """Hệ số lãi tại các số ngày `days` (mảng) theo một bảng rate_schedule."""
+    table, slope = schedule
+    last = len(table) - 1
+    return np.where(days <= last, table[np.minimum(days, last)], table[last] + slope * (days - last))
+
+
+def interest_factors(rate, term_months, min_days_hold, non_term, term_days, days_held):
+    """Hệ số lãi (tiền lãi / tiền gốc) của từng sổ – dùng chung cho tính lãi dự thu và báo giá tất toán.
+
+    Các sổ được gom theo (lãi suất, kỳ hạn, min_days_hold, số ngày của kỳ hạn) để mỗi
+    nhóm chỉ tra một bảng rate_schedule (đã memoize).
+    """
+    days_held = np.asarray(days_held, dtype=np.int64)
+    term_months = np.asarray(term_months, dtype=np.int64)
+    term_days = np.where(term_months > 0, term_days, 0)   # Không kỳ hạn: số ngày kỳ hạn không dùng tới
+    keys = np.column_stack([
+        np.broadcast_to(np.asarray(rate, dtype=np.float64), days_held.shape),
+        term_months,
+        np.broadcast_to(np.asarray(min_days_hold, dtype=np.int64), days_held.shape),
+        term_days,
+    ])
+    factors = np.zeros(len(days_held), dtype=np.float64)
+    if not len(days_held):
+        return factors
+
+    groups, inverse = np.unique(keys, axis=0, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    for g, (g_rate, g_term, g_min_days, g_term_days) in enumerate(groups):
+        members = inverse == g
+        schedule = rate_schedule(float(g_rate), int(g_term), int(g_min_days), float(non_term), int(g_term_days))
+        factors[members] = _schedule_factors(schedule, days_held[members])
+    return factors
+
+
+def quote_accounts(rows, as_of=None):
+    """Tính số tiền nhận được nếu tất toán vào ngày as_of cho danh sách sổ.
+
+    rows: [(account_id, product_id, principal_balance, opened_at, status), ...]
+    Thông tin gói lấy từ cache trong bộ nhớ, không truy vấn lại từng sổ.
+    """
+    as_of = as_of or datetime.date.today()
+    if not rows:
+        return []
+
+    products = get_products_by_id()
+    nt_rate = non_term_rate()
+
+    def product_value(row, key):
+        return products.get(row[1], {}).get(key) or 0
+
+    opened = np.array([_to_date(r[3], as_of) for r in rows], dtype='datetime64[D]')
+    terms = np.array([product_value(r, 'term_months') for r in rows], dtype=np.int64)
+    maturity = add_months(opened, terms)
+    term_days = (maturity - opened).astype(np.int64)
+    days_held = np.maximum((np.datetime64(as_of, 'D') - opened).astype(np.int64), 0)
+    factors = interest_factors(
+        np.array([float(product_value(r, 'interest_rate')) for r in rows], dtype=np.float64),
+        terms,
+        np.array([product_value(r, 'min_days_hold') for r in rows], dtype=np.int64),
+        nt_rate, term_days, days_held,
+    )
+
+    quotes = []
+    for i, (account_id, product_id, principal, _, status) in enumerate(rows):
+        product = products.get(product_id)
+        if product is None:
+            quotes.append({'account_id': account_id, 'error': 'Không tìm thấy gói tiết kiệm của sổ!'})
+            continue
+        if status != 'ACTIVE':
+            quotes.append({'account_id': account_id, 'error': f'Sổ không ở trạng thái ACTIVE (Hiện tại: {status})'})
+            continue
+
+        term = int(terms[i])
+        days = int(days_held[i])
+        matured = term > 0 and days >= term_days[i]
+
+        principal_cents = int(principal * 100)
+        interest_cents = int(np.rint(principal_cents * factors[i]))
+
+        quotes.append({
+            'account_id': account_id,
+            'product_id': product_id,
+            'principal_balance': principal_cents / 100,
+            'interest': interest_cents / 100,
+            'payout': (principal_cents + interest_cents) / 100,
+            'days_held': days,
+            'maturity_date': str(maturity[i]) if term > 0 else None,
+            'matured': bool(matured),
+            'early_withdrawal': term > 0 and not matured,
+            'min_days_hold_met': days >= (product['min_days_hold'] or 0),
+        })
+    return quotes
@@ -0,0 +1,339 @@
+import datetime
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from common.db import get_pool
+
+JOB_WORKERS      = int(os.environ.get('JOB_WORKERS', 4))
+JOB_ARTIFACT_DIR = os.environ.get(
+    'JOB_ARTIFACT_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'job_artifacts')
+)
+PROGRESS_INTERVAL = 1.0    # Ghi tiến độ / kiểm tra hủy tối đa 1 lần mỗi giây
+JOB_POLL_INTERVAL      = float(os.environ.get('JOB_POLL_INTERVAL', 1))         # Chu kỳ runner tìm job QUEUED
+JOB_HEARTBEAT_INTERVAL = float(os.environ.get('JOB_HEARTBEAT_INTERVAL', 10))   # Chu kỳ ghi heartbeat_at
+JOB_STALE_SECONDS      = int(os.environ.get('JOB_STALE_SECONDS', 60))          # Quá hạn này coi runner đã chết
+JOB_MAX_ATTEMPTS       = int(os.environ.get('JOB_MAX_ATTEMPTS', 3))            # Số lần chạy tối đa khi runner chết giữa chừng
+
+log = logging.getLogger('jobs')
+
+# job_type -> (hàm xử lý, các role được phép tạo)
+_handlers = {}
+# (hàm, chu kỳ giây): việc bảo trì runner chạy định kỳ, không qua bảng jobs
+_periodic = []
+
+_active = {}                # job_id -> attempt của các job đang chạy trong runner này
+_shutting_down = threading.Event()
+
+
+class JobCancelled(Exception):
+    """Công việc bị hủy theo yêu cầu người dùng.
+
+    Handler có thể gán `result` (dict, có thể kèm result_path) để lưu kết quả dở dang.
+    """
+    result = None
+
+
+class JobInterrupted(JobCancelled):
+    """Runner đang tắt êm: job dừng lại và được trả về hàng đợi để chạy lại từ đầu."""
+
+
+class JobLeaseLost(JobInterrupted):
+    """Job đã bị runner khác nhận lại (heartbeat quá hạn): dừng ngay, không ghi gì thêm."""
+
+
+def job_handler(job_type, roles):
+    """Đăng ký hàm xử lý cho một loại công việc: fn(ctx) -> dict tóm tắt kết quả."""
+    def decorator(fn):
+        _handlers[job_type] = (fn, frozenset(roles))
+        return fn
+    return decorator
+
+
+def periodic_task(interval):
+    """Đăng ký việc định kỳ cho runner: fn() chạy trong app context mỗi `interval` giây."""
+    def decorator(fn):
+        _periodic.append((fn, interval))
+        return fn
+    return decorator
+
+
+def job_types():
+    return {job_type: roles for job_type, (_, roles) in _handlers.items()}
+
+
+def _execute(sql, params=()):
+    """Ghi trạng thái job trên kết nối riêng để không commit nhầm công việc đang làm dở."""
+    with get_pool().connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(sql, params)
+            conn.commit()
+            return cursor.lastrowid, cursor.rowcount
+        finally:
+            cursor.close()
+
+
+class JobContext:
+    """Thông tin và tiện ích cho hàm xử lý đang chạy."""
+
+    def __init__(self, job_id, job_type, params, user_id, attempt=1):
+        self.job_id   = job_id
+        self.job_type = job_type
+        self.params   = params
+        self.user_id  = user_id
+        self.attempt  = attempt
+        self._last_progress_at = 0.0
+        self._last_cancel_check = 0.0
+
+    def artifact_path(self, filename):
+        """Đường dẫn file kết quả của job (thư mục riêng cho mỗi job)."""
+        directory = os.path.join(JOB_ARTIFACT_DIR, str(self.job_id))
+        os.makedirs(directory, exist_ok=True)
+        return os.path.join(directory, filename)
+
+    def set_progress(self, done, total=None, force=False):
+        now = time.monotonic()
+        if not force and now - self._last_progress_at < PROGRESS_INTERVAL:
+            return
+        self._last_progress_at = now
+        _execute("""
+            UPDATE jobs SET progress = %s, total = COALESCE(%s, total), heartbeat_at = NOW()
+            WHERE job_id = %s AND attempt = %s AND status = 'RUNNING'
+        """, (done, total, self.job_id, self.attempt))
+
+    def check_cancelled(self):
+        """Ném JobCancelled nếu người dùng đã yêu cầu hủy, JobInterrupted nếu runner đang tắt,
+        JobLeaseLost nếu job đã bị runner khác nhận lại (gọi giữa các khối công việc)."""
+        if _shutting_down.is_set():
+            raise JobInterrupted()
+        now = time.monotonic()
+        if now - self._last_cancel_check < PROGRESS_INTERVAL:
+            return
+        self._last_cancel_check = now
+        with get_pool().connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("""
+                    UPDATE jobs SET heartbeat_at = NOW()
+                    WHERE job_id = %s AND attempt = %s AND status = 'RUNNING'
+                """, (self.job_id, self.attempt))
+                owned = cursor.rowcount == 1
+                conn.commit()
+                cursor.execute("SELECT cancel_requested FROM jobs WHERE job_id = %s", (self.job_id,))
+                row = cursor.fetchone()
+            finally:
+                cursor.close()
+        if not owned:
+            raise JobLeaseLost()
+        if row and row[0]:
+            raise JobCancelled()
+
+
+def enqueue(job_type, params, user_id):
+    """Tạo job ở trạng thái QUEUED; runner (flask --app app run-jobs) sẽ nhận và chạy. Trả về job_id."""
+    if job_type not in _handlers:
+        raise ValueError(f'Loại công việc không hợp lệ: {job_type}')
+    job_id, _ = _execute(
+        "INSERT INTO jobs (job_type, params, created_by) VALUES (%s, %s, %s)",
+        (job_type, json.dumps(params or {}), user_id)
+    )
+    return job_id
+
+
+def request_cancel(job_id):
+    """Đánh dấu hủy; job chưa chạy sẽ chuyển sang CANCELLED ngay."""
+    _execute("UPDATE jobs SET cancel_requested = TRUE WHERE job_id = %s", (job_id,))
+    _execute("UPDATE jobs SET status = 'CANCELLED', finished_at = %s WHERE job_id = %s AND status = 'QUEUED'",
+             (datetime.datetime.now(), job_id))
+
+
+def _run(app, job_id, job_type, params, user_id, attempt):
+    try:
+        _run_job(app, job_id, job_type, params, user_id, attempt)
+    finally:
+        _active.pop(job_id, None)
+
+
+def _requeue(job_id, attempt):
+    # Tắt êm không tính là một lần chạy hỏng: trả lại attempt để lần nhận sau không bị trừ lượt
+    _execute("""
+        UPDATE jobs SET status = 'QUEUED', requeued_at = %s, started_at = NULL, progress = 0,
+                        heartbeat_at = NULL, attempt = attempt - 1
+        WHERE job_id = %s AND status = 'RUNNING' AND attempt = %s
+    """, (datetime.datetime.now(), job_id, attempt))
+
+
+def _finish(job_id, attempt, status, result=None, result_path=None, error=None):
+    # attempt khớp: runner này vẫn giữ job (chưa bị nhận lại vì heartbeat quá hạn)
+    _execute("""
+        UPDATE jobs SET status = %s, result = %s, result_path = %s, error = %s, finished_at = %s
+        WHERE job_id = %s AND attempt = %s AND status = 'RUNNING'
+    """, (status, result, result_path, error, datetime.datetime.now(), job_id, attempt))
+
+
+def _run_job(app, job_id, job_type, params, user_id, attempt):
+    handler, _ = _handlers[job_type]
+    ctx = JobContext(job_id, job_type, params, user_id, attempt)
+    try:
+        # Chạy trong app context để dùng chung db_conn/db_cursor và cache như request
+        with app.app_context():
+            result = handler(ctx) or {}
+        _finish(job_id, attempt, 'SUCCEEDED', json.dumps(result, default=str), result.get('result_path'))
+    except JobLeaseLost:
+        log.warning('Job %s đã bị runner khác nhận lại, bỏ kết quả lần chạy %s', job_id, attempt)
+    except JobInterrupted:
+        _requeue(job_id, attempt)
+    except JobCancelled as e:
+        result = e.result or {}
+        _finish(job_id, attempt, 'CANCELLED', json.dumps(result, default=str) if e.result else None,
+                result.get('result_path'))
+    except Exception as e:
+        _finish(job_id, attempt, 'FAILED', error=str(e))
+
+
+def claim_jobs(app, executor, limit):
+    """Nhận tối đa `limit` job QUEUED và đưa vào thread pool của runner. Trả về số job đã nhận."""
+    with get_pool().connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute("""
+                SELECT job_id, job_type, params, created_by, attempt FROM jobs
+                WHERE status = 'QUEUED'
+                ORDER BY job_id LIMIT %s
+            """, (limit,))
+            rows = cursor.fetchall()
+        finally:
+            cursor.close()
+
+    claimed = 0
+    for job_id, job_type, params, user_id, attempt in rows:
+        if _shutting_down.is_set():
+            break
+        # Chỉ một runner đổi được QUEUED -> RUNNING với đúng attempt đã đọc
+        _, won = _execute("""
+            UPDATE jobs SET status = 'RUNNING', started_at = %s, heartbeat_at = NOW(),
+                            attempt = attempt + 1, requeued_at = NULL
+            WHERE job_id = %s AND status = 'QUEUED' AND attempt = %s
+        """, (datetime.datetime.now(), job_id, attempt))
+        if not won:
+            continue
+        attempt += 1
+        if job_type not in _handlers:
+            _finish(job_id, attempt, 'FAILED', error=f'Loại công việc không hợp lệ: {job_type}')
+            continue
+        params = json.loads(params) if isinstance(params, (str, bytes)) else (params or {})
+        _active[job_id] = attempt
+        executor.submit(_run, app, job_id, job_type, params, user_id, attempt)
+        claimed += 1
+    return claimed
+
+
+def reclaim_stale_jobs():
+    """Trả về hàng đợi các job RUNNING có heartbeat quá JOB_STALE_SECONDS (runner đã chết).
+
+    Job đã chạy hỏng JOB_MAX_ATTEMPTS lần bị đánh dấu FAILED thay vì chạy lại mãi.
+    Trả về (số job trả về hàng đợi, số job FAILED).
+    """
+    now = datetime.datetime.now()
+    _, failed = _execute("""
+        UPDATE jobs SET status = 'FAILED', error = 'Runner dừng giữa chừng quá số lần cho phép', finished_at = %s
+        WHERE status = 'RUNNING' AND heartbeat_at < NOW() - INTERVAL %s SECOND AND attempt >= %s
+    """, (now, JOB_STALE_SECONDS, JOB_MAX_ATTEMPTS))
+    _, requeued = _execute("""
+        UPDATE jobs SET status = 'QUEUED', requeued_at = %s, started_at = NULL, progress = 0, heartbeat_at = NULL
+        WHERE status = 'RUNNING' AND heartbeat_at < NOW() - INTERVAL %s SECOND
+    """, (now, JOB_STALE_SECONDS))
+    return requeued, failed
+
+
+def _heartbeat_loop():
+    # Giữ job sống cả khi handler đang kẹt trong một lệnh dài không gọi check_cancelled()
+    while not _shutting_down.wait(JOB_HEARTBEAT_INTERVAL):
+        for job_id, attempt in list(_active.items()):
+            try:
+                _execute("UPDATE jobs SET heartbeat_at = NOW() WHERE job_id = %s AND attempt = %s AND status = 'RUNNING'",
+                         (job_id, attempt))
+            except Exception as e:
+                log.warning('Không ghi được heartbeat job %s: %s', job_id, e)
+
+
+def _periodic_loop(app):
+    # Luồng riêng: việc định kỳ chạy lâu không làm chậm việc nhận job
+    next_run = {fn: 0.0 for fn, _ in _periodic}
+    while not _shutting_down.is_set():
+        for fn, interval in _periodic:
+            if _shutting_down.is_set() or time.monotonic() < next_run[fn]:
+                continue
+            try:
+                with app.app_context():
+                    fn()
+            except Exception as e:
+                log.warning('Việc định kỳ %s lỗi: %s', fn.__name__, e)
+            next_run[fn] = time.monotonic() + interval
+        _shutting_down.wait(JOB_POLL_INTERVAL)
+
+
+def run_worker(app, workers=None):
+    """Vòng lặp của tiến trình runner: nhận job QUEUED, ghi heartbeat, thu hồi job của runner đã chết
+    và chạy các việc định kỳ (periodic_task).
+
+    Chạy tới khi shutdown() được gọi (SIGTERM/SIGINT); job đang chạy dừng ở lần check_cancelled()
+    kế tiếp và được trả về hàng đợi cho runner sau chạy lại từ đầu.
+    """
+    workers = workers or JOB_WORKERS
+    _shutting_down.clear()
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='job')
+    threading.Thread(target=_heartbeat_loop, name='job-heartbeat', daemon=True).start()
+    if _periodic:
+        threading.Thread(target=_periodic_loop, args=(app,), name='job-periodic', daemon=True).start()
+    next_reclaim = 0.0
+    try:
+        while not _shutting_down.is_set():
+            try:
+                if time.monotonic() >= next_reclaim:
+                    requeued, failed = reclaim_stale_jobs()
+                    if requeued or failed:
+                        log.warning('Thu hồi job quá hạn heartbeat: %s trả về hàng đợi, %s FAILED', requeued, failed)
+                    next_reclaim = time.monotonic() + JOB_HEARTBEAT_INTERVAL
+                free = workers - len(_active)
+                if free > 0:
+                    claim_jobs(app, executor, free)
+            except Exception as e:
+                log.warning('Runner không đọc được hàng đợi job: %s', e)
+            _shutting_down.wait(JOB_POLL_INTERVAL)
+    finally:
+        executor.shutdown(wait=True)
+
+
+def start_runner_thread(app):
+    """Chạy runner trong luồng nền của tiến trình hiện tại (chỉ dùng cho `python app.py`)."""
+    thread = threading.Thread(target=run_worker, args=(app,), name='job-runner', daemon=True)
+    thread.start()
+    return thread
+
+
+def shutdown():
+    """Runner tắt êm: ngừng nhận job mới, job đang chạy tự trả về hàng đợi ở lần check_cancelled() tới."""
+    _shutting_down.set()
+
+
+def get_job(job_id):
+    with get_pool().connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        try:
+            cursor.execute("""
+                SELECT job_id, job_type, status, progress, total, result, result_path, error,
+                       cancel_requested, created_by, created_at, started_at, finished_at, heartbeat_at, attempt
+                FROM jobs WHERE job_id = %s
+            """, (job_id,))
+            row = cursor.fetchone()
+        finally:
+            cursor.close()
+    if row and isinstance(row['result'], (str, bytes)):
+        row['result'] = json.loads(row['result'])
+    return row
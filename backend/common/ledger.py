@@ -0,0 +1,96 @@
+import random
+from decimal import Decimal
+
+# Tổng số dư hệ thống chia thành BALANCE_SLOTS dòng (balance_id 1..BALANCE_SLOTS), tổng = SUM các dòng.
+# Mỗi lần ghi chỉ khóa một dòng ngẫu nhiên: các transaction duyệt phiếu không xếp hàng chờ nhau
+# trên một dòng duy nhất.
+BALANCE_SLOTS = 16
+BALANCE_ROW_ID = 1      # Dòng nhận số liệu đối soát (reconcile --fix)
+
+
+def apply_balance_delta(cursor, wallet_delta=0, savings_delta=0):
+    """Cộng dồn thay đổi vào tổng số dư hệ thống (một dòng slot ngẫu nhiên).
+
+    Phải gọi trong cùng transaction với thay đổi ví/sổ tiết kiệm để hai
+    bên luôn được commit (hoặc rollback) cùng nhau.
+    """
+    if not wallet_delta and not savings_delta:
+        return
+    params = (Decimal(wallet_delta), Decimal(savings_delta), random.randint(1, BALANCE_SLOTS))
+    cursor.execute("""
+        UPDATE system_balances
+        SET total_wallet_balance    = total_wallet_balance + %s,
+            total_savings_principal = total_savings_principal + %s
+        WHERE balance_id = %s
+    """, params)
+    if cursor.rowcount == 0:
+        # Dòng slot chưa có (database chưa chạy migration 017): tạo luôn, không làm mất thay đổi
+        cursor.execute("""
+            INSERT INTO system_balances (total_wallet_balance, total_savings_principal, balance_id)
+            VALUES (%s, %s, %s)
+            ON DUPLICATE KEY UPDATE total_wallet_balance = total_wallet_balance + VALUES(total_wallet_balance),
+                                    total_savings_principal = total_savings_principal + VALUES(total_savings_principal)
+        """, params)
+
+
+BALANCES_QUERY = """
+    SELECT SUM(total_wallet_balance), SUM(total_savings_principal)
+    FROM system_balances WHERE balance_id BETWEEN 1 AND %s
+"""
+
+
+def get_balances(cursor):
+    """Đọc tổng số dư đã được duy trì sẵn: cộng BALANCE_SLOTS dòng theo khoảng khóa chính."""
+    cursor.execute(BALANCES_QUERY, (BALANCE_SLOTS,))
+    row = cursor.fetchone()
+    return row if row and row[0] is not None else None
+
+
+def compute_balances(cursor):
+    """Tính lại tổng số dư bằng cách quét toàn bộ bảng (dùng để đối soát)."""
+    cursor.execute("SELECT COALESCE(SUM(wallet_balance), 0) FROM users WHERE role = 'CUSTOMER'")
+    total_wallet = cursor.fetchone()[0]
+
+    cursor.execute("SELECT COALESCE(SUM(principal_balance), 0) FROM savings_accounts WHERE status = 'ACTIVE'")
+    total_savings = cursor.fetchone()[0]
+
+    return Decimal(total_wallet), Decimal(total_savings)
+
+
+def reconcile(cursor, fix=False):
+    """So sánh số dư đang duy trì với số liệu quét thực tế.
+
+    Trả về dict mô tả độ lệch; nếu fix=True thì ghi đè bằng số liệu thực tế
+    (caller tự commit).
+    """
+    actual_wallet, actual_savings = compute_balances(cursor)
+    row = get_balances(cursor)
+    stored_wallet, stored_savings = (Decimal(row[0]), Decimal(row[1])) if row else (None, None)
+
+    report = {
+        'total_wallet_balance': {
+            'stored': stored_wallet,
+            'actual': actual_wallet,
+            'drift':  None if stored_wallet is None else stored_wallet - actual_wallet,
+        },
+        'total_savings_principal': {
+            'stored': stored_savings,
+            'actual': actual_savings,
+            'drift':  None if stored_savings is None else stored_savings - actual_savings,
+        },
+    }
+    report['ok'] = all(item['drift'] == 0 for item in (report['total_wallet_balance'],
+                                                       report['total_savings_principal']))
+
+    if fix and not report['ok']:
+        # Dồn số liệu thực tế vào dòng BALANCE_ROW_ID, các slot khác về 0
+        rows = [(slot, actual_wallet, actual_savings) if slot == BALANCE_ROW_ID else (slot, 0, 0)
+                for slot in range(1, BALANCE_SLOTS + 1)]
+        cursor.execute(f"""
+            INSERT INTO system_balances (balance_id, total_wallet_balance, total_savings_principal)
+            VALUES {', '.join(['(%s, %s, %s)'] * len(rows))}
+            ON DUPLICATE KEY UPDATE total_wallet_balance = VALUES(total_wallet_balance),
+                                    total_savings_principal = VALUES(total_savings_principal)
+        """, tuple(value for row in rows for value in row))
+
+    return report
@@ -0,0 +1,338 @@
+import fcntl
+import glob
+import hmac
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from flask import Response, g, request
+
+# Mốc histogram (giây)
+LATENCY_BUCKETS     = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 500)
+
+# /api/metrics luôn yêu cầu Authorization: Bearer <METRICS_TOKEN> hoặc JWT của ADMIN
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+# Mỗi worker ghi số liệu của mình ra METRICS_DIR/metrics-<pid>.json; lần scrape (rơi vào worker
+# bất kỳ) cộng gộp mọi file nên số liệu là của cả máy chủ, counter không nhảy lùi giữa các lần scrape.
+# Số liệu của worker đã thoát được gộp vào metrics-archive.json.
+METRICS_DIR            = os.environ.get('METRICS_DIR') or os.path.join(tempfile.gettempdir(), 'smart_savings_metrics')
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 5))
+
+log = logging.getLogger('metrics')
+
+
+class Histogram:
+    """Histogram theo nhãn, an toàn đa luồng, xuất ra định dạng Prometheus."""
+
+    def __init__(self, name, help_text, label_names, buckets):
+        self.name        = name
+        self.help_text   = help_text
+        self.label_names = label_names
+        self.buckets     = buckets
+        self._series     = {}   # labels -> [bucket_counts, sum, count]
+        self._lock       = threading.Lock()
+
+    def observe(self, labels, value):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            counts = series[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def snapshot(self):
+        """{nhãn (JSON): [bucket_counts, sum, count]} – dạng ghi được ra file."""
+        with self._lock:
+            return {json.dumps(labels): [list(s[0]), s[1], s[2]] for labels, s in self._series.items()}
+
+    @staticmethod
+    def merge(into, value):
+        return [[a + b for a, b in zip(into[0], value[0])], into[1] + value[1], into[2] + value[2]]
+
+    def render(self, series):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        snapshot = sorted((tuple(json.loads(key)), *value) for key, value in series.items())
+        for labels, counts, total, count in snapshot:
+            base = _labels(self.label_names, labels)
+            for bound, bucket_count in zip(self.buckets, counts):
+                lines.append(f'{self.name}_bucket{{{base},le="{bound}"}} {bucket_count}')
+            lines.append(f'{self.name}_bucket{{{base},le="+Inf"}} {count}')
+            lines.append(f'{self.name}_sum{{{base}}} {total}')
+            lines.append(f'{self.name}_count{{{base}}} {count}')
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help_text, label_names):
+        self.name        = name
+        self.help_text   = help_text
+        self.label_names = label_names
+        self._values     = {}
+        self._lock       = threading.Lock()
+
+    def inc(self, labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def snapshot(self):
+        with self._lock:
+            return {json.dumps(labels): value for labels, value in self._values.items()}
+
+    @staticmethod
+    def merge(into, value):
+        return into + value
+
+    def render(self, series):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        snapshot = sorted((tuple(json.loads(key)), value) for key, value in series.items())
+        for labels, value in snapshot:
+            lines.append(f'{self.name}{{{_labels(self.label_names, labels)}}} {value}')
+        return lines
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values):
+    return ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+
+
+request_latency = Histogram(
+    'http_request_duration_seconds', 'Thời gian xử lý request theo route.',
+    ('endpoint', 'method', 'status'), LATENCY_BUCKETS)
+query_latency = Histogram(
+    'db_query_duration_seconds', 'Thời gian thực thi mỗi câu lệnh SQL theo route.',
+    ('endpoint',), LATENCY_BUCKETS)
+queries_per_request = Histogram(
+    'db_queries_per_request', 'Số lần gọi MySQL (round trip) trong một request.',
+    ('endpoint',), QUERY_COUNT_BUCKETS)
+slow_queries = Counter(
+    'db_slow_queries_total', 'Số câu lệnh SQL chậm hơn ngưỡng SLOW_QUERY_MS.',
+    ('endpoint',))
+
+REGISTRY = [request_latency, query_latency, queries_per_request, slow_queries]
+_BY_NAME = {metric.name: metric for metric in REGISTRY}
+
+
+def current_endpoint():
+    """Nhãn route hiện tại: tên endpoint của Flask (blueprint.hàm) hoặc 'cli' ngoài request."""
+    try:
+        return request.endpoint or 'unmatched'
+    except RuntimeError:
+        return 'cli'
+
+
+def record_query(duration):
+    """Được gọi sau mỗi execute (xem common/db.py)."""
+    query_latency.observe((current_endpoint(),), duration)
+    try:
+        g.db_queries = g.get('db_queries', 0) + 1
+        g.db_time = g.get('db_time', 0.0) + duration
+    except RuntimeError:
+        pass
+
+
+def record_slow_query():
+    slow_queries.inc((current_endpoint(),))
+
+
+# ============================================================
+#  GỘP SỐ LIỆU GIỮA CÁC WORKER
+# ============================================================
+
+_flusher = {'pid': None}
+_flusher_lock = threading.Lock()
+
+
+def _path(name):
+    return os.path.join(METRICS_DIR, name)
+
+
+def _snapshot():
+    return {metric.name: metric.snapshot() for metric in REGISTRY}
+
+
+def _merge(total, snapshot):
+    for name, series in snapshot.items():
+        metric = _BY_NAME.get(name)
+        if metric is None:
+            continue
+        target = total.setdefault(name, {})
+        for key, value in series.items():
+            target[key] = metric.merge(target[key], value) if key in target else value
+    return total
+
+
+def _read(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write(path, data):
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    os.replace(tmp, path)   # Người đọc luôn thấy file trọn vẹn
+
+
+class _dir_lock:
+    """flock trên METRICS_DIR/.lock: gộp file (LOCK_EX) không xen giữa lần đọc để scrape (LOCK_SH)."""
+
+    def __init__(self, mode):
+        self.mode = mode
+
+    def __enter__(self):
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        self.fd = os.open(_path('.lock'), os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(self.fd, self.mode)
+
+    def __exit__(self, *exc):
+        fcntl.flock(self.fd, fcntl.LOCK_UN)
+        os.close(self.fd)
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _worker_files():
+    for path in glob.glob(_path('metrics-*.json')):
+        pid = os.path.basename(path)[len('metrics-'):-len('.json')]
+        if pid.isdigit():
+            yield int(pid), path
+
+
+def archive_dead_workers(include_own=False):
+    """Gộp file của worker đã thoát vào metrics-archive.json (include_own: file cũ trùng pid với tiến trình này)."""
+    with _dir_lock(fcntl.LOCK_EX):
+        stale = [path for pid, path in _worker_files()
+                 if (include_own and pid == os.getpid()) or (pid != os.getpid() and not _alive(pid))]
+        if not stale:
+            return
+        archive = _read(_path('metrics-archive.json'))
+        for path in stale:
+            _merge(archive, _read(path))
+        _write(_path('metrics-archive.json'), archive)
+        for path in stale:
+            os.remove(path)
+
+
+def flush():
+    """Ghi số liệu của worker hiện tại ra file của nó."""
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    _write(_path(f'metrics-{os.getpid()}.json'), _snapshot())
+
+
+def collect():
+    """Số liệu cộng gộp của mọi worker (đang chạy và đã thoát)."""
+    with _dir_lock(fcntl.LOCK_SH):
+        total = _read(_path('metrics-archive.json'))
+        for _, path in _worker_files():
+            _merge(total, _read(path))
+    return total
+
+
+def _flush_loop():
+    while True:
+        time.sleep(METRICS_FLUSH_INTERVAL)
+        try:
+            flush()
+            archive_dead_workers()
+        except Exception as e:
+            log.warning('Không ghi được số liệu ra %s: %s', METRICS_DIR, e)
+
+
+def ensure_flusher():
+    """Luồng ghi số liệu định kỳ, một luồng cho mỗi tiến trình (khởi động lại sau fork)."""
+    if _flusher['pid'] == os.getpid():
+        return
+    with _flusher_lock:
+        if _flusher['pid'] == os.getpid():
+            return
+        try:
+            archive_dead_workers(include_own=True)   # pid được tái sử dụng: không ghi đè số liệu cũ
+        except OSError as e:
+            log.warning('Không gộp được số liệu cũ trong %s: %s', METRICS_DIR, e)
+        threading.Thread(target=_flush_loop, name='metrics-flush', daemon=True).start()
+        _flusher['pid'] = os.getpid()
+
+
+def render(series=None):
+    series = collect() if series is None else series
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render(series.get(metric.name, {})))
+    return '\n'.join(lines) + '\n'
+
+
+def _start_timer():
+    ensure_flusher()
+    g.request_started = time.perf_counter()
+
+
+def _record_request(response):
+    started = g.pop('request_started', None)
+    if started is None:
+        return response
+    endpoint = current_endpoint()
+    # Với response dạng stream, đây là thời gian tới byte đầu tiên
+    request_latency.observe((endpoint, request.method, str(response.status_code)),
+                            time.perf_counter() - started)
+
+    count = g.get('db_queries', 0)
+    queries_per_request.observe((endpoint,), count)
+    response.headers['Server-Timing'] = (
+        f'db;dur={g.get("db_time", 0.0) * 1000:.1f};desc="{count} queries"'
+    )
+    return response
+
+
+def _authorized():
+    """Bearer METRICS_TOKEN (Prometheus) hoặc JWT hợp lệ của ADMIN."""
+    auth_header = request.headers.get('Authorization') or ''
+    if not auth_header.startswith('Bearer '):
+        return False
+    token = auth_header[7:]
+    if METRICS_TOKEN and hmac.compare_digest(token, METRICS_TOKEN):
+        return True
+
+    # Import trễ: requireRole -> events -> db -> metrics
+    import jwt
+    from common.requireRole import check_revoked, verify_token
+    try:
+        payload = verify_token(token)
+    except jwt.InvalidTokenError:
+        return False
+    return payload.get('role') == 'ADMIN' and check_revoked(payload) is None
+
+
+def metrics_view():
+    if not _authorized():
+        return Response('Unauthorized\n', status=401, mimetype='text/plain')
+    flush()   # Worker nhận scrape luôn đóng góp số liệu mới nhất của mình
+    return Response(render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+
+def init_app(app):
+    app.before_request(_start_timer)
+    app.after_request(_record_request)
+    app.add_url_rule('/api/metrics', 'metrics', metrics_view, methods=['GET'])
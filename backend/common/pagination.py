@@ -0,0 +1,121 @@
+import datetime
+
+from flask import Response, stream_with_context
+
+from common.db import db_conn
+from common.serialize import dumps_line
+
+DEFAULT_LIMIT     = 50
+MAX_LIMIT         = 500
+STREAM_BATCH_SIZE = 500   # Số dòng mỗi lần fetchmany khi stream
+
+
+class CursorError(ValueError):
+    """Tham số phân trang (after/limit) không hợp lệ."""
+
+
+def parse_page_args(args, streaming=False):
+    """Đọc `?after=<created_at,id>&limit=` từ query string.
+
+    Trả về (after, limit) với after = (created_at, id) hoặc None.
+    Ở chế độ stream, limit = None nghĩa là đọc đến hết bảng.
+    """
+    after = None
+    raw_after = args.get('after')
+    if raw_after:
+        sort_value, _, id_value = raw_after.rpartition(',')
+        try:
+            datetime.datetime.fromisoformat(sort_value)
+            after = (sort_value, int(id_value))
+        except ValueError:
+            raise CursorError('Tham số after không hợp lệ! Định dạng: <created_at>,<id>')
+
+    raw_limit = args.get('limit')
+    if raw_limit is None:
+        limit = None if streaming else DEFAULT_LIMIT
+    else:
+        try:
+            limit = int(raw_limit)
+        except ValueError:
+            raise CursorError('Tham số limit phải là số nguyên!')
+        if limit < 1:
+            raise CursorError('Tham số limit phải >= 1!')
+        if not streaming:
+            limit = min(limit, MAX_LIMIT)
+
+    return after, limit
+
+
+def wants_stream(args):
+    return args.get('format') == 'ndjson'
+
+
+def keyset_clause(sort_column, id_column):
+    """Điều kiện lấy các dòng đứng sau cursor khi sắp xếp (sort DESC, id DESC)."""
+    return f" AND ({sort_column} < %s OR ({sort_column} = %s AND {id_column} < %s))"
+
+
+def keyset_params(after):
+    sort_value, id_value = after
+    return [sort_value, sort_value, id_value]
+
+
+def make_cursor(item, sort_field, id_field):
+    return f"{item[sort_field]},{item[id_field]}"
+
+
+def fetch_page(cursor, query, params, limit, to_dict, sort_field, id_field):
+    """Chạy truy vấn đã có ORDER BY, lấy limit + 1 dòng để biết còn trang sau không.
+
+    Trả về (items, next_cursor).
+    """
+    cursor.execute(query + " LIMIT %s", tuple(params) + (limit + 1,))
+    rows = cursor.fetchall()
+
+    items = [to_dict(row) for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = make_cursor(items[-1], sort_field, id_field)
+    return items, next_cursor
+
+
+def stream_ndjson(query, params, limit, to_dict, sort_field, id_field):
+    """Stream kết quả dạng NDJSON, đọc từng lô bằng fetchmany để bộ nhớ không tăng theo số dòng.
+
+    Dòng cuối cùng luôn là {"next_cursor": ...} (null nếu đã hết dữ liệu).
+    """
+    if limit is not None:
+        query += " LIMIT %s"
+        params = list(params) + [limit + 1]
+
+    def generate():
+        cursor = db_conn.cursor()   # cursor không buffer: dữ liệu được kéo dần từ server
+        sent = 0
+        last_item = None
+        has_more = False
+        try:
+            cursor.execute(query, tuple(params))
+            while True:
+                rows = cursor.fetchmany(STREAM_BATCH_SIZE)
+                if not rows:
+                    break
+                for row in rows:
+                    if limit is not None and sent >= limit:
+                        has_more = True
+                        break
+                    last_item = to_dict(row)
+                    sent += 1
+                    yield dumps_line(last_item)
+                if has_more:
+                    cursor.fetchall()   # Đọc nốt phần còn lại (tối đa 1 dòng) để giải phóng kết nối
+                    break
+
+            next_cursor = make_cursor(last_item, sort_field, id_field) if has_more else None
+            yield dumps_line({'next_cursor': next_cursor})
+        finally:
+            try:
+                cursor.close()
+            except Exception:
+                pass
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
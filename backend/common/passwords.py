@@ -0,0 +1,117 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from multiprocessing import get_context
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+from common.refdata import get_config
+
+# Tham số hệ thống (QĐ6) quy định số vòng lặp pbkdf2:sha256
+ITERATIONS_CONFIG_KEY = 'PASSWORD_HASH_ITERATIONS'
+DEFAULT_ITERATIONS    = 600000
+MIN_ITERATIONS        = 10000
+MAX_ITERATIONS        = 5000000
+
+HASH_WORKERS     = int(os.environ.get('PASSWORD_HASH_WORKERS', os.cpu_count() or 2))
+HASH_MAX_PENDING = int(os.environ.get('PASSWORD_HASH_MAX_PENDING', 64))   # Số yêu cầu băm tối đa đang chờ
+HASH_TIMEOUT     = float(os.environ.get('PASSWORD_HASH_TIMEOUT', 10))
+
+
+class HashQueueFull(Exception):
+    """Hàng đợi băm mật khẩu đã đầy hoặc quá HASH_TIMEOUT – caller nên trả 503 cho client thử lại sau."""
+
+
+_executor = None
+_executor_lock = threading.Lock()
+_pending = threading.BoundedSemaphore(HASH_MAX_PENDING)
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ProcessPoolExecutor(max_workers=HASH_WORKERS, mp_context=get_context('spawn'))
+    return _executor
+
+
+def _submit(fn, *args, wait=False):
+    """Đưa fn vào process pool nếu còn chỗ trong hàng đợi (backpressure).
+
+    Chỗ trong hàng đợi chỉ được trả lại khi phép băm thực sự kết thúc (kể cả khi
+    caller đã thôi chờ), nên HASH_MAX_PENDING giới hạn đúng số việc đang chờ/chạy.
+    wait=True: chờ tối đa HASH_TIMEOUT giây để có chỗ thay vì từ chối ngay.
+    """
+    acquired = _pending.acquire(timeout=HASH_TIMEOUT) if wait else _pending.acquire(blocking=False)
+    if not acquired:
+        raise HashQueueFull('Hệ thống đang bận, vui lòng thử lại sau!')
+    try:
+        future = _get_executor().submit(fn, *args)
+    except Exception:
+        _pending.release()
+        raise
+    future.add_done_callback(lambda _: _pending.release())
+    return future
+
+
+def _result(future):
+    """Kết quả của future; quá HASH_TIMEOUT thì hủy (nếu chưa chạy) và báo bận như khi hàng đợi đầy."""
+    try:
+        return future.result(timeout=HASH_TIMEOUT)
+    except FutureTimeout:
+        future.cancel()
+        raise HashQueueFull('Hệ thống đang bận, vui lòng thử lại sau!')
+
+
+def _run(fn, *args):
+    """Chạy fn trong process pool; từ chối ngay nếu hàng đợi đã đầy."""
+    return _result(_submit(fn, *args))
+
+
+def hash_iterations():
+    """Số vòng lặp hiện hành (tham số PASSWORD_HASH_ITERATIONS trong system_configs)."""
+    try:
+        iterations = int(get_config(ITERATIONS_CONFIG_KEY, DEFAULT_ITERATIONS))
+    except ValueError:
+        iterations = DEFAULT_ITERATIONS
+    return min(max(iterations, MIN_ITERATIONS), MAX_ITERATIONS)
+
+
+def hash_method(iterations=None):
+    return f'pbkdf2:sha256:{iterations or hash_iterations()}'
+
+
+def hash_password(password, iterations=None):
+    return _run(generate_password_hash, password, hash_method(iterations))
+
+
+def hash_many(passwords, iterations=None):
+    """Băm nhiều mật khẩu song song trên process pool (dùng khi nhập hàng loạt).
+
+    Gửi từng đợt HASH_WORKERS mật khẩu một, qua cùng hàng đợi giới hạn với
+    đăng nhập/đăng ký, để các yêu cầu đó vẫn được xen vào thay vì phải chờ cả lô.
+    Ném HashQueueFull nếu không có chỗ trong hàng đợi sau HASH_TIMEOUT giây.
+    """
+    method = hash_method(iterations)
+    hashes = []
+    for start in range(0, len(passwords), HASH_WORKERS):
+        futures = []
+        try:
+            for password in passwords[start:start + HASH_WORKERS]:
+                futures.append(_submit(generate_password_hash, password, method, wait=True))
+            hashes.extend(_result(future) for future in futures)
+        except HashQueueFull:
+            for future in futures:
+                future.cancel()
+            raise
+    return hashes
+
+
+def verify_password(password_hash, password):
+    return _run(check_password_hash, password_hash, password)
+
+
+def needs_rehash(password_hash, iterations=None):
+    """True nếu hash được tạo với tham số khác cấu hình hiện hành."""
+    return password_hash.split('$', 1)[0] != hash_method(iterations)
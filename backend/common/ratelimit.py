@@ -0,0 +1,151 @@
+import random
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import jsonify, request
+
+from common.db import get_pool
+
+BUCKET_PRUNE_PROBABILITY = 0.01   # Tỉ lệ lần acquire dọn các bucket đã đầy lại (không còn ý nghĩa)
+
+
+class TokenBucketLimiter:
+    """Giới hạn tốc độ theo thuật toán token bucket, mỗi khóa (VD: user_id) một bucket.
+
+    Bucket chứa tối đa `capacity` token, được nạp thêm `rate` token mỗi giây;
+    mỗi yêu cầu tiêu 1 token. Trạng thái nằm trong bộ nhớ tiến trình nên khi
+    chạy nhiều worker, giới hạn thực tế là giới hạn này nhân số worker.
+    """
+
+    def __init__(self, rate, capacity, max_keys=100000):
+        self.rate     = float(rate)
+        self.capacity = float(capacity)
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()   # key -> (tokens, updated_at)
+        self._lock    = threading.Lock()
+
+    def acquire(self, key):
+        """Trả về (True, 0) nếu được phép, ngược lại (False, số giây cần chờ)."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (self.capacity, now))
+            tokens = min(self.capacity, tokens + (now - updated_at) * self.rate)
+
+            if tokens >= 1:
+                allowed, retry_after = True, 0.0
+                tokens -= 1
+            else:
+                allowed, retry_after = False, (1 - tokens) / self.rate
+
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                # Bucket lâu không dùng đã đầy lại, bỏ đi cũng không ảnh hưởng kết quả
+                self._buckets.popitem(last=False)
+            return allowed, retry_after
+
+    def reset(self, key=None):
+        with self._lock:
+            if key is None:
+                self._buckets.clear()
+            else:
+                self._buckets.pop(key, None)
+
+
+class SharedTokenBucketLimiter:
+    """Token bucket giống TokenBucketLimiter nhưng trạng thái nằm trong bảng rate_limit_buckets.
+
+    Mọi worker/máy chủ dùng chung một bucket cho mỗi khóa, nên giới hạn không bị
+    nhân lên theo số worker. Thời gian lấy từ MySQL để các máy không lệch đồng hồ.
+    Mỗi lần acquire là một transaction ngắn trên kết nối riêng, khóa đúng một dòng.
+    """
+
+    def __init__(self, name, rate, capacity):
+        self.name     = name
+        self.rate     = float(rate)
+        self.capacity = float(capacity)
+
+    def _bucket_key(self, key):
+        return f'{self.name}:{key}'
+
+    def acquire(self, key):
+        """Trả về (True, 0) nếu được phép, ngược lại (False, số giây cần chờ)."""
+        bucket_key = self._bucket_key(key)
+        with get_pool().connection() as conn:
+            cursor = conn.cursor()
+            try:
+                # Tạo bucket đầy cho khóa mới (commit ngay để lần khóa dòng sau không chạm gap lock)
+                cursor.execute("""
+                    INSERT IGNORE INTO rate_limit_buckets (bucket_key, tokens, updated_at)
+                    VALUES (%s, %s, UNIX_TIMESTAMP(NOW(6)))
+                """, (bucket_key, self.capacity))
+                conn.commit()
+
+                cursor.execute("""
+                    SELECT tokens, updated_at, UNIX_TIMESTAMP(NOW(6)) FROM rate_limit_buckets
+                    WHERE bucket_key = %s FOR UPDATE
+                """, (bucket_key,))
+                tokens, updated_at, now = cursor.fetchone()
+                now = float(now)
+                tokens = min(self.capacity, tokens + max(0.0, now - updated_at) * self.rate)
+
+                if tokens >= 1:
+                    allowed, retry_after = True, 0.0
+                    tokens -= 1
+                else:
+                    allowed, retry_after = False, (1 - tokens) / self.rate
+
+                cursor.execute(
+                    "UPDATE rate_limit_buckets SET tokens = %s, updated_at = %s WHERE bucket_key = %s",
+                    (tokens, now, bucket_key)
+                )
+                if random.random() < BUCKET_PRUNE_PROBABILITY:
+                    # Bucket không dùng đủ lâu đã đầy lại, xóa đi cũng không ảnh hưởng kết quả
+                    cursor.execute(
+                        "DELETE FROM rate_limit_buckets WHERE updated_at < %s LIMIT 1000",
+                        (now - self.capacity / self.rate,)
+                    )
+                conn.commit()
+                return allowed, retry_after
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                cursor.close()
+
+    def reset(self, key=None):
+        with get_pool().connection() as conn:
+            cursor = conn.cursor()
+            try:
+                if key is None:
+                    cursor.execute("DELETE FROM rate_limit_buckets WHERE bucket_key LIKE %s",
+                                   (self._bucket_key('%'),))
+                else:
+                    cursor.execute("DELETE FROM rate_limit_buckets WHERE bucket_key = %s",
+                                   (self._bucket_key(key),))
+                conn.commit()
+            finally:
+                cursor.close()
+
+
+def rate_limit(limiter, exempt=None):
+    """Decorator giới hạn theo user đang đăng nhập – đặt SAU require_role.
+
+    exempt(): trả về True để bỏ qua giới hạn cho request này (VD: gửi lại phiếu đã lập).
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if exempt and exempt():
+                return f(*args, **kwargs)
+            allowed, retry_after = limiter.acquire(request.user_data.get('user_id'))
+            if not allowed:
+                seconds = max(1, int(retry_after + 0.999))
+                return jsonify({
+                    'message': f'Bạn thao tác quá nhanh, vui lòng thử lại sau {seconds} giây!'
+                }), 429, {'Retry-After': str(seconds)}
+            return f(*args, **kwargs)
+        return decorated_function
+    return decorator
@@ -0,0 +1,120 @@
+import os
+import threading
+import time
+
+from common.db import db_cursor
+
+# Số giây tối đa một worker dùng bản sao trong bộ nhớ trước khi kiểm tra lại version trong DB
+VERSION_CHECK_INTERVAL = float(os.environ.get('REFDATA_VERSION_CHECK_INTERVAL', 2))
+
+
+class VersionedCache:
+    """Bản sao trong bộ nhớ của một bảng ít thay đổi (gói tiết kiệm, tham số hệ thống).
+
+    Dữ liệu được nạp lại khi version trong bảng cache_versions khác với bản
+    đang giữ, nên nhiều worker process cùng phát hiện được bản sao đã cũ.
+    """
+
+    def __init__(self, name, loader, check_interval=VERSION_CHECK_INTERVAL):
+        self.name           = name
+        self.loader         = loader
+        self.check_interval = check_interval
+        self._value         = None
+        self._version       = None
+        self._checked_at    = 0.0
+        self._lock          = threading.Lock()
+
+    def _read_version(self):
+        db_cursor.execute("SELECT version FROM cache_versions WHERE cache_name = %s", (self.name,))
+        row = db_cursor.fetchone()
+        return row[0] if row else 0
+
+    def get(self):
+        now = time.monotonic()
+        if self._value is not None and now - self._checked_at < self.check_interval:
+            return self._value
+
+        with self._lock:
+            if self._value is None or now - self._checked_at >= self.check_interval:
+                version = self._read_version()
+                if self._value is None or version != self._version:
+                    self._value = self.loader()
+                    self._version = version
+                self._checked_at = time.monotonic()
+            return self._value
+
+    def bump(self, cursor):
+        """Tăng version trong DB – gọi trong cùng transaction với câu lệnh ghi."""
+        cursor.execute(
+            "INSERT INTO cache_versions (cache_name, version) VALUES (%s, 1) "
+            "ON DUPLICATE KEY UPDATE version = version + 1",
+            (self.name,)
+        )
+
+    def invalidate(self):
+        """Buộc lần đọc tiếp theo trong process này kiểm tra lại version (gọi sau commit)."""
+        self._checked_at = 0.0
+
+
+def _load_products():
+    db_cursor.execute("""
+        SELECT product_id, name, term_months, interest_rate,
+               min_days_hold, is_active, description
+        FROM savings_products
+        ORDER BY term_months ASC
+    """)
+    return [
+        {
+            'product_id': row[0],
+            'name': row[1],
+            'term_months': row[2],
+            'interest_rate': row[3],
+            'min_days_hold': row[4],
+            'is_active': bool(row[5]),
+            'description': row[6]
+        }
+        for row in db_cursor.fetchall()
+    ]
+
+
+def _load_configs():
+    db_cursor.execute("SELECT config_key, config_value, description FROM system_configs ORDER BY config_key")
+    return [
+        {
+            'config_key': row[0],
+            'config_value': row[1],
+            'description': row[2]
+        }
+        for row in db_cursor.fetchall()
+    ]
+
+
+products_cache = VersionedCache('savings_products', _load_products)
+configs_cache  = VersionedCache('system_configs', _load_configs)
+
+
+def get_products():
+    """Danh sách gói tiết kiệm (kể cả đã tắt), sắp theo term_months."""
+    return products_cache.get()
+
+
+def get_products_by_id():
+    return {p['product_id']: p for p in products_cache.get()}
+
+
+def get_product(product_id):
+    for product in products_cache.get():
+        if product['product_id'] == product_id:
+            return product
+    return None
+
+
+def get_configs():
+    return configs_cache.get()
+
+
+def get_config(config_key, default=None):
+    for config in configs_cache.get():
+        if config['config_key'] == config_key:
+            return config['config_value']
+    return default
@@ -1,26 +1,163 @@
+import datetime
+import logging
+import threading
+import time
 from functools import wraps
 from flask import request, jsonify, current_app
 import jwt
 
+from common.cache import TTLCache
+from common import events
+
+# Cache token đã xác thực -> payload (hết hạn theo exp của token)
+TOKEN_CACHE_SIZE = 10000
+TOKEN_CACHE_TTL  = 300
+
+# Thời hạn token do auth.login cấp: sự kiện thu hồi cũ hơn không còn tác dụng
+TOKEN_LIFETIME_SECONDS = 2 * 3600
+
+# Vé ngắn hạn chỉ dùng cho một mục đích (VD: mở stream SSE qua ?ticket=), thay cho việc đưa
+# JWT đăng nhập vào URL – URL bị ghi vào access log / lịch sử trình duyệt
+TICKET_LIFETIME_SECONDS = 60
+_token_cache = TTLCache(ttl=TOKEN_CACHE_TTL, maxsize=TOKEN_CACHE_SIZE)
+
+# Danh sách khóa/thu hồi trong bộ nhớ, được cập nhật bởi các API quản trị
+# để việc khóa tài khoản có hiệu lực ngay mà không cần truy vấn DB mỗi request.
+# Thay đổi được phát qua kênh 'auth' của common.events để mọi worker cùng áp dụng.
+_locked_users   = set()
+_token_versions = {}    # user_id -> phiên bản token tối thiểu; token có claim ver nhỏ hơn bị từ chối
+_revoked_before = {}    # user_id -> mốc thu hồi (giây) từ sự kiện cũ, chỉ áp dụng cho token chưa có ver
+_state_lock     = threading.Lock()
+
+log = logging.getLogger('auth')
+
+
+def _apply_auth_event(event_id, event_type, data):
+    user_id = data['user_id']
+    with _state_lock:
+        if event_type == 'locked':
+            _locked_users.add(user_id)
+        elif event_type == 'unlocked':
+            _locked_users.discard(user_id)
+        elif event_type == 'revoked':
+            if 'token_version' in data:
+                _token_versions[user_id] = max(_token_versions.get(user_id, 0), data['token_version'])
+            else:
+                _revoked_before[user_id] = max(_revoked_before.get(user_id, 0), data['revoked_at'])
+
+
+events.subscribe('auth', _apply_auth_event, replay_seconds=TOKEN_LIFETIME_SECONDS)
+
+
+def _broadcast(event_type, data):
+    """Áp dụng ngay trong worker hiện tại rồi ghi sự kiện cho các worker khác (gọi sau commit)."""
+    _apply_auth_event(None, event_type, data)
+    try:
+        events.publish('auth', event_type, data)
+    except Exception as e:
+        log.warning('Không phát được sự kiện %s cho user %s: %s', event_type, data['user_id'], e)
+
+
+def lock_user(user_id):
+    _broadcast('locked', {'user_id': user_id})
+
+
+def unlock_user(user_id):
+    _broadcast('unlocked', {'user_id': user_id})
+
+
+def set_locked_users(user_ids):
+    """Nạp lại toàn bộ danh sách user bị khóa (VD: khi khởi động worker)."""
+    with _state_lock:
+        _locked_users.clear()
+        _locked_users.update(user_ids)
+
+
+def revoke_user_tokens(user_id, token_version):
+    """Buộc user đăng nhập lại (VD: sau khi đổi role).
+
+    token_version: users.token_version mới (đã tăng và commit); token cấp trước đó mang ver nhỏ hơn.
+    """
+    _broadcast('revoked', {'user_id': user_id, 'token_version': token_version})
+
+
+def verify_token(token, secret_key=None, purpose=None):
+    """Giải mã và xác thực JWT, dùng cache cho các token đã xác thực trước đó.
+
+    secret_key: mặc định lấy từ app Flask hiện tại (truyền vào khi gọi từ ASGI).
+    purpose: None = token đăng nhập; vé (issue_ticket) chỉ hợp lệ với đúng purpose của nó.
+    """
+    payload = _token_cache.get(token)
+    if payload is None:
+        payload = jwt.decode(
+            token,
+            secret_key or current_app.config['SECRET_KEY'],
+            algorithms=['HS256']
+        )
+        exp = payload.get('exp')
+        ttl = TOKEN_CACHE_TTL if exp is None else min(TOKEN_CACHE_TTL, exp - time.time())
+        _token_cache.set(token, payload, ttl)
+    if payload.get('purpose') != purpose:
+        raise jwt.InvalidTokenError('Token không dùng được cho yêu cầu này')
+    return payload
+
+
+def issue_ticket(user_data, purpose, lifetime=TICKET_LIFETIME_SECONDS):
+    """Cấp vé ngắn hạn cho user đang đăng nhập, chỉ dùng được cho `purpose`."""
+    now = datetime.datetime.utcnow()
+    return jwt.encode({
+        'user_id': user_data['user_id'],
+        'role':    user_data['role'],
+        'purpose': purpose,
+        'ver':     user_data.get('ver', 0),
+        'iat':     now,
+        'exp':     now + datetime.timedelta(seconds=lifetime),
+    }, current_app.config['SECRET_KEY'], algorithm='HS256')
+
+
+def check_revoked(payload):
+    """Trả về (message, status_code) nếu user đã bị khóa / token bị thu hồi, ngược lại None."""
+    user_id = payload.get('user_id')
+    if user_id in _locked_users:
+        return 'Tài khoản đã bị khóa!', 403
+    min_version = _token_versions.get(user_id)
+    if min_version is not None and payload.get('ver', 0) < min_version:
+        return 'Phiên đăng nhập đã hết hiệu lực, vui lòng đăng nhập lại!', 401
+    revoked_at = _revoked_before.get(user_id)
+    if revoked_at is not None and 'ver' not in payload and payload.get('iat', 0) < revoked_at:
+        return 'Phiên đăng nhập đã hết hiệu lực, vui lòng đăng nhập lại!', 401
+    return None
+
+
+def require_role(allowed_roles, ticket_purpose=None):
+    """Decorator bảo vệ route – chỉ cho phép các role trong allowed_roles.
+
+    ticket_purpose: chấp nhận thêm ?ticket=<vé> do issue_ticket cấp cho đúng mục đích này
+    (EventSource của trình duyệt không gửi được header). JWT đăng nhập không bao giờ nằm trên URL.
+    """
+    allowed_roles = frozenset(allowed_roles)
 
-def require_role(allowed_roles):
-    """Decorator bảo vệ route – chỉ cho phép các role trong allowed_roles."""
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
             auth_header = request.headers.get('Authorization')
+            purpose = None
+            if not auth_header and ticket_purpose and request.args.get('ticket'):
+                auth_header = 'Bearer ' + request.args['ticket']
+                purpose = ticket_purpose
 
             if not auth_header or not auth_header.startswith('Bearer '):
                 return jsonify({'message': 'Thiếu token hoặc sai định dạng!'}), 401
 
-            token = auth_header.split(' ')[1]
+            token = auth_header[7:]
 
             try:
-                payload = jwt.decode(
-                    token,
-                    current_app.config['SECRET_KEY'],
-                    algorithms=['HS256']
-                )
+                payload = verify_token(token, purpose=purpose)
+
+                revoked = check_revoked(payload)
+                if revoked:
+                    message, code = revoked
+                    return jsonify({'message': message}), code
 
                 user_role = payload.get('role')
                 if user_role not in allowed_roles:
@@ -35,4 +172,4 @@ def require_role(allowed_roles):
 
             return f(*args, **kwargs)
         return decorated_function
-    return decorator
\ No newline at end of file
+    return decorator
@@ -0,0 +1,72 @@
+import os
+
+ROLLUP_NAME = 'daily_ledger'
+
+# Số phiếu cộng dồn trong mỗi transaction
+ROLLUP_BATCH_SIZE = int(os.environ.get('ROLLUP_BATCH_SIZE', 5000))
+
+# Runner job nền (flask --app app run-jobs) làm mới bảng tổng hợp theo chu kỳ này
+ROLLUP_REFRESH_INTERVAL = float(os.environ.get('ROLLUP_REFRESH_INTERVAL', 30))
+
+
+def _placeholders(values):
+    return ', '.join(['%s'] * len(values))
+
+
+def _fold_batch(cursor, batch_size):
+    """Cộng dồn tối đa batch_size phiếu đã APPROVED/REJECTED chưa được cộng. Trả về số phiếu."""
+    # Khóa dòng trạng thái để các lần làm mới đồng thời chạy tuần tự
+    cursor.execute("SELECT 1 FROM rollup_state WHERE rollup_name = %s FOR UPDATE", (ROLLUP_NAME,))
+    if cursor.fetchone() is None:
+        cursor.execute("INSERT INTO rollup_state (rollup_name) VALUES (%s)", (ROLLUP_NAME,))
+
+    # Phiếu đã có trạng thái cuối không đổi nữa; phiếu PENDING được cộng khi nó được xử lý
+    cursor.execute("""
+        SELECT transaction_id FROM transactions
+        WHERE rolled_up = FALSE AND status IN ('APPROVED', 'REJECTED')
+        ORDER BY transaction_id
+        LIMIT %s
+        FOR UPDATE
+    """, (batch_size,))
+    ids = [row[0] for row in cursor.fetchall()]
+    if not ids:
+        return 0
+
+    cursor.execute(f"""
+        INSERT INTO daily_ledger_rollups (rollup_date, transaction_type, status, txn_count, total_amount)
+        SELECT DATE(created_at), transaction_type, status, COUNT(*), SUM(amount)
+        FROM transactions
+        WHERE transaction_id IN ({_placeholders(ids)})
+        GROUP BY DATE(created_at), transaction_type, status
+        ON DUPLICATE KEY UPDATE
+            txn_count    = txn_count + VALUES(txn_count),
+            total_amount = total_amount + VALUES(total_amount)
+    """, tuple(ids))
+
+    cursor.execute(f"UPDATE transactions SET rolled_up = TRUE WHERE transaction_id IN ({_placeholders(ids)})",
+                   tuple(ids))
+    return len(ids)
+
+
+def refresh_daily_rollups(conn, batch_size=ROLLUP_BATCH_SIZE):
+    """Cộng dồn các phiếu đã APPROVED/REJECTED chưa được cộng vào daily_ledger_rollups.
+
+    Mỗi phiếu được đánh dấu rolled_up trong cùng transaction với phần cộng dồn,
+    nên được cộng đúng một lần, bất kể các phiếu PENDING khác còn chờ bao lâu.
+    Trả về số phiếu vừa được cộng dồn.
+    """
+    cursor = conn.cursor(buffered=True)
+    folded = 0
+    try:
+        while True:
+            count = _fold_batch(cursor, batch_size)
+            conn.commit()
+            folded += count
+            if count < batch_size:
+                return folded
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
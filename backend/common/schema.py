@@ -0,0 +1,157 @@
+import importlib.util
+import os
+import re
+
+MIGRATIONS_DIR = os.environ.get(
+    'MIGRATIONS_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
+)
+
+# Tên file migration: <số thứ tự>_<mô tả>.sql hoặc .py (VD: 002_hot_path_indexes.sql)
+_MIGRATION_RE = re.compile(r'^(\d+)_[\w-]+\.(sql|py)$')
+
+
+# ============================================================
+#  MIGRATION
+# ============================================================
+
+def list_migrations(directory=MIGRATIONS_DIR):
+    """Danh sách (version, path) sắp theo số thứ tự."""
+    migrations = []
+    for name in os.listdir(directory):
+        match = _MIGRATION_RE.match(name)
+        if match:
+            version = os.path.splitext(name)[0]
+            migrations.append((int(match.group(1)), version, os.path.join(directory, name)))
+    return [(version, path) for _, version, path in sorted(migrations)]
+
+
+def _ensure_migrations_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version VARCHAR(100) PRIMARY KEY,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+def applied_versions(cursor):
+    _ensure_migrations_table(cursor)
+    cursor.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def pending_migrations(cursor):
+    applied = applied_versions(cursor)
+    return [(version, path) for version, path in list_migrations() if version not in applied]
+
+
+def _split_sql(script):
+    """Tách script thành từng câu lệnh (không hỗ trợ DELIMITER/procedure)."""
+    lines = [line for line in script.splitlines() if not line.strip().startswith('--')]
+    return [stmt.strip() for stmt in '\n'.join(lines).split(';') if stmt.strip()]
+
+
+def _run_migration(cursor, path):
+    if path.endswith('.sql'):
+        with open(path, encoding='utf-8') as f:
+            for statement in _split_sql(f.read()):
+                cursor.execute(statement)
+    else:
+        # Migration Python: file phải có hàm upgrade(cursor)
+        spec = importlib.util.spec_from_file_location('migration', path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        module.upgrade(cursor)
+
+
+def upgrade(conn, on_apply=None):
+    """Áp dụng lần lượt các migration chưa chạy. Trả về danh sách version đã áp dụng.
+
+    Lưu ý: DDL của MySQL tự commit, nên nếu một migration lỗi giữa chừng
+    cần kiểm tra và sửa tay trước khi chạy lại.
+    """
+    cursor = conn.cursor(buffered=True)
+    applied = []
+    try:
+        for version, path in pending_migrations(cursor):
+            if on_apply:
+                on_apply(version)
+            _run_migration(cursor, path)
+            cursor.execute("INSERT INTO schema_migrations (version) VALUES (%s)", (version,))
+            conn.commit()
+            applied.append(version)
+    finally:
+        cursor.close()
+    return applied
+
+
+# ============================================================
+#  KIỂM TRA EXPLAIN CHO CÁC TRUY VẤN NÓNG
+# ============================================================
+
+# Bảng nhỏ, quét toàn bộ là chấp nhận được
+SMALL_TABLES = {'savings_products', 'system_configs', 'system_balances', 'schema_migrations'}
+
+# Cursor mẫu để kiểm tra nhánh keyset (trang thứ hai trở đi)
+SAMPLE_CURSOR = ('2024-01-01 00:00:00', 1000000)
+
+
+def hot_queries():
+    """Danh sách (tên endpoint, câu truy vấn, tham số) của các truy vấn nóng.
+
+    Dựng từ chính các hàm tạo truy vấn mà endpoint dùng, nên EXPLAIN luôn kiểm tra
+    đúng câu SQL đang chạy thật. Import trễ để tránh vòng import với các blueprint.
+    """
+    from admin.admin import DASHBOARD_QUERIES, user_savings_accounts_query, users_page_query, users_search_query
+    from customer.customer import my_savings_accounts_query, my_transactions_query
+    from staff.staff import customers_query, savings_accounts_query, transactions_query
+    from common.pagination import DEFAULT_LIMIT
+    from common.search import build_user_search
+
+    def page(endpoint, built):
+        query, params = built
+        return (endpoint, query + " LIMIT %s", tuple(params) + (DEFAULT_LIMIT + 1,))
+
+    def search(endpoint, text):
+        query, params = users_search_query(None, None, build_user_search(text))
+        return (endpoint, query + " LIMIT %s OFFSET %s", tuple(params) + (DEFAULT_LIMIT + 1, 0))
+
+    user_savings, user_savings_params = user_savings_accounts_query(1)
+    return [
+        page('GET /api/transactions', transactions_query(None, None)),
+        page('GET /api/transactions?status=PENDING', transactions_query('PENDING', None)),
+        page('GET /api/transactions?after=', transactions_query(None, SAMPLE_CURSOR)),
+        page('GET /api/admin/users', users_page_query(None, None, None)),
+        page('GET /api/admin/users?role=STAFF&status=ACTIVE', users_page_query('STAFF', 'ACTIVE', None)),
+        page('GET /api/admin/users?after=', users_page_query(None, None, SAMPLE_CURSOR)),
+        page('GET /api/users', customers_query(None)),
+        page('GET /api/savings-accounts', savings_accounts_query(None)),
+        ('GET /api/admin/users/<id> (sổ tiết kiệm)', user_savings, tuple(user_savings_params)),
+        search('GET /api/admin/users?search=nguyen van', 'nguyen van'),
+        search('GET /api/admin/users?search=a@gmail.com', 'a@gmail.com'),
+        search('GET /api/admin/users?search=0790', '0790'),
+        page('GET /api/customer/transactions', my_transactions_query(1, None, None, None)),
+        page('GET /api/customer/transactions?after=', my_transactions_query(1, None, None, SAMPLE_CURSOR)),
+        page('GET /api/customer/savings-accounts', my_savings_accounts_query(1, None, None)),
+        ('GET /api/admin/dashboard (users)', DASHBOARD_QUERIES[0], ()),
+        ('GET /api/admin/dashboard (savings)', DASHBOARD_QUERIES[1], ()),
+        ('GET /api/admin/dashboard (transactions)', DASHBOARD_QUERIES[2], ()),
+    ]
+
+
+def find_full_scans(cursor, queries=None):
+    """Chạy EXPLAIN cho từng truy vấn, trả về [(endpoint, table, rows)] có quét toàn bảng (type = ALL)."""
+    if queries is None:
+        queries = hot_queries()
+    problems = []
+    for endpoint, query, params in queries:
+        cursor.execute("EXPLAIN " + query, params)
+        columns = [col[0] for col in cursor.description]
+        for row in cursor.fetchall():
+            plan = dict(zip(columns, row))
+            table = plan.get('table') or ''
+            if plan.get('type') != 'ALL' or table in SMALL_TABLES or table.startswith('<'):
+                continue
+            problems.append((endpoint, table, plan.get('rows')))
+    return problems
@@ -0,0 +1,54 @@
+import re
+import unicodedata
+
+# Tối đa số trang kết quả tìm kiếm (kết quả đã xếp hạng, phân trang bằng offset)
+MAX_SEARCH_PAGE = 100
+
+_EMAIL_CHARS_RE = re.compile(r'^[\w.+-]+@?[\w.-]*$')
+_IDENTITY_RE    = re.compile(r'^\d{3,20}$')
+_WORD_RE        = re.compile(r'\w+')
+
+
+def normalize_name(text):
+    """Chuẩn hóa tên để tìm kiếm không dấu: 'Nguyễn Văn Đức' -> 'nguyen van duc'."""
+    if not text:
+        return ''
+    text = text.replace('đ', 'd').replace('Đ', 'D')
+    text = unicodedata.normalize('NFD', text)
+    text = ''.join(ch for ch in text if unicodedata.category(ch) != 'Mn')
+    return ' '.join(text.lower().split())
+
+
+def build_user_search(search):
+    """Chọn cách tìm phù hợp với chuỗi nhập vào.
+
+    - Có '@'  -> email bắt đầu bằng chuỗi (dùng index UNIQUE email)
+    - Toàn số -> CMND/CCCD bắt đầu bằng chuỗi (dùng index UNIQUE identity_card)
+    - Còn lại -> FULLTEXT trên cột tên đã bỏ dấu (full_name_search)
+
+    Trả về (where_sql, where_params, order_sql, order_params) hoặc None nếu chuỗi rỗng.
+    """
+    search = search.strip()
+    if not search:
+        return None
+
+    if '@' in search and _EMAIL_CHARS_RE.match(search):
+        return (" AND email LIKE %s", [_escape_like(search) + '%'],
+                " ORDER BY email = %s DESC, email ASC", [search])
+
+    if _IDENTITY_RE.match(search):
+        return (" AND identity_card LIKE %s", [_escape_like(search) + '%'],
+                " ORDER BY identity_card = %s DESC, identity_card ASC", [search])
+
+    words = _WORD_RE.findall(normalize_name(search))
+    if not words:
+        return None
+    # Mỗi từ đều phải xuất hiện, từ cuối cho phép khớp tiền tố (đang gõ dở)
+    terms = ' '.join(f'+{w}' for w in words[:-1]) + f' +{words[-1]}*'
+    match = "MATCH(full_name_search) AGAINST (%s IN BOOLEAN MODE)"
+    return (f" AND {match}", [terms.strip()],
+            f" ORDER BY {match} DESC, user_id DESC", [terms.strip()])
+
+
+def _escape_like(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
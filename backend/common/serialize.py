@@ -0,0 +1,140 @@
+import json
+import os
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:     # orjson là tùy chọn, không có thì dùng json chuẩn
+    orjson = None
+
+# auto: dùng orjson nếu đã cài, ngược lại json chuẩn
+JSON_BACKEND = os.environ.get('JSON_BACKEND', 'auto')
+
+
+def _money(value):
+    # Tiền trả về dạng chuỗi để giữ nguyên DECIMAL(15,2): 1500000.5 -> "1500000.50"
+    return None if value is None else str(value)
+
+
+def _float(value):
+    return None if value is None else float(value)
+
+
+def _text(value):
+    return None if value is None else str(value)
+
+
+# Các kiểu cột; None = giữ nguyên giá trị từ MySQL (int, str, None)
+CONVERTERS = {
+    'raw': None,
+    'int': None,
+    'str': None,
+    'money': _money,
+    'float': _float,
+    'date': _text,
+    'datetime': _text,
+}
+
+
+class RowSerializer:
+    """Chuyển dòng kết quả (tuple) thành dict hoặc list theo mô tả cột.
+
+    Mỗi cột là (name, kind) hoặc (name, kind, source_index); kind là tên trong
+    CONVERTERS hoặc một hàm nhận giá trị cột. Mặc định cột thứ i đọc row[i].
+    Tạo một lần cho mỗi dạng truy vấn, dùng lại cho mọi dòng.
+    """
+
+    def __init__(self, columns):
+        plan = []
+        for position, column in enumerate(columns):
+            name, kind = column[0], column[1]
+            source = column[2] if len(column) > 2 else position
+            convert = kind if callable(kind) else CONVERTERS[kind]
+            plan.append((name, source, convert))
+        self.columns = [name for name, _, _ in plan]
+        self._plan = plan
+        self._identity = all(source == i and convert is None
+                             for i, (_, source, convert) in enumerate(plan))
+
+    def index(self, name):
+        return self.columns.index(name)
+
+    def to_dict(self, row):
+        if self._identity:
+            return dict(zip(self.columns, row))
+        return {name: (row[source] if convert is None else convert(row[source]))
+                for name, source, convert in self._plan}
+
+    def to_list(self, row):
+        if self._identity:
+            return list(row)
+        return [row[source] if convert is None else convert(row[source])
+                for _, source, convert in self._plan]
+
+    def page_args(self, columnar, sort_field, id_field):
+        """(hàm chuyển dòng, khóa sort, khóa id) cho fetch_page / stream_ndjson."""
+        if columnar:
+            return self.to_list, self.index(sort_field), self.index(id_field)
+        return self.to_dict, sort_field, id_field
+
+
+def wants_columns(args):
+    return args.get('format') == 'columns'
+
+
+def list_payload(message, key, items, serializer, columnar, **extra):
+    """Body chuẩn cho API danh sách; dạng cột chỉ ghi tên cột một lần."""
+    payload = {'message': message, 'total': len(items)}
+    payload.update(extra)
+    if columnar:
+        payload['columns'] = serializer.columns
+    payload[key] = items
+    return payload
+
+
+def _use_orjson():
+    if JSON_BACKEND == 'json':
+        return False
+    if JSON_BACKEND == 'orjson' and orjson is None:
+        raise RuntimeError('JSON_BACKEND=orjson nhưng chưa cài orjson (pip install orjson)!')
+    return orjson is not None
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """JSON provider của Flask dùng orjson khi có; kết quả giống provider mặc định."""
+
+    def __init__(self, app):
+        super().__init__(app)
+        self._orjson = _use_orjson()
+
+    def dumps(self, obj, **kwargs):
+        if self._orjson and not kwargs:
+            option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+            if self.sort_keys:
+                option |= orjson.OPT_SORT_KEYS
+            return orjson.dumps(obj, default=self.default, option=option).decode()
+        return super().dumps(obj, **kwargs)
+
+    def response(self, *args, **kwargs):
+        pretty = (self.compact is None and self._app.debug) or self.compact is False
+        if not self._orjson or pretty:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(f"{self.dumps(obj)}\n", mimetype=self.mimetype)
+
+
+def dumps(obj):
+    """Mã hóa JSON gọn (giá trị lạ như Decimal/datetime -> str)."""
+    if _use_orjson():
+        return orjson.dumps(obj, default=str).decode()
+    return json.dumps(obj, ensure_ascii=False, default=str)
+
+
+def dumps_line(obj):
+    """Một dòng NDJSON (dùng cho stream)."""
+    return dumps(obj) + '\n'
+
+
+def init_app(app):
+    app.json = FastJSONProvider(app)
@@ -0,0 +1,215 @@
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+
+import mysql.connector
+
+from common.cache import invalidate_dashboard
+from common.ledger import apply_balance_delta
+from common.passwords import hash_iterations, hash_many
+from common.search import normalize_name
+
+IMPORT_FORMATS     = ('csv', 'ndjson')
+IMPORT_CHUNK_SIZE  = 500     # Số dòng mỗi transaction
+IMPORT_MAX_CHUNK   = 5000
+IMPORT_MAX_ERRORS  = 1000    # Chỉ trả chi tiết tối đa chừng này dòng lỗi
+REQUIRED_COLUMNS   = ('email', 'password', 'full_name')
+ROLES              = ('CUSTOMER', 'STAFF', 'ADMIN')
+
+_INSERT_SQL = """
+    INSERT INTO users (email, password_hash, full_name, full_name_search, identity_card, role, wallet_balance)
+    VALUES (%s, %s, %s, %s, %s, %s, %s)
+"""
+
+
+class ImportFormatError(ValueError):
+    """File nhập không đúng định dạng (thiếu cột bắt buộc...)."""
+
+
+def read_rows(text_stream, fmt):
+    """Đọc dần file CSV/NDJSON, sinh ra (số dòng, dict | None, lỗi | None)."""
+    if fmt == 'csv':
+        reader = csv.DictReader(text_stream)
+        missing = [c for c in REQUIRED_COLUMNS if c not in (reader.fieldnames or ())]
+        if missing:
+            raise ImportFormatError(f"File CSV thiếu cột: {', '.join(missing)}")
+        for row in reader:
+            yield reader.line_num, row, None
+    elif fmt == 'ndjson':
+        for line_no, line in enumerate(text_stream, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                yield line_no, None, 'Dòng JSON không hợp lệ!'
+                continue
+            if not isinstance(row, dict):
+                yield line_no, None, 'Mỗi dòng phải là một object JSON!'
+                continue
+            yield line_no, row, None
+    else:
+        raise ImportFormatError(f"Định dạng không hợp lệ! Chỉ chấp nhận: {', '.join(IMPORT_FORMATS)}")
+
+
+def _text(row, key):
+    value = row.get(key)
+    return str(value).strip() if value is not None else ''
+
+
+def _clean(row):
+    """Chuẩn hóa một dòng, trả về (record, None) hoặc (None, thông báo lỗi)."""
+    email     = _text(row, 'email')
+    password  = _text(row, 'password')
+    full_name = _text(row, 'full_name')
+    role      = _text(row, 'role').upper() or 'CUSTOMER'
+
+    if not email or not password or not full_name:
+        return None, 'Thiếu thông tin (email, password, full_name)!'
+    if '@' not in email:
+        return None, 'Email không hợp lệ!'
+    if role not in ROLES:
+        return None, 'Role không hợp lệ! Chỉ chấp nhận: CUSTOMER, STAFF, ADMIN'
+
+    try:
+        balance = Decimal(_text(row, 'wallet_balance') or '0').quantize(Decimal('0.01'))
+    except InvalidOperation:
+        return None, 'Số dư đầu kỳ không hợp lệ!'
+    if balance < 0:
+        return None, 'Số dư đầu kỳ không được âm!'
+    if balance and role != 'CUSTOMER':
+        return None, 'Chỉ tài khoản CUSTOMER mới có số dư đầu kỳ!'
+
+    return {
+        'email': email,
+        'password': password,
+        'full_name': full_name,
+        'identity_card': _text(row, 'identity_card') or None,
+        'role': role,
+        'wallet_balance': balance,
+    }, None
+
+
+def _add_error(report, line_no, email, message):
+    report['failed'] += 1
+    if len(report['errors']) < IMPORT_MAX_ERRORS:
+        report['errors'].append({'line': line_no, 'email': email, 'error': message})
+    else:
+        report['errors_truncated'] = True
+
+
+def _existing_keys(cursor, records):
+    """Email và CMND/CCCD trong lô đã có trong bảng users."""
+    emails = [r['email'] for r in records]
+    cards  = [r['identity_card'] for r in records if r['identity_card']]
+
+    cursor.execute(f"SELECT email FROM users WHERE email IN ({', '.join(['%s'] * len(emails))})",
+                   tuple(emails))
+    existing_emails = {row[0] for row in cursor.fetchall()}
+
+    existing_cards = set()
+    if cards:
+        cursor.execute(f"SELECT identity_card FROM users WHERE identity_card IN ({', '.join(['%s'] * len(cards))})",
+                       tuple(cards))
+        existing_cards = {row[0] for row in cursor.fetchall()}
+    return existing_emails, existing_cards
+
+
+def _wallet_total(records):
+    return sum((r['wallet_balance'] for r in records if r['role'] == 'CUSTOMER'), Decimal('0'))
+
+
+def _import_chunk(conn, chunk, iterations, report):
+    """Ghi một lô trong một transaction; dòng trùng được báo lỗi riêng, không làm hỏng cả lô."""
+    # Trùng lặp ngay trong file
+    seen_emails, seen_cards, unique = set(), set(), []
+    for r in chunk:
+        if r['email'] in seen_emails:
+            _add_error(report, r['line'], r['email'], 'Email bị trùng trong file!')
+        elif r['identity_card'] and r['identity_card'] in seen_cards:
+            _add_error(report, r['line'], r['email'], 'CMND/CCCD bị trùng trong file!')
+        else:
+            seen_emails.add(r['email'])
+            if r['identity_card']:
+                seen_cards.add(r['identity_card'])
+            unique.append(r)
+
+    cursor = conn.cursor(buffered=True)
+    try:
+        # Trùng với dữ liệu đã có (kể cả các lô trước đã commit)
+        existing_emails, existing_cards = _existing_keys(cursor, unique)
+        fresh = []
+        for r in unique:
+            if r['email'] in existing_emails:
+                _add_error(report, r['line'], r['email'], 'Email đã tồn tại!')
+            elif r['identity_card'] in existing_cards:
+                _add_error(report, r['line'], r['email'], 'CMND/CCCD đã tồn tại!')
+            else:
+                fresh.append(r)
+        if not fresh:
+            return
+
+        hashes = hash_many([r['password'] for r in fresh], iterations)
+        values = [(r['email'], h, r['full_name'], normalize_name(r['full_name']),
+                   r['identity_card'], r['role'], r['wallet_balance'])
+                  for r, h in zip(fresh, hashes)]
+
+        try:
+            cursor.executemany(_INSERT_SQL, values)
+            apply_balance_delta(cursor, wallet_delta=_wallet_total(fresh))
+            conn.commit()
+            report['imported'] += len(fresh)
+        except mysql.connector.IntegrityError:
+            # Có bản ghi trùng được tạo song song: ghi lại từng dòng để báo lỗi chính xác
+            conn.rollback()
+            for r, v in zip(fresh, values):
+                try:
+                    cursor.execute(_INSERT_SQL, v)
+                    apply_balance_delta(cursor, wallet_delta=_wallet_total([r]))
+                    conn.commit()
+                    report['imported'] += 1
+                except mysql.connector.IntegrityError:
+                    conn.rollback()
+                    _add_error(report, r['line'], r['email'], 'Email hoặc CMND/CCCD đã tồn tại!')
+    finally:
+        cursor.close()
+
+
+def import_users(conn, rows, chunk_size=IMPORT_CHUNK_SIZE, on_chunk=None):
+    """Nhập người dùng từ iterator `rows` (xem read_rows), mỗi lô chunk_size dòng commit riêng.
+
+    Bộ nhớ chỉ phụ thuộc kích thước lô, không phụ thuộc kích thước file.
+    Trả về báo cáo: tổng số dòng, số dòng nhập thành công, số lỗi và chi tiết lỗi.
+    """
+    report = {'total_rows': 0, 'imported': 0, 'failed': 0, 'errors': [], 'errors_truncated': False}
+    iterations = hash_iterations()
+
+    chunk = []
+    try:
+        for line_no, row, error in rows:
+            report['total_rows'] += 1
+            record = None
+            if error is None:
+                record, error = _clean(row)
+            if error:
+                _add_error(report, line_no, _text(row or {}, 'email') or None, error)
+                continue
+
+            record['line'] = line_no
+            chunk.append(record)
+            if len(chunk) >= chunk_size:
+                _import_chunk(conn, chunk, iterations, report)
+                chunk = []
+                if on_chunk:
+                    on_chunk(report)
+
+        if chunk:
+            _import_chunk(conn, chunk, iterations, report)
+            if on_chunk:
+                on_chunk(report)
+    finally:
+        if report['imported']:
+            invalidate_dashboard()
+
+    return report
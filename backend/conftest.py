@@ -0,0 +1,2 @@
+# pytest đưa thư mục chứa conftest.py này (backend/) vào sys.path,
+# để test import được các module như trong app: `from common import ...`, `from staff import staff`.
@@ -0,0 +1,398 @@
+import datetime
+import os
+from decimal import Decimal, InvalidOperation
+
+import mysql.connector
+from flask import Blueprint, request, jsonify
+from common.db import db_cursor, db_conn, run_with_retry, read_only
+from common.requireRole import require_role
+from common.cache import invalidate_dashboard
+from common.refdata import get_product, get_products_by_id
+from common.interest import quote_accounts
+from common.ratelimit import SharedTokenBucketLimiter, rate_limit
+from common.events import publish_transaction
+from common.serialize import RowSerializer, list_payload, wants_columns
+from common.pagination import (
+    CursorError, parse_page_args, wants_stream, keyset_clause, keyset_params,
+    fetch_page, stream_ndjson
+)
+
+customer_bp = Blueprint('customer', __name__)
+
+SLIP_TYPES          = ('DEPOSIT_TO_WALLET', 'WITHDRAW_FROM_WALLET', 'OPEN_SAVINGS', 'CLOSE_SAVINGS')
+MAX_AMOUNT          = Decimal('9999999999999.99')   # DECIMAL(15, 2)
+IDEMPOTENCY_KEY_MAX = 64
+
+# Mỗi khách hàng được lập tối đa SLIP_BURST phiếu liên tiếp, sau đó SLIP_RATE_PER_MINUTE phiếu/phút
+# (bucket lưu trong MySQL nên giới hạn áp dụng chung cho mọi worker)
+SLIP_RATE_PER_MINUTE = float(os.environ.get('SLIP_RATE_PER_MINUTE', 10))
+SLIP_BURST           = int(os.environ.get('SLIP_BURST', 5))
+slip_limiter = SharedTokenBucketLimiter('slips', rate=SLIP_RATE_PER_MINUTE / 60, capacity=SLIP_BURST)
+
+
+# ============================================================
+#  1. VÍ
+# ============================================================
+
+@customer_bp.route('/api/customer/wallet', methods=['GET'])
+@require_role(['CUSTOMER'])
+@read_only
+def get_wallet():
+    """Số dư ví và tổng tiền gốc đang gửi tiết kiệm của khách hàng đang đăng nhập."""
+    user_id = request.user_data.get('user_id')
+    try:
+        db_cursor.execute("""
+            SELECT u.full_name, u.wallet_balance, u.status,
+                   (SELECT COALESCE(SUM(principal_balance), 0) FROM savings_accounts
+                    WHERE user_id = u.user_id AND status = 'ACTIVE')
+            FROM users u WHERE u.user_id = %s
+        """, (user_id,))
+        row = db_cursor.fetchone()
+        if not row:
+            return jsonify({'message': 'Không tìm thấy người dùng!'}), 404
+
+        return jsonify({
+            'message': 'Thông tin ví',
+            'full_name': row[0],
+            'wallet_balance': str(row[1]),
+            'status': row[2],
+            'total_savings_principal': str(row[3])
+        }), 200
+    except Exception as e:
+        return jsonify({'message': 'Lỗi server!', 'error': str(e)}), 500
+
+
+# ============================================================
+#  2. SỔ TIẾT KIỆM CỦA TÔI
+# ============================================================
+
+def _my_account_row(products):
+    def product_field(field, convert=None):
+        def get(product_id):
+            value = products.get(product_id, {}).get(field)
+            return convert(value) if convert and value is not None else value
+        return get
+
+    return RowSerializer([
+        ('account_id',        'int'),
+        ('product_name',      product_field('name'), 1),
+        ('principal_balance', 'money', 2),
+        ('opened_at',         'datetime', 3),
+        ('status',            'str', 4),
+        ('interest_rate',     product_field('interest_rate', float), 1),
+        ('term_months',       product_field('term_months'), 1),
+        ('accrued_interest',  'money', 5),
+        ('maturity_date',     'date', 6),
+    ])
+
+
+def my_savings_accounts_query(user_id, status_filter, after):
+    query = """
+        SELECT account_id, product_id, principal_balance, opened_at, status,
+               accrued_interest, maturity_date
+        FROM savings_accounts
+        WHERE user_id = %s
+    """
+    params = [user_id]
+    if status_filter:
+        query += " AND status = %s"
+        params.append(status_filter)
+    if after:
+        query += keyset_clause('opened_at', 'account_id')
+        params.extend(keyset_params(after))
+    query += " ORDER BY opened_at DESC, account_id DESC"
+    return query, params
+
+
+@customer_bp.route('/api/customer/savings-accounts', methods=['GET'])
+@require_role(['CUSTOMER'])
+@read_only
+def get_my_savings_accounts():
+    """Danh sách sổ tiết kiệm của tôi (phân trang keyset theo opened_at)."""
+    user_id = request.user_data.get('user_id')
+    status_filter = request.args.get('status')   # VD: ?status=ACTIVE
+    streaming = wants_stream(request.args)
+    try:
+        after, limit = parse_page_args(request.args, streaming)
+    except CursorError as e:
+        return jsonify({'message': str(e)}), 400
+
+    query, params = my_savings_accounts_query(user_id, status_filter, after)
+
+    try:
+        serializer = _my_account_row(get_products_by_id())
+
+        if streaming:
+            return stream_ndjson(query, params, limit, serializer.to_dict, 'opened_at', 'account_id')
+
+        columnar = wants_columns(request.args)
+        to_row, sort_key, id_key = serializer.page_args(columnar, 'opened_at', 'account_id')
+        accounts, next_cursor = fetch_page(db_cursor, query, params, limit, to_row, sort_key, id_key)
+        return jsonify(list_payload('Danh sách sổ tiết kiệm của tôi', 'accounts', accounts,
+                                    serializer, columnar, next_cursor=next_cursor)), 200
+    except Exception as e:
+        return jsonify({'message': 'Lỗi server!', 'error': str(e)}), 500
+
+
+# ============================================================
+#  3. LỊCH SỬ GIAO DỊCH
+# ============================================================
+
+MY_TRANSACTION_ROW = RowSerializer([
+    ('transaction_id',   'int'),
+    ('account_id',       'int'),
+    ('amount',           'money'),
+    ('transaction_type', 'str'),
+    ('status',           'str'),
+    ('created_at',       'datetime'),
+])
+
+
+def my_transactions_query(user_id, status_filter, type_filter, after):
+    query = """
+        SELECT transaction_id, account_id, amount, transaction_type, status, created_at
+        FROM transactions
+        WHERE user_id = %s
+    """
+    params = [user_id]
+    if status_filter:
+        query += " AND status = %s"
+        params.append(status_filter)
+    if type_filter:
+        query += " AND transaction_type = %s"
+        params.append(type_filter)
+    if after:
+        query += keyset_clause('created_at', 'transaction_id')
+        params.extend(keyset_params(after))
+    query += " ORDER BY created_at DESC, transaction_id DESC"
+    return query, params
+
+
+@customer_bp.route('/api/customer/transactions', methods=['GET'])
+@require_role(['CUSTOMER'])
+@read_only
+def get_my_transactions():
+    """Lịch sử phiếu giao dịch của tôi (phân trang keyset), lọc ?status=&type=."""
+    user_id = request.user_data.get('user_id')
+    status_filter = request.args.get('status')
+    type_filter = request.args.get('type')
+    streaming = wants_stream(request.args)
+    try:
+        after, limit = parse_page_args(request.args, streaming)
+    except CursorError as e:
+        return jsonify({'message': str(e)}), 400
+
+    query, params = my_transactions_query(user_id, status_filter, type_filter, after)
+
+    if streaming:
+        return stream_ndjson(query, params, limit, MY_TRANSACTION_ROW.to_dict,
+                             'created_at', 'transaction_id')
+
+    columnar = wants_columns(request.args)
+    to_row, sort_key, id_key = MY_TRANSACTION_ROW.page_args(columnar, 'created_at', 'transaction_id')
+    try:
+        transactions, next_cursor = fetch_page(db_cursor, query, params, limit, to_row, sort_key, id_key)
+        return jsonify(list_payload('Lịch sử giao dịch của tôi', 'transactions', transactions,
+                                    MY_TRANSACTION_ROW, columnar, next_cursor=next_cursor)), 200
+    except Exception as e:
+        return jsonify({'message': 'Lỗi server!', 'error': str(e)}), 500
+
+
+# ============================================================
+#  4. LẬP PHIẾU YÊU CẦU
+# ============================================================
+
+class SlipError(Exception):
+    """Yêu cầu lập phiếu không hợp lệ – trả về 400 (hoặc code) cho client."""
+
+    def __init__(self, message, code=400):
+        super().__init__(message)
+        self.code = code
+
+
+def _parse_amount(value):
+    try:
+        amount = Decimal(str(value))
+    except (InvalidOperation, ValueError):
+        raise SlipError('Số tiền không hợp lệ!')
+    if not amount.is_finite() or amount <= 0 or amount > MAX_AMOUNT:
+        raise SlipError('Số tiền phải lớn hơn 0!')
+    if amount != amount.quantize(Decimal('0.01')):
+        raise SlipError('Số tiền tối đa 2 chữ số thập phân!')
+    return amount
+
+
+def _slip_to_dict(row):
+    return {
+        'transaction_id': row[0],
+        'account_id': row[1],
+        'amount': str(row[2]),
+        'transaction_type': row[3],
+        'status': row[4],
+        'created_at': str(row[5])
+    }
+
+
+def _find_by_idempotency_key(user_id, key):
+    db_cursor.execute("""
+        SELECT transaction_id, account_id, amount, transaction_type, status, created_at
+        FROM transactions WHERE user_id = %s AND idempotency_key = %s
+    """, (user_id, key))
+    return db_cursor.fetchone()
+
+
+def _check_wallet(user_id, amount, message):
+    """Kiểm tra sơ bộ số dư (khi duyệt phiếu sẽ kiểm tra lại có khóa dòng)."""
+    db_cursor.execute("SELECT wallet_balance FROM users WHERE user_id = %s", (user_id,))
+    row = db_cursor.fetchone()
+    if not row or row[0] < amount:
+        raise SlipError(message)
+
+
+def _prepare_close(user_id, account_id):
+    """Khóa sổ cần tất toán, trả về số tiền nhận được (gốc + lãi) tính đến hôm nay."""
+    db_cursor.execute("""
+        SELECT account_id, product_id, principal_balance, opened_at, status
+        FROM savings_accounts WHERE account_id = %s AND user_id = %s
+        FOR UPDATE
+    """, (account_id, user_id))
+    row = db_cursor.fetchone()
+    if not row:
+        raise SlipError('Không tìm thấy sổ tiết kiệm!', 404)
+    if row[4] == 'PENDING':
+        # Sổ chỉ có tiền khi phiếu OPEN_SAVINGS được duyệt (staff._approve chuyển sổ sang ACTIVE)
+        raise SlipError('Phiếu mở sổ chưa được duyệt, chưa thể tất toán!', 409)
+
+    # Đọc có khóa: luôn thấy phiếu mới nhất đã commit, kể cả khi transaction này đã có
+    # snapshot từ trước (VD: lần tra Idempotency-Key) lúc còn chờ khóa sổ ở trên
+    db_cursor.execute("""
+        SELECT 1 FROM transactions
+        WHERE user_id = %s AND account_id = %s AND transaction_type = 'CLOSE_SAVINGS' AND status = 'PENDING'
+        LIMIT 1
+        FOR UPDATE
+    """, (user_id, account_id))
+    if db_cursor.fetchone():
+        raise SlipError('Sổ này đã có phiếu tất toán đang chờ duyệt!', 409)
+
+    quote = quote_accounts([row], datetime.date.today())[0]
+    if 'error' in quote:
+        raise SlipError(quote['error'])
+    return Decimal(str(quote['payout'])).quantize(Decimal('0.01'))
+
+
+def _create_slip(user_id, data, idempotency_key):
+    """Lập phiếu trong một transaction. Trả về (body, status_code)."""
+    if idempotency_key:
+        existing = _find_by_idempotency_key(user_id, idempotency_key)
+        if existing:
+            return _replay(existing, data)
+
+    transaction_type = data.get('transaction_type')
+    account_id = None
+
+    if transaction_type == 'CLOSE_SAVINGS':
+        account_id = data.get('account_id')
+        if not isinstance(account_id, int):
+            raise SlipError('Vui lòng gửi account_id của sổ cần tất toán!')
+        amount = _prepare_close(user_id, account_id)
+    else:
+        amount = _parse_amount(data.get('amount'))
+
+    if transaction_type == 'WITHDRAW_FROM_WALLET':
+        _check_wallet(user_id, amount, 'Số dư ví không đủ để rút!')
+
+    if transaction_type == 'OPEN_SAVINGS':
+        product = get_product(data.get('product_id'))
+        if not product or not product['is_active']:
+            raise SlipError('Gói tiết kiệm không tồn tại hoặc đã ngừng áp dụng!')
+        _check_wallet(user_id, amount, 'Số dư trong ví không đủ để mở sổ tiết kiệm!')
+
+        # Sổ chờ duyệt: chỉ chuyển ACTIVE (và cộng vào tổng tiền gốc) khi phiếu được duyệt,
+        # bị đóng nếu phiếu bị từ chối (xem staff._approve / staff._reject)
+        db_cursor.execute("""
+            INSERT INTO savings_accounts (user_id, product_id, principal_balance, status)
+            VALUES (%s, %s, %s, 'PENDING')
+        """, (user_id, product['product_id'], amount))
+        account_id = db_cursor.lastrowid
+
+    try:
+        db_cursor.execute("""
+            INSERT INTO transactions (user_id, account_id, amount, transaction_type, idempotency_key)
+            VALUES (%s, %s, %s, %s, %s)
+        """, (user_id, account_id, amount, transaction_type, idempotency_key))
+    except mysql.connector.IntegrityError:
+        # Một request khác cùng Idempotency-Key vừa commit trước: trả lại phiếu đó
+        db_conn.rollback()
+        existing = _find_by_idempotency_key(user_id, idempotency_key) if idempotency_key else None
+        if existing:
+            return _replay(existing, data)
+        raise
+    transaction_id = db_cursor.lastrowid
+    db_conn.commit()
+
+    db_cursor.execute("""
+        SELECT transaction_id, account_id, amount, transaction_type, status, created_at
+        FROM transactions WHERE transaction_id = %s
+    """, (transaction_id,))
+    return {'message': 'Đã lập phiếu, vui lòng chờ nhân viên duyệt!',
+            'transaction': _slip_to_dict(db_cursor.fetchone())}, 201
+
+
+def _is_retry():
+    """Request gửi lại phiếu đã lập (cùng Idempotency-Key) không bị tính vào giới hạn tốc độ."""
+    idempotency_key = request.headers.get('Idempotency-Key')
+    if not idempotency_key or len(idempotency_key) > IDEMPOTENCY_KEY_MAX:
+        return False
+    return _find_by_idempotency_key(request.user_data.get('user_id'), idempotency_key) is not None
+
+
+def _replay(row, data):
+    """Phiếu đã tạo với cùng Idempotency-Key; báo lỗi nếu nội dung yêu cầu khác lần trước."""
+    db_conn.rollback()
+    slip = _slip_to_dict(row)
+    if slip['transaction_type'] == 'CLOSE_SAVINGS':
+        same = data.get('account_id') == slip['account_id']
+    else:
+        try:
+            same = _parse_amount(data.get('amount')) == Decimal(slip['amount'])
+        except SlipError:
+            same = False
+    if data.get('transaction_type') != slip['transaction_type'] or not same:
+        return {'message': 'Idempotency-Key đã được dùng cho một yêu cầu khác!'}, 422
+    return {'message': 'Phiếu đã được lập trước đó', 'transaction': slip, 'replayed': True}, 200
+
+
+@customer_bp.route('/api/customer/transactions', methods=['POST'])
+@require_role(['CUSTOMER'])
+@rate_limit(slip_limiter, exempt=_is_retry)
+def create_transaction():
+    """Khách hàng lập phiếu nạp/rút ví, mở/tất toán sổ (chờ STAFF duyệt).
+
+    Header Idempotency-Key (tùy chọn, tối đa 64 ký tự): gửi lại cùng khóa sẽ
+    nhận lại phiếu đã lập thay vì tạo phiếu mới.
+    """
+    user_id = request.user_data.get('user_id')
+    data = request.get_json() or {}
+
+    idempotency_key = request.headers.get('Idempotency-Key') or None
+    if idempotency_key and len(idempotency_key) > IDEMPOTENCY_KEY_MAX:
+        return jsonify({'message': f'Idempotency-Key tối đa {IDEMPOTENCY_KEY_MAX} ký tự!'}), 400
+
+    if data.get('transaction_type') not in SLIP_TYPES:
+        return jsonify({'message': 'transaction_type không hợp lệ! Chỉ chấp nhận: ' + ', '.join(SLIP_TYPES)}), 400
+
+    try:
+        body, code = run_with_retry(lambda: _create_slip(user_id, data, idempotency_key))
+        if code == 201:
+            invalidate_dashboard()
+            slip = body['transaction']
+            publish_transaction('created', slip['transaction_id'], slip['status'], user_id=user_id,
+                                account_id=slip['account_id'], amount=slip['amount'],
+                                transaction_type=slip['transaction_type'], created_at=slip['created_at'])
+        return jsonify(body), code
+    except SlipError as e:
+        db_conn.rollback()
+        return jsonify({'message': str(e)}), e.code
+    except Exception as e:
+        db_conn.rollback()
+        return jsonify({'message': 'Lỗi server!', 'error': str(e)}), 500
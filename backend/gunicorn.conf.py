@@ -0,0 +1,129 @@
+"""Cấu hình Gunicorn cho production.
+
+    cd backend
+    gunicorn -c gunicorn.conf.py
+
+- Mỗi worker tự import app và tạo pool kết nối riêng sau khi fork (không dùng chung socket MySQL).
+- Worker chỉ nhận request sau khi đã nạp sẵn gói tiết kiệm, tham số hệ thống, danh sách user bị khóa.
+- Load balancer kiểm tra /api/health/live (liveness) và /api/health/ready (readiness).
+- Deploy code mới không gián đoạn: `kill -HUP <pid master>` – master mở worker mới với code mới,
+  worker cũ xử lý nốt request đang dở (tối đa graceful_timeout giây) rồi mới thoát.
+- Trạng thái cần thấy ở mọi worker (sự kiện SSE, khóa tài khoản, thu hồi token) đi qua bảng
+  app_events (common/events.py); worker có stream SSE đang mở đọc bảng này 0.5 giây một lần,
+  worker nhàn rỗi giãn dần tới EVENT_IDLE_INTERVAL (10 giây).
+- /api/metrics cộng gộp số liệu của mọi worker qua các file trong METRICS_DIR (common/metrics.py).
+- Job nền không chạy trong worker web: master giữ một tiến trình runner riêng
+  (`flask --app app run-jobs`, tắt bằng GUNICORN_JOB_RUNNER=0 nếu chạy runner ở nơi khác).
+  HUP khởi động lại runner với code mới; job đang chạy được trả về hàng đợi và chạy lại từ đầu.
+  Runner chết đột ngột thì heartbeat ngừng, runner kế tiếp nhận lại job sau JOB_STALE_SECONDS.
+"""
+import multiprocessing
+import os
+import subprocess
+import sys
+import threading
+import time
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+wsgi_app = 'app:app'
+chdir    = BASE_DIR
+bind     = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+
+# gthread: mỗi worker nhiều luồng, để stream SSE/NDJSON không chiếm trọn một tiến trình
+worker_class = 'gthread'
+workers      = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+threads      = int(os.environ.get('GUNICORN_THREADS', 8))
+
+timeout          = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive        = 5
+
+# Khởi động lại worker định kỳ (lệch nhau) để không worker nào phình bộ nhớ mãi
+max_requests        = int(os.environ.get('GUNICORN_MAX_REQUESTS', 10000))
+max_requests_jitter = max_requests // 10
+
+# Không preload: master không import app nên HUP nạp được code mới và không giữ kết nối DB nào
+preload_app = False
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-')
+# Như định dạng mặc định nhưng chỉ ghi path (%(U)s), không ghi query string (%(r)s có cả ?ticket=...)
+access_log_format = '%(h)s %(l)s %(u)s %(t)s "%(m)s %(U)s %(H)s" %(s)s %(b)s "%(f)s" "%(a)s"'
+errorlog  = '-'
+
+
+JOB_RUNNER = os.environ.get('GUNICORN_JOB_RUNNER', '1') != '0'
+JOB_RUNNER_RESTART_DELAY = 5    # Giây chờ trước khi mở lại runner bị chết
+
+
+def _runner_state(server):
+    # Lưu trên arbiter chứ không trong module: HUP nạp lại file cấu hình này thành module mới
+    if not hasattr(server, 'job_runner'):
+        server.job_runner = {'proc': None, 'stopping': False}
+    return server.job_runner
+
+
+def _supervise_runner(server):
+    # Runner là tiến trình con riêng (master không import app): mỗi lần mở lại đều nạp code mới nhất
+    state = _runner_state(server)
+    while not state['stopping']:
+        proc = subprocess.Popen([sys.executable, '-m', 'flask', '--app', 'app', 'run-jobs'], cwd=BASE_DIR)
+        state['proc'] = proc
+        server.log.info('Runner job nền pid %s', proc.pid)
+        proc.wait()
+        if state['stopping']:
+            break
+        # Mã thoát không đáng tin (master có thể đã reap tiến trình con): luôn chờ rồi mới mở lại
+        server.log.info('Runner job nền đã dừng, mở lại sau %ss', JOB_RUNNER_RESTART_DELAY)
+        time.sleep(JOB_RUNNER_RESTART_DELAY)
+
+
+def _stop_runner(server, wait=None):
+    proc = _runner_state(server)['proc']
+    if proc is None or proc.poll() is not None:
+        return
+    proc.terminate()    # Runner trả job đang chạy về hàng đợi rồi thoát
+    if wait is not None:
+        try:
+            proc.wait(timeout=wait)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def on_starting(server):
+    if JOB_RUNNER:
+        threading.Thread(target=_supervise_runner, args=(server,), name='job-runner', daemon=True).start()
+
+
+def on_reload(server):
+    # HUP: dừng runner cũ, luồng giám sát mở runner mới với code mới
+    _stop_runner(server)
+
+
+def on_exit(server):
+    _runner_state(server)['stopping'] = True
+    _stop_runner(server, wait=graceful_timeout)
+
+
+def post_fork(server, worker):
+    from common import db
+    db.reset_pool()
+
+
+def post_worker_init(worker):
+    # Chạy sau khi worker đã nạp app, trước khi nhận request đầu tiên
+    from common.health import warm_up
+    warm_up(worker.wsgi)
+
+
+def worker_int(worker):
+    from common.health import mark_draining
+    mark_draining()
+
+
+def worker_exit(server, worker):
+    from common import db, metrics
+    from common.health import mark_draining
+    mark_draining()
+    db.get_pool().dispose()
+    metrics.flush()     # Số liệu cuối cùng của worker được gộp vào metrics-archive.json
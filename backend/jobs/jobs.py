@@ -0,0 +1,264 @@
+import csv
+import datetime
+import json
+import os
+from contextlib import closing
+
+from flask import Blueprint, request, jsonify, send_file
+from common.db import db_conn, db_cursor
+from common.requireRole import require_role
+from common import export, interest, ledger, rollups
+from common.jobs import JobCancelled, enqueue, get_job, job_handler, job_types, periodic_task, request_cancel
+from staff.staff import iter_transaction_batch, validate_batch, BATCH_DEFAULT_CHUNK
+
+jobs_bp = Blueprint('jobs', __name__)
+
+EXPORT_BATCH_SIZE = 1000
+
+
+# ================= CÁC LOẠI CÔNG VIỆC =================
+
+@job_handler('export_users', roles=['ADMIN'])
+def export_users_job(ctx):
+    """Xuất danh sách người dùng ra file CSV (params: role, status)."""
+    query = """
+        SELECT user_id, email, full_name, identity_card, role, wallet_balance, status, created_at
+        FROM users WHERE 1=1
+    """
+    params = []
+    if ctx.params.get('role'):
+        query += " AND role = %s"
+        params.append(ctx.params['role'])
+    if ctx.params.get('status'):
+        query += " AND status = %s"
+        params.append(ctx.params['status'])
+    query += " ORDER BY user_id"
+
+    path = ctx.artifact_path('users.csv')
+    cursor = db_conn.cursor()   # Không buffer: đọc dần từng lô
+    written = 0
+    try:
+        cursor.execute(query, tuple(params))
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['user_id', 'email', 'full_name', 'identity_card', 'role',
+                             'wallet_balance', 'status', 'created_at'])
+            while True:
+                rows = cursor.fetchmany(EXPORT_BATCH_SIZE)
+                if not rows:
+                    break
+                writer.writerows(rows)
+                written += len(rows)
+                ctx.set_progress(written)
+                try:
+                    ctx.check_cancelled()
+                except JobCancelled:
+                    cursor.fetchall()
+                    raise
+    finally:
+        cursor.close()
+
+    ctx.set_progress(written, written, force=True)
+    return {'rows': written, 'result_path': path}
+
+
+@job_handler('export_data', roles=['STAFF', 'ADMIN'])
+def export_data_job(ctx):
+    """Xuất transactions / savings_accounts ra file (params: dataset, format, from, to)."""
+    dataset = ctx.params.get('dataset')
+    fmt = ctx.params.get('format', 'csv')
+    date_from = ctx.params.get('from')
+    date_to = ctx.params.get('to')
+
+    def on_batch(done):
+        ctx.set_progress(done)
+        ctx.check_cancelled()
+
+    path = ctx.artifact_path(f'{dataset}.{fmt}')
+    written = export.export_to_file(
+        db_conn, dataset, fmt, path,
+        date_from=datetime.date.fromisoformat(date_from) if date_from else None,
+        date_to=datetime.date.fromisoformat(date_to) if date_to else None,
+        on_batch=on_batch
+    )
+    ctx.set_progress(written, written, force=True)
+    return {'rows': written, 'result_path': path}
+
+
+@job_handler('batch_transactions', roles=['STAFF', 'ADMIN'])
+def batch_transactions_job(ctx):
+    """Duyệt/từ chối hàng loạt phiếu (params giống POST /api/transactions/batch)."""
+    items = ctx.params.get('items')
+    chunk_size = ctx.params.get('chunk_size', BATCH_DEFAULT_CHUNK)
+    error = validate_batch(items, chunk_size)
+    if error:
+        raise ValueError(error)
+
+    results = []
+    with closing(iter_transaction_batch(items, chunk_size, ctx.user_id)) as batches:
+        for chunk_results in batches:
+            results.extend(chunk_results)
+            ctx.set_progress(len(results), len(items))
+            try:
+                ctx.check_cancelled()
+            except JobCancelled as e:
+                # Các lô đã commit: ghi lại kết quả để biết phiếu nào đã được duyệt/từ chối
+                e.result = _batch_summary(ctx, results, len(items))
+                raise
+
+    ctx.set_progress(len(results), len(items), force=True)
+    return _batch_summary(ctx, results, len(items))
+
+
+def _batch_summary(ctx, results, total_items):
+    path = ctx.artifact_path('results.json')
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, default=str)
+
+    succeeded = sum(1 for r in results if r['success'])
+    return {
+        'total': len(results),
+        'succeeded': succeeded,
+        'failed': len(results) - succeeded,
+        'not_processed': total_items - len(results),
+        'result_path': path
+    }
+
+
+@job_handler('reconcile_balances', roles=['ADMIN'])
+def reconcile_balances_job(ctx):
+    """Đối soát system_balances (params: fix)."""
+    report = ledger.reconcile(db_cursor, fix=bool(ctx.params.get('fix')))
+    db_conn.commit()
+    return report
+
+
+@job_handler('accrue_interest', roles=['ADMIN'])
+def accrue_interest_job(ctx):
+    """Tính lãi dự thu cho toàn bộ sổ ACTIVE (params: as_of)."""
+    as_of = ctx.params.get('as_of')
+    as_of = datetime.date.fromisoformat(as_of) if as_of else datetime.date.today()
+
+    def on_chunk(done):
+        ctx.set_progress(done)
+        ctx.check_cancelled()
+
+    total = interest.run_accrual(db_conn, as_of=as_of, on_chunk=on_chunk)
+    ctx.set_progress(total, total, force=True)
+    return {'accounts': total, 'as_of': str(as_of)}
+
+
+@periodic_task(rollups.ROLLUP_REFRESH_INTERVAL)
+def refresh_rollups_task():
+    """Cộng dồn phiếu mới vào daily_ledger_rollups (API báo cáo chỉ đọc bảng tổng hợp)."""
+    rollups.refresh_daily_rollups(db_conn)
+
+
+# ================= API =================
+
+def _job_to_dict(row):
+    return {
+        'job_id': row['job_id'],
+        'job_type': row['job_type'],
+        'status': row['status'],
+        'progress': row['progress'],
+        'total': row['total'],
+        'result': row['result'],
+        'has_artifact': bool(row['result_path']),
+        'error': row['error'],
+        'cancel_requested': bool(row['cancel_requested']),
+        'created_by': row['created_by'],
+        'created_at': str(row['created_at']),
+        'started_at': str(row['started_at']) if row['started_at'] else None,
+        'finished_at': str(row['finished_at']) if row['finished_at'] else None,
+        'heartbeat_at': str(row['heartbeat_at']) if row['heartbeat_at'] else None,
+        'attempt': row['attempt']
+    }
+
+
+def _load_own_job(job_id):
+    """Lấy job nếu người gọi là người tạo hoặc ADMIN; trả về (row, error_response)."""
+    row = get_job(job_id)
+    if not row:
+        return None, (jsonify({'message': 'Không tìm thấy công việc!'}), 404)
+    user = request.user_data
+    if user.get('role') != 'ADMIN' and row['created_by'] != user.get('user_id'):
+        return None, (jsonify({'message': 'Cấm truy cập: Bạn không đủ quyền!'}), 403)
+    return row, None
+
+
+@jobs_bp.route('/api/jobs', methods=['POST'])
+@require_role(['STAFF', 'ADMIN'])
+def create_job():
+    """Tạo công việc nền, trả về job_id ngay (202)."""
+    data = request.get_json() or {}
+    job_type = data.get('job_type')
+    params = data.get('params') or {}
+
+    roles = job_types().get(job_type)
+    if roles is None:
+        return jsonify({
+            'message': 'Loại công việc không hợp lệ!',
+            'job_types': sorted(job_types())
+        }), 400
+
+    if request.user_data.get('role') not in roles:
+        return jsonify({'message': 'Cấm truy cập: Bạn không đủ quyền!'}), 403
+
+    if not isinstance(params, dict):
+        return jsonify({'message': 'params phải là object!'}), 400
+
+    try:
+        job_id = enqueue(job_type, params, request.user_data.get('user_id'))
+        return jsonify({'message': 'Đã đưa vào hàng đợi', 'job_id': job_id}), 202
+    except Exception as e:
+        return jsonify({'message': 'Lỗi server!', 'error': str(e)}), 500
+
+
+@jobs_bp.route('/api/jobs/<int:job_id>', methods=['GET'])
+@require_role(['STAFF', 'ADMIN'])
+def get_job_status(job_id):
+    """Xem trạng thái, tiến độ và kết quả của công việc."""
+    try:
+        row, error = _load_own_job(job_id)
+        if error:
+            return error
+        return jsonify({'message': 'Thông tin công việc', 'job': _job_to_dict(row)}), 200
+    except Exception as e:
+        return jsonify({'message': 'Lỗi server!', 'error': str(e)}), 500
+
+
+@jobs_bp.route('/api/jobs/<int:job_id>/cancel', methods=['POST'])
+@require_role(['STAFF', 'ADMIN'])
+def cancel_job(job_id):
+    """Yêu cầu hủy công việc (job đang chạy sẽ dừng ở lần kiểm tra kế tiếp)."""
+    try:
+        row, error = _load_own_job(job_id)
+        if error:
+            return error
+        if row['status'] not in ('QUEUED', 'RUNNING'):
+            return jsonify({'message': f"Công việc đã kết thúc ({row['status']})!"}), 409
+
+        request_cancel(job_id)
+        return jsonify({'message': 'Đã gửi yêu cầu hủy', 'job': _job_to_dict(get_job(job_id))}), 200
+    except Exception as e:
+        return jsonify({'message': 'Lỗi server!', 'error': str(e)}), 500
+
+
+@jobs_bp.route('/api/jobs/<int:job_id>/result', methods=['GET'])
+@require_role(['STAFF', 'ADMIN'])
+def download_job_result(job_id):
+    """Tải file kết quả của công việc đã hoàn thành (hoặc kết quả dở dang của job đã hủy)."""
+    try:
+        row, error = _load_own_job(job_id)
+        if error:
+            return error
+        if row['status'] not in ('SUCCEEDED', 'CANCELLED') or not row['result_path']:
+            return jsonify({'message': 'Công việc chưa có file kết quả!'}), 404
+        if not os.path.exists(row['result_path']):
+            return jsonify({'message': 'File kết quả không còn tồn tại!'}), 410
+
+        return send_file(row['result_path'], as_attachment=True,
+                         download_name=os.path.basename(row['result_path']))
+    except Exception as e:
+        return jsonify({'message': 'Lỗi server!', 'error': str(e)}), 500
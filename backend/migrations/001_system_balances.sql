@@ -0,0 +1,13 @@
+-- Bảng tổng số dư hệ thống cho các database tạo từ schema cũ (trước khi có system_balances)
+CREATE TABLE IF NOT EXISTS system_balances (
+    balance_id TINYINT PRIMARY KEY,
+    total_wallet_balance DECIMAL(18, 2) NOT NULL DEFAULT 0.00,
+    total_savings_principal DECIMAL(18, 2) NOT NULL DEFAULT 0.00,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
+
+-- Khởi tạo bằng số liệu thực tế nếu chưa có dòng nào
+INSERT IGNORE INTO system_balances (balance_id, total_wallet_balance, total_savings_principal)
+SELECT 1,
+       (SELECT COALESCE(SUM(wallet_balance), 0) FROM users WHERE role = 'CUSTOMER'),
+       (SELECT COALESCE(SUM(principal_balance), 0) FROM savings_accounts WHERE status = 'ACTIVE');
@@ -0,0 +1,20 @@
+-- Index cho các truy vấn nóng
+
+-- GET /api/transactions?status=... ORDER BY created_at DESC, transaction_id DESC
+CREATE INDEX idx_transactions_status_created ON transactions (status, created_at);
+-- GET /api/transactions (không lọc status)
+CREATE INDEX idx_transactions_created ON transactions (created_at);
+
+-- Dashboard, /api/users (role = 'CUSTOMER'), filter ?role=&status=
+CREATE INDEX idx_users_role_status ON users (role, status);
+CREATE INDEX idx_users_role_created ON users (role, created_at);
+-- GET /api/admin/users ORDER BY created_at DESC
+CREATE INDEX idx_users_created ON users (created_at);
+-- Tìm kiếm theo tên: FULLTEXT trên cột bỏ dấu full_name_search (migration 003)
+
+-- Chi tiết user: danh sách sổ của một user theo thứ tự opened_at
+CREATE INDEX idx_savings_user_opened ON savings_accounts (user_id, opened_at);
+-- Dashboard / balance-system: SUM(principal_balance) WHERE status = 'ACTIVE' (covering index)
+CREATE INDEX idx_savings_status_principal ON savings_accounts (status, principal_balance);
+-- GET /api/savings-accounts ORDER BY opened_at DESC, account_id DESC
+CREATE INDEX idx_savings_opened ON savings_accounts (opened_at);
@@ -0,0 +1,30 @@
+"""Cột tên bỏ dấu (full_name_search) + FULLTEXT index cho tìm kiếm người dùng.
+
+Tên tiếng Việt có nhiều từ 1-2 ký tự (Lê, Đỗ, An...), cần cấu hình MySQL:
+    innodb_ft_min_token_size = 1
+    innodb_ft_enable_stopword = 0
+"""
+from common.search import normalize_name
+
+BATCH_SIZE = 1000
+
+
+def upgrade(cursor):
+    cursor.execute("ALTER TABLE users ADD COLUMN full_name_search VARCHAR(100) NULL AFTER full_name")
+
+    last_id = 0
+    while True:
+        cursor.execute(
+            "SELECT user_id, full_name FROM users WHERE user_id > %s ORDER BY user_id LIMIT %s",
+            (last_id, BATCH_SIZE)
+        )
+        rows = cursor.fetchall()
+        if not rows:
+            break
+        cursor.executemany(
+            "UPDATE users SET full_name_search = %s WHERE user_id = %s",
+            [(normalize_name(full_name), user_id) for user_id, full_name in rows]
+        )
+        last_id = rows[-1][0]
+
+    cursor.execute("CREATE FULLTEXT INDEX ft_users_full_name_search ON users (full_name_search)")
@@ -0,0 +1,3 @@
+-- Tham số QĐ6: độ khó băm mật khẩu (số vòng lặp pbkdf2:sha256)
+INSERT IGNORE INTO system_configs (config_key, config_value, description)
+VALUES ('PASSWORD_HASH_ITERATIONS', '600000', 'Số vòng lặp pbkdf2:sha256 khi băm mật khẩu (đổi xong sẽ băm lại khi user đăng nhập)');
@@ -0,0 +1,8 @@
+-- Số phiên bản dữ liệu tham chiếu: mỗi lần Admin sửa bảng tương ứng thì tăng lên,
+-- các worker so sánh với bản sao trong bộ nhớ để biết khi nào cần nạp lại.
+CREATE TABLE IF NOT EXISTS cache_versions (
+    cache_name VARCHAR(50) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0
+);
+
+INSERT IGNORE INTO cache_versions (cache_name, version) VALUES ('savings_products', 0), ('system_configs', 0);
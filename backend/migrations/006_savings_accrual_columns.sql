@@ -0,0 +1,9 @@
+-- Kết quả tính lãi hằng đêm (flask --app app accrue-interest)
+ALTER TABLE savings_accounts
+    ADD COLUMN accrued_interest DECIMAL(15, 2) NOT NULL DEFAULT 0.00,   -- Lãi dự thu tới last_accrued_at
+    ADD COLUMN maturity_date DATE NULL,                                 -- Ngày đáo hạn (NULL nếu không kỳ hạn)
+    ADD COLUMN early_withdrawal_eligible BOOLEAN NOT NULL DEFAULT FALSE, -- Đã giữ đủ min_days_hold chưa
+    ADD COLUMN last_accrued_at DATE NULL;
+
+-- Chạy theo khối account_id của các sổ ACTIVE
+CREATE INDEX idx_savings_status_account ON savings_accounts (status, account_id);
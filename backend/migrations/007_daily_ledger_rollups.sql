@@ -0,0 +1,18 @@
+-- Tổng hợp giao dịch theo ngày / loại / trạng thái cho báo cáo
+CREATE TABLE IF NOT EXISTS daily_ledger_rollups (
+    rollup_date DATE NOT NULL,
+    transaction_type ENUM('DEPOSIT_TO_WALLET', 'WITHDRAW_FROM_WALLET', 'OPEN_SAVINGS', 'CLOSE_SAVINGS') NOT NULL,
+    status ENUM('APPROVED', 'REJECTED') NOT NULL,
+    txn_count INT NOT NULL DEFAULT 0,
+    total_amount DECIMAL(20, 2) NOT NULL DEFAULT 0.00,
+    PRIMARY KEY (rollup_date, transaction_type, status)
+);
+
+-- Mốc transaction_id đã được cộng dồn vào bảng tổng hợp
+CREATE TABLE IF NOT EXISTS rollup_state (
+    rollup_name VARCHAR(50) PRIMARY KEY,
+    last_transaction_id INT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
+
+INSERT IGNORE INTO rollup_state (rollup_name, last_transaction_id) VALUES ('daily_ledger', 0);
@@ -0,0 +1,20 @@
+-- Hàng đợi công việc nền (xuất dữ liệu, duyệt hàng loạt, đối soát...)
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id INT AUTO_INCREMENT PRIMARY KEY,
+    job_type VARCHAR(50) NOT NULL,
+    status ENUM('QUEUED', 'RUNNING', 'SUCCEEDED', 'FAILED', 'CANCELLED') NOT NULL DEFAULT 'QUEUED',
+    params JSON NULL,
+    progress INT NOT NULL DEFAULT 0, -- Số đơn vị công việc đã xử lý
+    total INT NULL, -- Tổng số đơn vị (NULL nếu chưa biết)
+    result JSON NULL, -- Tóm tắt kết quả
+    result_path VARCHAR(255) NULL, -- File kết quả trên đĩa (nếu có)
+    error TEXT NULL,
+    cancel_requested BOOLEAN NOT NULL DEFAULT FALSE,
+    created_by INT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    started_at DATETIME NULL,
+    finished_at DATETIME NULL,
+
+    FOREIGN KEY (created_by) REFERENCES users(user_id),
+    INDEX idx_jobs_status_created (status, created_at)
+);
@@ -0,0 +1,9 @@
+-- Phiếu do khách hàng tự lập qua API /api/customer/transactions
+
+-- Idempotency-Key: client gửi lại cùng khóa sẽ nhận lại phiếu cũ thay vì tạo phiếu trùng
+ALTER TABLE transactions
+    ADD COLUMN idempotency_key VARCHAR(64) NULL,
+    ADD UNIQUE INDEX uq_transactions_user_idempotency (user_id, idempotency_key);
+
+-- Lịch sử giao dịch của một khách hàng: WHERE user_id = ? ORDER BY created_at DESC, transaction_id DESC
+CREATE INDEX idx_transactions_user_created ON transactions (user_id, created_at);
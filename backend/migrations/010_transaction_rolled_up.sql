@@ -0,0 +1,12 @@
+-- Đánh dấu từng phiếu đã được cộng vào daily_ledger_rollups, thay cho mốc transaction_id liên tục
+-- (một phiếu PENDING cũ không còn chặn việc cộng dồn các phiếu sau nó)
+ALTER TABLE transactions
+    ADD COLUMN rolled_up BOOLEAN NOT NULL DEFAULT FALSE,
+    ADD INDEX idx_transactions_rollup (rolled_up, status, transaction_id);
+
+-- Các phiếu đã có trạng thái cuối và nằm dưới mốc cũ đã được cộng dồn
+UPDATE transactions t
+JOIN rollup_state r ON r.rollup_name = 'daily_ledger'
+SET t.rolled_up = TRUE
+WHERE t.transaction_id <= r.last_transaction_id
+  AND t.status IN ('APPROVED', 'REJECTED');
@@ -0,0 +1,12 @@
+-- Nhật ký sự kiện dùng chung giữa các worker/tiến trình (SSE phiếu giao dịch, khóa/thu hồi token)
+-- Mỗi worker đọc định kỳ các dòng có event_id lớn hơn mốc đã xử lý
+CREATE TABLE IF NOT EXISTS app_events (
+    event_id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    channel VARCHAR(32) NOT NULL,
+    event_type VARCHAR(32) NOT NULL,
+    payload JSON NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+
+    INDEX idx_app_events_created (created_at),
+    INDEX idx_app_events_channel_created (channel, created_at)
+);
@@ -0,0 +1,5 @@
+-- Job đang chạy khi worker tắt êm (reload/deploy, max_requests) được trả về hàng đợi
+-- để worker khác chạy lại, thay vì bị hủy
+ALTER TABLE jobs
+    ADD COLUMN requeued_at DATETIME NULL,
+    ADD INDEX idx_jobs_requeued (status, requeued_at);
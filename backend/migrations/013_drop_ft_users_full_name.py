@@ -0,0 +1,15 @@
+"""Bỏ FULLTEXT index trên users.full_name.
+
+Tìm kiếm chỉ dùng full_name_search (ft_users_full_name_search, migration 003);
+index cũ chỉ làm chậm mọi lần thêm/sửa user (kể cả nhập hàng loạt).
+Database tạo từ bản 002 mới không có index này nên chỉ xóa khi tồn tại.
+"""
+
+
+def upgrade(cursor):
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = 'users' AND index_name = 'ft_users_full_name'
+    """)
+    if cursor.fetchone()[0]:
+        cursor.execute("DROP INDEX ft_users_full_name ON users")
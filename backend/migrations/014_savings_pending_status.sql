@@ -0,0 +1,19 @@
+-- Sổ mở qua phiếu OPEN_SAVINGS ở trạng thái PENDING cho đến khi phiếu được duyệt:
+-- chưa được tính lãi, chưa báo giá / tất toán, chưa cộng vào tổng tiền gốc hệ thống
+ALTER TABLE savings_accounts
+    MODIFY COLUMN status ENUM('PENDING', 'ACTIVE', 'CLOSED') DEFAULT 'ACTIVE';
+
+-- Tiền gốc của các sổ đang chờ duyệt trước đây đã được cộng ngay khi lập phiếu: trừ lại
+UPDATE system_balances
+SET total_savings_principal = total_savings_principal - (
+    SELECT COALESCE(SUM(s.principal_balance), 0)
+    FROM savings_accounts s
+    JOIN transactions t ON t.account_id = s.account_id
+    WHERE t.transaction_type = 'OPEN_SAVINGS' AND t.status = 'PENDING' AND s.status = 'ACTIVE'
+)
+WHERE balance_id = 1;
+
+UPDATE savings_accounts s
+JOIN transactions t ON t.account_id = s.account_id
+SET s.status = 'PENDING'
+WHERE t.transaction_type = 'OPEN_SAVINGS' AND t.status = 'PENDING' AND s.status = 'ACTIVE';
@@ -0,0 +1,7 @@
+-- Token bucket dùng chung cho mọi worker/máy chủ (xem common/ratelimit.SharedTokenBucketLimiter)
+CREATE TABLE IF NOT EXISTS rate_limit_buckets (
+    bucket_key VARCHAR(100) PRIMARY KEY,
+    tokens DOUBLE NOT NULL,
+    updated_at DOUBLE NOT NULL,    -- UNIX_TIMESTAMP(NOW(6)) của MySQL, không phụ thuộc đồng hồ từng máy
+    INDEX idx_rate_limit_buckets_updated (updated_at)
+);
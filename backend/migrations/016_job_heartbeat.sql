@@ -0,0 +1,10 @@
+-- Job chạy trong tiến trình runner riêng (flask --app app run-jobs) và định kỳ ghi heartbeat_at.
+-- Job RUNNING có heartbeat quá cũ (runner chết, bị kill, mất mạng) được runner khác trả về hàng đợi.
+-- attempt tăng mỗi lần nhận job: runner cũ mất quyền ghi trạng thái khi job đã bị nhận lại.
+ALTER TABLE jobs
+    ADD COLUMN heartbeat_at DATETIME NULL,
+    ADD COLUMN attempt INT NOT NULL DEFAULT 0,
+    ADD INDEX idx_jobs_heartbeat (status, heartbeat_at);
+
+-- Job đang RUNNING từ trước khi nâng cấp: coi như heartbeat cuối là lúc bắt đầu chạy
+UPDATE jobs SET heartbeat_at = COALESCE(started_at, NOW()), attempt = 1 WHERE status = 'RUNNING';
@@ -0,0 +1,5 @@
+-- Tổng số dư hệ thống chia thành 16 dòng slot (common/ledger.py: BALANCE_SLOTS):
+-- mỗi transaction duyệt phiếu cộng vào một slot ngẫu nhiên thay vì cùng khóa dòng balance_id = 1.
+-- Dòng 1 giữ nguyên số liệu hiện có, các slot mới bắt đầu từ 0; tổng = SUM các dòng.
+INSERT IGNORE INTO system_balances (balance_id) VALUES
+    (2), (3), (4), (5), (6), (7), (8), (9), (10), (11), (12), (13), (14), (15), (16);
@@ -0,0 +1,4 @@
+-- Phiên bản token của user: tăng khi buộc đăng nhập lại (VD: đổi role). Token mang claim "ver";
+-- token có ver nhỏ hơn phiên bản hiện tại bị từ chối (không phụ thuộc iat làm tròn theo giây).
+ALTER TABLE users
+    ADD COLUMN token_version INT NOT NULL DEFAULT 0;
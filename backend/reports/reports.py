@@ -0,0 +1,164 @@
+import datetime
+
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from common.db import db_cursor, db_conn, read_only
+from common.requireRole import require_role
+from common.export import DATASETS, ExportError, export_chunks
+
+reports_bp = Blueprint('reports', __name__)
+
+DEFAULT_RANGE_DAYS = 30
+MAX_RANGE_DAYS     = 3660
+
+TRANSACTION_TYPES = ('DEPOSIT_TO_WALLET', 'WITHDRAW_FROM_WALLET', 'OPEN_SAVINGS', 'CLOSE_SAVINGS')
+
+
+def _parse_range(args):
+    """Đọc ?from=YYYY-MM-DD&to=YYYY-MM-DD (mặc định 30 ngày gần nhất)."""
+    date_to = datetime.date.fromisoformat(args['to']) if args.get('to') else datetime.date.today()
+    date_from = (datetime.date.fromisoformat(args['from']) if args.get('from')
+                 else date_to - datetime.timedelta(days=DEFAULT_RANGE_DAYS - 1))
+    if date_from > date_to:
+        raise ValueError('from phải nhỏ hơn hoặc bằng to!')
+    if (date_to - date_from).days >= MAX_RANGE_DAYS:
+        raise ValueError(f'Khoảng thời gian tối đa {MAX_RANGE_DAYS} ngày!')
+    return date_from, date_to
+
+
+@reports_bp.route('/api/reports/daily-volumes', methods=['GET'])
+@require_role(['STAFF', 'ADMIN'])
+@read_only
+def daily_volumes():
+    """Số lượng và tổng tiền giao dịch theo ngày / loại / trạng thái (đọc từ bảng tổng hợp)."""
+    try:
+        date_from, date_to = _parse_range(request.args)
+    except ValueError as e:
+        return jsonify({'message': f'Khoảng thời gian không hợp lệ! {e}'}), 400
+
+    type_filter = request.args.get('type')
+    status_filter = request.args.get('status')
+
+    if type_filter and type_filter not in TRANSACTION_TYPES:
+        return jsonify({'message': 'type không hợp lệ!'}), 400
+    if status_filter and status_filter not in ('APPROVED', 'REJECTED'):
+        return jsonify({'message': 'status chỉ chấp nhận APPROVED hoặc REJECTED!'}), 400
+
+    query = """
+        SELECT rollup_date, transaction_type, status, txn_count, total_amount
+        FROM daily_ledger_rollups
+        WHERE rollup_date BETWEEN %s AND %s
+    """
+    params = [date_from, date_to]
+
+    if type_filter:
+        query += " AND transaction_type = %s"
+        params.append(type_filter)
+
+    if status_filter:
+        query += " AND status = %s"
+        params.append(status_filter)
+
+    query += " ORDER BY rollup_date, transaction_type, status"
+
+    try:
+        db_cursor.execute(query, tuple(params))
+        rows = [
+            {
+                'date': str(row[0]),
+                'transaction_type': row[1],
+                'status': row[2],
+                'count': row[3],
+                'total_amount': float(row[4])
+            }
+            for row in db_cursor.fetchall()
+        ]
+        return jsonify({
+            'message': 'Khối lượng giao dịch theo ngày',
+            'from': str(date_from),
+            'to': str(date_to),
+            'rows': rows
+        }), 200
+    except Exception as e:
+        return jsonify({'message': 'Lỗi server!', 'error': str(e)}), 500
+
+
+@reports_bp.route('/api/reports/deposits-vs-withdrawals', methods=['GET'])
+@require_role(['STAFF', 'ADMIN'])
+@read_only
+def deposits_vs_withdrawals():
+    """Tổng nạp và rút ví (đã duyệt) theo từng ngày trong khoảng thời gian."""
+    try:
+        date_from, date_to = _parse_range(request.args)
+    except ValueError as e:
+        return jsonify({'message': f'Khoảng thời gian không hợp lệ! {e}'}), 400
+
+    try:
+        db_cursor.execute("""
+            SELECT rollup_date,
+                   COALESCE(SUM(CASE WHEN transaction_type = 'DEPOSIT_TO_WALLET' THEN total_amount END), 0),
+                   COALESCE(SUM(CASE WHEN transaction_type = 'WITHDRAW_FROM_WALLET' THEN total_amount END), 0)
+            FROM daily_ledger_rollups
+            WHERE rollup_date BETWEEN %s AND %s
+              AND status = 'APPROVED'
+              AND transaction_type IN ('DEPOSIT_TO_WALLET', 'WITHDRAW_FROM_WALLET')
+            GROUP BY rollup_date
+            ORDER BY rollup_date
+        """, (date_from, date_to))
+
+        days = []
+        total_deposits = total_withdrawals = 0
+        for day, deposits, withdrawals in db_cursor.fetchall():
+            total_deposits += deposits
+            total_withdrawals += withdrawals
+            days.append({
+                'date': str(day),
+                'deposits': float(deposits),
+                'withdrawals': float(withdrawals),
+                'net': float(deposits - withdrawals)
+            })
+
+        return jsonify({
+            'message': 'Nạp và rút ví theo ngày',
+            'from': str(date_from),
+            'to': str(date_to),
+            'total_deposits': float(total_deposits),
+            'total_withdrawals': float(total_withdrawals),
+            'net': float(total_deposits - total_withdrawals),
+            'days': days
+        }), 200
+    except Exception as e:
+        return jsonify({'message': 'Lỗi server!', 'error': str(e)}), 500
+
+
+EXPORT_MIMETYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+
+@reports_bp.route('/api/exports/<dataset>', methods=['GET'])
+@require_role(['STAFF', 'ADMIN'])
+@read_only
+def export_dataset(dataset):
+    """Tải toàn bộ transactions / savings_accounts dạng CSV hoặc Parquet (stream, lọc ?from=&to=)."""
+    if dataset not in DATASETS:
+        return jsonify({'message': f"Dữ liệu không hợp lệ! Chỉ chấp nhận: {', '.join(DATASETS)}"}), 404
+
+    fmt = request.args.get('format', 'csv')
+    try:
+        date_from = datetime.date.fromisoformat(request.args['from']) if request.args.get('from') else None
+        date_to = datetime.date.fromisoformat(request.args['to']) if request.args.get('to') else None
+    except ValueError:
+        return jsonify({'message': 'Khoảng thời gian không hợp lệ! Định dạng: YYYY-MM-DD'}), 400
+
+    try:
+        chunks = export_chunks(db_conn, dataset, fmt, date_from, date_to)
+    except ExportError as e:
+        return jsonify({'message': str(e)}), 400
+
+    suffix = ''.join(f'_{d}' for d in (date_from, date_to) if d)
+    return Response(
+        stream_with_context(chunks),
+        mimetype=EXPORT_MIMETYPES[fmt],
+        headers={'Content-Disposition': f'attachment; filename={dataset}{suffix}.{fmt}'}
+    )
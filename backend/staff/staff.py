@@ -1,16 +1,36 @@
-from flask import Blueprint, request, jsonify
-from common.db import db_cursor, db_conn
-from common.requireRole import require_role
+import datetime
+import time
+
+from flask import Blueprint, Response, request, jsonify
+from common.db import db_cursor, db_conn, run_with_retry, read_only
+from common.requireRole import TICKET_LIFETIME_SECONDS, issue_ticket, require_role
+from common.cache import invalidate_dashboard
+from common.ledger import apply_balance_delta, get_balances
+from common.refdata import get_product, get_products_by_id
+from common.interest import quote_accounts
+from common.jobs import enqueue
+from common.events import ensure_listener, transaction_events, publish_transaction, watching
+from common.serialize import RowSerializer, dumps_line, list_payload, wants_columns
+from common.pagination import (
+    CursorError, parse_page_args, wants_stream, keyset_clause, keyset_params,
+    fetch_page, stream_ndjson
+)
 
 transactions_bp = Blueprint('transactions', __name__)
 
 
-@transactions_bp.route('/api/transactions', methods=['GET'])
-@require_role(['STAFF', 'ADMIN'])
-def get_all_transactions():
-    """Chỉ STAFF và ADMIN mới được xem danh sách giao dịch."""
-    status_filter = request.args.get('status')
-    
+TRANSACTION_ROW = RowSerializer([
+    ('transaction_id',   'int'),
+    ('customer_name',    'str'),
+    ('amount',           'money'),
+    ('transaction_type', 'str'),
+    ('status',           'str'),
+    ('created_at',       'datetime'),
+])
+
+
+def transactions_query(status_filter, after):
+    """Truy vấn danh sách giao dịch (dùng chung cho Flask và ASGI)."""
     query = """
         SELECT
             t.transaction_id,
@@ -21,131 +41,544 @@ def get_all_transactions():
             t.created_at
         FROM transactions t
         JOIN users u ON t.user_id = u.user_id
+        WHERE 1=1
     """
     params = []
-    
+
     if status_filter:
-        query += " WHERE t.status = %s"
+        query += " AND t.status = %s"
         params.append(status_filter)
-        
-    query += " ORDER BY t.created_at DESC"
+
+    if after:
+        query += keyset_clause('t.created_at', 't.transaction_id')
+        params.extend(keyset_params(after))
+
+    query += " ORDER BY t.created_at DESC, t.transaction_id DESC"
+    return query, params
+
+
+@transactions_bp.route('/api/transactions', methods=['GET'])
+@require_role(['STAFF', 'ADMIN'])
+@read_only
+def get_all_transactions():
+    """Chỉ STAFF và ADMIN mới được xem danh sách giao dịch (phân trang keyset)."""
+    status_filter = request.args.get('status')
+    streaming = wants_stream(request.args)
+
+    try:
+        after, limit = parse_page_args(request.args, streaming)
+    except CursorError as e:
+        return jsonify({'message': str(e)}), 400
     
+    query, params = transactions_query(status_filter, after)
+
+    if streaming:
+        return stream_ndjson(query, params, limit, TRANSACTION_ROW.to_dict,
+                             'created_at', 'transaction_id')
+
+    columnar = wants_columns(request.args)
+    to_row, sort_key, id_key = TRANSACTION_ROW.page_args(columnar, 'created_at', 'transaction_id')
     try:
-        db_cursor.execute(query, tuple(params))
-        rows = db_cursor.fetchall()
-
-        transactions = [
-            {
-                'transaction_id':   row[0],
-                'customer_name':    row[1],
-                'amount':           float(row[2]),
-                'transaction_type': row[3],
-                'status':           row[4],
-                'created_at':       str(row[5]),
-            }
-            for row in rows
-        ]
-        return jsonify({
-            'message':      'Danh sách lịch sử giao dịch',
-            'total':        len(transactions),
-            'transactions': transactions
-        }), 200
+        transactions, next_cursor = fetch_page(db_cursor, query, params, limit,
+                                               to_row, sort_key, id_key)
+        return jsonify(list_payload('Danh sách lịch sử giao dịch', 'transactions', transactions,
+                                    TRANSACTION_ROW, columnar, next_cursor=next_cursor)), 200
     except Exception as e:
         return jsonify({'message': 'Lỗi server!', 'error': str(e)}), 500
 
 
+# Ảnh hưởng của từng loại phiếu lên ví khách hàng (+1: cộng tiền, -1: trừ tiền)
+WALLET_EFFECT = {
+    'DEPOSIT_TO_WALLET':    1,
+    'WITHDRAW_FROM_WALLET': -1,
+    'OPEN_SAVINGS':         -1,
+    'CLOSE_SAVINGS':        1,
+}
+
+INSUFFICIENT_FUNDS_MESSAGES = {
+    'WITHDRAW_FROM_WALLET': 'Số dư ví không đủ để rút!',
+    'OPEN_SAVINGS':         'Số dư trong ví không đủ để mở sổ tiết kiệm!',
+}
+
+
+CLOSED_ACCOUNT_MESSAGE = 'Sổ tiết kiệm không còn ACTIVE, không thể tất toán!'
+PENDING_ACCOUNT_MESSAGE = 'Sổ tiết kiệm của phiếu mở sổ không còn ở trạng thái chờ duyệt!'
+
+
+def _close_savings_account(account_id):
+    """Tất toán sổ; trả về số tiền gốc bị rút khỏi tổng tiết kiệm (None nếu sổ đã đóng)."""
+    db_cursor.execute(
+        "SELECT principal_balance FROM savings_accounts WHERE account_id = %s AND status = 'ACTIVE' FOR UPDATE",
+        (account_id,)
+    )
+    row = db_cursor.fetchone()
+    if not row:
+        return None
+    db_cursor.execute("UPDATE savings_accounts SET status = 'CLOSED' WHERE account_id = %s", (account_id,))
+    return row[0]
+
+
+def _activate_savings_account(account_id):
+    """Mở sổ khi duyệt phiếu OPEN_SAVINGS (PENDING -> ACTIVE, tính lãi từ lúc này). Trả về False nếu sổ không còn chờ duyệt."""
+    db_cursor.execute(
+        "UPDATE savings_accounts SET status = 'ACTIVE', opened_at = NOW() WHERE account_id = %s AND status = 'PENDING'",
+        (account_id,)
+    )
+    return db_cursor.rowcount == 1
+
+
+def _cancel_savings_account(account_id):
+    """Đóng sổ đang chờ duyệt khi phiếu OPEN_SAVINGS bị từ chối (sổ chưa có tiền)."""
+    db_cursor.execute(
+        "UPDATE savings_accounts SET status = 'CLOSED' WHERE account_id = %s AND status = 'PENDING'",
+        (account_id,)
+    )
+
+
+def _approve(transaction_id, staff_id):
+    """Duyệt một phiếu trong transaction riêng. Trả về (body, status_code)."""
+    # Khóa phiếu và ví của khách hàng cho đến khi commit/rollback
+    db_cursor.execute("""
+        SELECT t.user_id, t.account_id, t.amount, t.transaction_type, t.status, u.role
+        FROM transactions t
+        JOIN users u ON t.user_id = u.user_id
+        WHERE t.transaction_id = %s
+        FOR UPDATE
+    """, (transaction_id,))
+    txn = db_cursor.fetchone()
+
+    if not txn:
+        db_conn.rollback()
+        return {'message': 'Không tìm thấy giao dịch!'}, 404
+
+    user_id, account_id, amount, transaction_type, status, user_role = txn
+
+    if status != 'PENDING':
+        db_conn.rollback()
+        return {'message': f'Giao dịch không ở trạng thái PENDING (Hiện tại: {status})'}, 400
+
+    wallet_delta = WALLET_EFFECT[transaction_type] * amount
+    savings_delta = 0
+
+    # CLOSE_SAVINGS chỉ được cộng tiền khi chính lần duyệt này chuyển sổ ACTIVE -> CLOSED
+    if transaction_type == 'CLOSE_SAVINGS':
+        closed_principal = _close_savings_account(account_id) if account_id else None
+        if closed_principal is None:
+            db_conn.rollback()
+            return {'message': CLOSED_ACCOUNT_MESSAGE}, 409
+        savings_delta = -closed_principal
+
+    # OPEN_SAVINGS: sổ chỉ được mở (và cộng vào tổng tiền gốc) khi chính lần duyệt này chuyển PENDING -> ACTIVE
+    if transaction_type == 'OPEN_SAVINGS':
+        if not account_id or not _activate_savings_account(account_id):
+            db_conn.rollback()
+            return {'message': PENDING_ACCOUNT_MESSAGE}, 409
+        savings_delta = amount
+
+    if wallet_delta < 0:
+        # Chỉ trừ tiền khi số dư còn đủ – kiểm tra và cập nhật trong cùng một câu lệnh
+        db_cursor.execute(
+            "UPDATE users SET wallet_balance = wallet_balance - %s WHERE user_id = %s AND wallet_balance >= %s",
+            (amount, user_id, amount)
+        )
+        if db_cursor.rowcount == 0:
+            db_conn.rollback()
+            return {'message': INSUFFICIENT_FUNDS_MESSAGES[transaction_type]}, 400
+    else:
+        db_cursor.execute("UPDATE users SET wallet_balance = wallet_balance + %s WHERE user_id = %s", (amount, user_id))
+
+    db_cursor.execute(
+        "UPDATE transactions SET status = 'APPROVED', processed_by = %s WHERE transaction_id = %s AND status = 'PENDING'",
+        (staff_id, transaction_id)
+    )
+    if db_cursor.rowcount == 0:
+        db_conn.rollback()
+        return {'message': 'Giao dịch đã được xử lý bởi người khác!'}, 409
+
+    # Tổng ví hệ thống chỉ tính ví của CUSTOMER
+    if user_role != 'CUSTOMER':
+        wallet_delta = 0
+    apply_balance_delta(db_cursor, wallet_delta, savings_delta)
+    db_conn.commit()
+    return {'message': 'Duyệt giao dịch thành công!'}, 200
+
+
 @transactions_bp.route('/api/transactions/<int:transaction_id>/approve', methods=['PUT'])
 @require_role(['STAFF', 'ADMIN'])
 def approve_transaction(transaction_id):
     """Duyệt phiếu yêu cầu và thực thi thay đổi vào Database."""
     staff_id = request.user_data.get('user_id')
     try:
-        db_cursor.execute("SELECT user_id, account_id, amount, transaction_type, status FROM transactions WHERE transaction_id = %s", (transaction_id,))
-        txn = db_cursor.fetchone()
-        
-        if not txn:
-            return jsonify({'message': 'Không tìm thấy giao dịch!'}), 404
-            
-        user_id, account_id, amount, transaction_type, status = txn
-        amount = float(amount)
-        
-        if status != 'PENDING':
-            return jsonify({'message': f'Giao dịch không ở trạng thái PENDING (Hiện tại: {status})'}), 400
-            
-        if transaction_type == 'DEPOSIT_TO_WALLET':
-            db_cursor.execute("UPDATE users SET wallet_balance = wallet_balance + %s WHERE user_id = %s", (amount, user_id))
-            
-        elif transaction_type == 'WITHDRAW_FROM_WALLET':
-            db_cursor.execute("SELECT wallet_balance FROM users WHERE user_id = %s", (user_id,))
-            wallet = float(db_cursor.fetchone()[0])
-            if wallet < amount:
-                return jsonify({'message': 'Số dư ví không đủ để rút!'}), 400
-            db_cursor.execute("UPDATE users SET wallet_balance = wallet_balance - %s WHERE user_id = %s", (amount, user_id))
-            
-        elif transaction_type == 'OPEN_SAVINGS':
-            db_cursor.execute("SELECT wallet_balance FROM users WHERE user_id = %s", (user_id,))
-            wallet = float(db_cursor.fetchone()[0])
-            if wallet < amount:
-                return jsonify({'message': 'Số dư trong ví không đủ để mở sổ tiết kiệm!'}), 400
-            db_cursor.execute("UPDATE users SET wallet_balance = wallet_balance - %s WHERE user_id = %s", (amount, user_id))
-            # The savings_account might only need its status updated to ACTIVE if it was created in a sort of PENDING state 
-            # Or if it's already ACTIVE, we just deduct money from wallet. 
-            pass
-            
-        elif transaction_type == 'CLOSE_SAVINGS':
-            db_cursor.execute("UPDATE users SET wallet_balance = wallet_balance + %s WHERE user_id = %s", (amount, user_id))
-            if account_id:
-                db_cursor.execute("UPDATE savings_accounts SET status = 'CLOSED' WHERE account_id = %s", (account_id,))
-
-        db_cursor.execute("UPDATE transactions SET status = 'APPROVED', processed_by = %s WHERE transaction_id = %s", (staff_id, transaction_id))
-        db_conn.commit()
-        return jsonify({'message': 'Duyệt giao dịch thành công!'}), 200
+        body, code = run_with_retry(lambda: _approve(transaction_id, staff_id))
+        if code == 200:
+            invalidate_dashboard()
+            publish_transaction('approved', transaction_id, 'APPROVED', processed_by=staff_id)
+        return jsonify(body), code
         
     except Exception as e:
         db_conn.rollback()
         return jsonify({'message': 'Lỗi server!', 'error': str(e)}), 500
 
 
+def _reject(transaction_id, staff_id):
+    """Từ chối một phiếu trong transaction riêng. Trả về (body, status_code)."""
+    db_cursor.execute(
+        "SELECT status, transaction_type, account_id FROM transactions WHERE transaction_id = %s FOR UPDATE",
+        (transaction_id,)
+    )
+    txn = db_cursor.fetchone()
+
+    if not txn:
+        db_conn.rollback()
+        return {'message': 'Không tìm thấy giao dịch!'}, 404
+
+    status, transaction_type, account_id = txn
+    if status != 'PENDING':
+        db_conn.rollback()
+        return {'message': f'Giao dịch không ở trạng thái PENDING (Hiện tại: {status})'}, 400
+
+    db_cursor.execute(
+        "UPDATE transactions SET status = 'REJECTED', processed_by = %s WHERE transaction_id = %s AND status = 'PENDING'",
+        (staff_id, transaction_id)
+    )
+
+    # Sổ của phiếu OPEN_SAVINGS chưa từng được mở (còn PENDING, chưa có tiền): chỉ cần đóng lại
+    if transaction_type == 'OPEN_SAVINGS' and account_id:
+        _cancel_savings_account(account_id)
+
+    db_conn.commit()
+    return {'message': 'Đã từ chối giao dịch!'}, 200
+
+
 @transactions_bp.route('/api/transactions/<int:transaction_id>/reject', methods=['PUT'])
 @require_role(['STAFF', 'ADMIN'])
 def reject_transaction(transaction_id):
     """Từ chối phiếu yêu cầu."""
     staff_id = request.user_data.get('user_id')
     try:
-        db_cursor.execute("SELECT status, transaction_type, account_id FROM transactions WHERE transaction_id = %s", (transaction_id,))
-        txn = db_cursor.fetchone()
-        
-        if not txn:
-            return jsonify({'message': 'Không tìm thấy giao dịch!'}), 404
-            
-        status, transaction_type, account_id = txn
-        if status != 'PENDING':
-            return jsonify({'message': f'Giao dịch không ở trạng thái PENDING (Hiện tại: {status})'}), 400
-            
-        db_cursor.execute("UPDATE transactions SET status = 'REJECTED', processed_by = %s WHERE transaction_id = %s", (staff_id, transaction_id))
-        
-        # We can close the savings account if it was somehow created right away during OPEN_SAVINGS request.
-        if transaction_type == 'OPEN_SAVINGS' and account_id:
-            db_cursor.execute("UPDATE savings_accounts SET status = 'CLOSED' WHERE account_id = %s", (account_id,))
-            
-        db_conn.commit()
-        return jsonify({'message': 'Đã từ chối giao dịch!'}), 200
+        body, code = run_with_retry(lambda: _reject(transaction_id, staff_id))
+        if code == 200:
+            invalidate_dashboard()
+            publish_transaction('rejected', transaction_id, 'REJECTED', processed_by=staff_id)
+        return jsonify(body), code
         
     except Exception as e:
         db_conn.rollback()
         return jsonify({'message': 'Lỗi server!', 'error': str(e)}), 500
 
 
+STREAM_HEARTBEAT_SECONDS = 15     # Gửi comment giữ kết nối khi không có sự kiện
+STREAM_MAX_SECONDS       = 300    # Đóng stream định kỳ để client tự nối lại (giải phóng worker)
+STREAM_TICKET_PURPOSE    = 'transactions-stream'
+
+
+def _sse(event_id, event_type, data):
+    return f"id: {event_id}\nevent: {event_type}\ndata: {dumps_line(data)}\n"
+
+
+@transactions_bp.route('/api/transactions/stream-ticket', methods=['POST'])
+@require_role(['STAFF', 'ADMIN'])
+def stream_ticket():
+    """Cấp vé ngắn hạn để mở stream (EventSource không gửi được header Authorization)."""
+    return jsonify({
+        'ticket': issue_ticket(request.user_data, STREAM_TICKET_PURPOSE),
+        'expires_in': TICKET_LIFETIME_SECONDS,
+    }), 200
+
+
+@transactions_bp.route('/api/transactions/stream', methods=['GET'])
+@require_role(['STAFF', 'ADMIN'], ticket_purpose=STREAM_TICKET_PURPOSE)
+def stream_transactions():
+    """Server-Sent Events: đẩy phiếu mới lập / vừa duyệt / vừa từ chối tới màn hình nhân viên.
+
+    Nối lại bằng header Last-Event-ID (EventSource tự gửi) hoặc ?last_event_id=.
+    Id sự kiện dùng chung giữa các worker (bảng app_events). Nếu không thể nối tiếp
+    (sự kiện đã trôi khỏi bộ đệm của worker),
+    stream gửi sự kiện `reset` để client tải lại danh sách PENDING một lần.
+    """
+    ensure_listener()
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    start = transaction_events.parse_last_id(last_event_id)
+
+    def generate():
+        position = start
+        yield 'retry: 3000\n\n'
+        if position is None:
+            position = transaction_events.parse_last_id(None)
+            yield _sse(str(position), 'reset', {})
+
+        deadline = time.monotonic() + STREAM_MAX_SECONDS
+        with watching():
+            while time.monotonic() < deadline:
+                events = transaction_events.wait(position, STREAM_HEARTBEAT_SECONDS)
+                if not events:
+                    yield ': ping\n\n'
+                    continue
+                for event in events:
+                    position = event.seq
+                    yield _sse(transaction_events.event_id(event), event.event_type, event.data)
+
+    # Không dùng stream_with_context: stream không cần kết nối DB, kết nối được trả về pool ngay
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+BATCH_MAX_ITEMS     = 5000
+BATCH_DEFAULT_CHUNK = 500
+
+
+def _placeholders(values):
+    return ', '.join(['%s'] * len(values))
+
+
+def process_transaction_batch(items, staff_id):
+    """Duyệt/từ chối một lô phiếu trong cùng một transaction (caller tự commit).
+
+    Khóa toàn bộ phiếu, ví khách hàng và sổ liên quan bằng SELECT ... FOR UPDATE
+    (theo thứ tự khóa chính để tránh deadlock), tính toán trong bộ nhớ rồi ghi
+    lại bằng vài câu UPDATE gộp. Trả về danh sách kết quả theo thứ tự đầu vào.
+    """
+    txn_ids = sorted({item['transaction_id'] for item in items})
+    db_cursor.execute(f"""
+        SELECT transaction_id, user_id, account_id, amount, transaction_type, status
+        FROM transactions
+        WHERE transaction_id IN ({_placeholders(txn_ids)})
+        ORDER BY transaction_id
+        FOR UPDATE
+    """, tuple(txn_ids))
+    txns = {row[0]: row for row in db_cursor.fetchall()}
+
+    users = {}
+    user_ids = sorted({row[1] for row in txns.values()})
+    if user_ids:
+        db_cursor.execute(f"""
+            SELECT user_id, wallet_balance, role FROM users
+            WHERE user_id IN ({_placeholders(user_ids)})
+            ORDER BY user_id
+            FOR UPDATE
+        """, tuple(user_ids))
+        users = {row[0]: {'wallet': row[1] or 0, 'role': row[2]} for row in db_cursor.fetchall()}
+
+    accounts = {}
+    account_ids = sorted({row[2] for row in txns.values()
+                          if row[2] and row[4] in ('OPEN_SAVINGS', 'CLOSE_SAVINGS')})
+    if account_ids:
+        db_cursor.execute(f"""
+            SELECT account_id, principal_balance, status FROM savings_accounts
+            WHERE account_id IN ({_placeholders(account_ids)})
+            ORDER BY account_id
+            FOR UPDATE
+        """, tuple(account_ids))
+        accounts = {row[0]: {'principal': row[1], 'status': row[2]} for row in db_cursor.fetchall()}
+
+    approved, rejected, closed_accounts, opened_accounts, changed_users = [], [], [], [], set()
+    wallet_delta = 0
+    savings_delta = 0
+    results = []
+
+    for item in items:
+        transaction_id, action = item['transaction_id'], item['action']
+        result = {'transaction_id': transaction_id, 'action': action, 'success': False}
+        results.append(result)
+
+        txn = txns.get(transaction_id)
+        if not txn:
+            result['message'] = 'Không tìm thấy giao dịch!'
+            continue
+
+        _, user_id, account_id, amount, transaction_type, status = txn
+        if status != 'PENDING':
+            result['message'] = f'Giao dịch không ở trạng thái PENDING (Hiện tại: {status})'
+            continue
+
+        close_account = None
+        if action == 'approve':
+            if transaction_type == 'CLOSE_SAVINGS':
+                account = accounts.get(account_id)
+                if not account or account['status'] != 'ACTIVE':
+                    result['message'] = CLOSED_ACCOUNT_MESSAGE
+                    continue
+            if transaction_type == 'OPEN_SAVINGS':
+                account = accounts.get(account_id)
+                if not account or account['status'] != 'PENDING':
+                    result['message'] = PENDING_ACCOUNT_MESSAGE
+                    continue
+            user = users[user_id]
+            delta = WALLET_EFFECT[transaction_type] * amount
+            if delta < 0 and user['wallet'] + delta < 0:
+                result['message'] = INSUFFICIENT_FUNDS_MESSAGES[transaction_type]
+                continue
+            user['wallet'] += delta
+            changed_users.add(user_id)
+            if user['role'] == 'CUSTOMER':
+                wallet_delta += delta
+            if transaction_type == 'CLOSE_SAVINGS':
+                close_account = account_id
+            if transaction_type == 'OPEN_SAVINGS':
+                accounts[account_id]['status'] = 'ACTIVE'
+                opened_accounts.append(account_id)
+                savings_delta += accounts[account_id]['principal']
+            approved.append(transaction_id)
+            new_status = 'APPROVED'
+        else:
+            if transaction_type == 'OPEN_SAVINGS':
+                close_account = account_id
+            rejected.append(transaction_id)
+            new_status = 'REJECTED'
+
+        account = accounts.get(close_account)
+        if account and account['status'] in ('ACTIVE', 'PENDING'):
+            # Sổ còn PENDING (phiếu mở bị từ chối) chưa từng được cộng vào tổng tiền gốc
+            if account['status'] == 'ACTIVE':
+                savings_delta -= account['principal']
+            account['status'] = 'CLOSED'
+            closed_accounts.append(close_account)
+
+        # Phiếu trùng trong cùng lô sẽ thấy trạng thái mới
+        txns[transaction_id] = txn[:5] + (new_status,)
+        result['success'] = True
+        result['message'] = 'Duyệt giao dịch thành công!' if action == 'approve' else 'Đã từ chối giao dịch!'
+
+    if changed_users:
+        ids = sorted(changed_users)
+        cases = ' '.join(['WHEN %s THEN %s'] * len(ids))
+        params = [value for uid in ids for value in (uid, users[uid]['wallet'])]
+        db_cursor.execute(
+            f"UPDATE users SET wallet_balance = CASE user_id {cases} END "
+            f"WHERE user_id IN ({_placeholders(ids)})",
+            tuple(params + ids)
+        )
+
+    for new_status, ids in (('APPROVED', approved), ('REJECTED', rejected)):
+        if ids:
+            db_cursor.execute(
+                f"UPDATE transactions SET status = %s, processed_by = %s "
+                f"WHERE transaction_id IN ({_placeholders(ids)})",
+                (new_status, staff_id, *ids)
+            )
+
+    if opened_accounts:
+        db_cursor.execute(
+            f"UPDATE savings_accounts SET status = 'ACTIVE', opened_at = NOW() "
+            f"WHERE account_id IN ({_placeholders(opened_accounts)})",
+            tuple(opened_accounts)
+        )
+
+    if closed_accounts:
+        db_cursor.execute(
+            f"UPDATE savings_accounts SET status = 'CLOSED' "
+            f"WHERE account_id IN ({_placeholders(closed_accounts)})",
+            tuple(closed_accounts)
+        )
+
+    apply_balance_delta(db_cursor, wallet_delta, savings_delta)
+    return results
+
+
+def _commit_batch(items, staff_id):
+    results = process_transaction_batch(items, staff_id)
+    db_conn.commit()
+    return results
+
+
+def validate_batch(items, chunk_size):
+    """Kiểm tra body của yêu cầu xử lý hàng loạt, trả về thông báo lỗi hoặc None."""
+    if not isinstance(items, list) or not items:
+        return 'Vui lòng gửi danh sách items!'
+
+    if len(items) > BATCH_MAX_ITEMS:
+        return f'Tối đa {BATCH_MAX_ITEMS} phiếu mỗi lần!'
+
+    if not isinstance(chunk_size, int) or chunk_size < 1:
+        return 'chunk_size phải là số nguyên >= 1!'
+
+    for item in items:
+        if (not isinstance(item, dict) or not isinstance(item.get('transaction_id'), int)
+                or item.get('action') not in ('approve', 'reject')):
+            return 'Mỗi item phải có transaction_id (số nguyên) và action (approve/reject)!'
+    return None
+
+
+def iter_transaction_batch(items, chunk_size, staff_id):
+    """Xử lý danh sách phiếu theo từng lô, mỗi lô một transaction; yield kết quả của từng lô.
+
+    Caller có thể dừng giữa chừng (VD: job bị hủy) – các lô đã commit vẫn giữ nguyên
+    và cache Dashboard luôn được làm mới khi generator kết thúc hoặc bị đóng.
+    """
+    try:
+        for start in range(0, len(items), chunk_size):
+            chunk = items[start:start + chunk_size]
+            try:
+                chunk_results = run_with_retry(lambda: _commit_batch(chunk, staff_id))
+                for r in chunk_results:
+                    if r['success']:
+                        status = 'APPROVED' if r['action'] == 'approve' else 'REJECTED'
+                        publish_transaction(status.lower(), r['transaction_id'], status, processed_by=staff_id)
+            except Exception as e:
+                db_conn.rollback()
+                chunk_results = [{
+                    'transaction_id': item['transaction_id'],
+                    'action': item['action'],
+                    'success': False,
+                    'message': 'Lỗi server!',
+                    'error': str(e)
+                } for item in chunk]
+            yield chunk_results
+    finally:
+        invalidate_dashboard()
+
+
+def run_transaction_batch(items, chunk_size, staff_id):
+    """Xử lý toàn bộ danh sách phiếu, trả về kết quả theo thứ tự đầu vào."""
+    results = []
+    for chunk_results in iter_transaction_batch(items, chunk_size, staff_id):
+        results.extend(chunk_results)
+    return results
+
+
+@transactions_bp.route('/api/transactions/batch', methods=['POST'])
+@require_role(['STAFF', 'ADMIN'])
+def batch_process_transactions():
+    """Duyệt/từ chối hàng loạt phiếu, commit theo từng lô (chunk_size)."""
+    staff_id = request.user_data.get('user_id')
+    data = request.get_json() or {}
+
+    items = data.get('items')
+    chunk_size = data.get('chunk_size', BATCH_DEFAULT_CHUNK)
+
+    error = validate_batch(items, chunk_size)
+    if error:
+        return jsonify({'message': error}), 400
+
+    if data.get('async'):
+        # Chạy nền: trả về job_id ngay, theo dõi qua GET /api/jobs/<job_id>
+        try:
+            job_id = enqueue('batch_transactions', {'items': items, 'chunk_size': chunk_size}, staff_id)
+        except Exception as e:
+            return jsonify({'message': 'Lỗi server!', 'error': str(e)}), 500
+        return jsonify({'message': 'Đã đưa vào hàng đợi', 'job_id': job_id}), 202
+
+    results = run_transaction_batch(items, chunk_size, staff_id)
+
+    succeeded = sum(1 for r in results if r['success'])
+    return jsonify({
+        'message': 'Đã xử lý danh sách phiếu',
+        'total': len(results),
+        'succeeded': succeeded,
+        'failed': len(results) - succeeded,
+        'results': results
+    }), 200
+
+
 @transactions_bp.route('/api/balance-system', methods=['GET'])
 @require_role(['STAFF', 'ADMIN'])
+@read_only
 def get_system_balance():
     """Xem tổng số dư ví và tổng tiền gốc tiết kiệm của toàn hệ thống."""
     try:
-        db_cursor.execute("SELECT SUM(wallet_balance) FROM users WHERE role = 'CUSTOMER'")
-        total_wallet = db_cursor.fetchone()[0] or 0.0
-        
-        db_cursor.execute("SELECT SUM(principal_balance) FROM savings_accounts WHERE status = 'ACTIVE'")
-        total_savings = db_cursor.fetchone()[0] or 0.0
+        # Cộng các dòng slot của system_balances (được cập nhật mỗi khi duyệt phiếu)
+        row = get_balances(db_cursor)
+        total_wallet, total_savings = row if row else (0.0, 0.0)
         
         return jsonify({
             'message': 'Cân đối hệ thống',
@@ -156,106 +589,154 @@ def get_system_balance():
         return jsonify({'message': 'Lỗi server!', 'error': str(e)}), 500
 
 
+CUSTOMER_ROW = RowSerializer([
+    ('user_id',        'int'),
+    ('full_name',      'str'),
+    ('email',          'str'),
+    ('identity_card',  'str'),
+    ('wallet_balance', 'money'),
+    ('status',         'str'),
+    ('created_at',     'datetime'),
+])
+
+
+def customers_query(after):
+    query = """
+        SELECT user_id, full_name, email, identity_card, wallet_balance, status, created_at 
+        FROM users 
+        WHERE role = 'CUSTOMER'
+    """
+    params = []
+    if after:
+        query += keyset_clause('created_at', 'user_id')
+        params.extend(keyset_params(after))
+    query += " ORDER BY created_at DESC, user_id DESC"
+    return query, params
+
+
 @transactions_bp.route('/api/users', methods=['GET'])
 @require_role(['STAFF', 'ADMIN'])
+@read_only
 def get_customers():
-    """Lấy danh sách thông tin khách hàng (role CUSTOMER)."""
+    """Lấy danh sách thông tin khách hàng (role CUSTOMER), phân trang keyset."""
+    streaming = wants_stream(request.args)
     try:
-        db_cursor.execute("""
-            SELECT user_id, full_name, email, identity_card, wallet_balance, status, created_at 
-            FROM users 
-            WHERE role = 'CUSTOMER'
-            ORDER BY created_at DESC
-        """)
-        rows = db_cursor.fetchall()
-        users = [
-            {
-                'user_id': row[0],
-                'full_name': row[1],
-                'email': row[2],
-                'identity_card': row[3],
-                'wallet_balance': float(row[4]),
-                'status': row[5],
-                'created_at': str(row[6])
-            }
-            for row in rows
-        ]
-        return jsonify({
-            'message': 'Danh sách khách hàng',
-            'total': len(users),
-            'users': users
-        })
+        after, limit = parse_page_args(request.args, streaming)
+    except CursorError as e:
+        return jsonify({'message': str(e)}), 400
+
+    query, params = customers_query(after)
+
+    if streaming:
+        return stream_ndjson(query, params, limit, CUSTOMER_ROW.to_dict, 'created_at', 'user_id')
+
+    columnar = wants_columns(request.args)
+    to_row, sort_key, id_key = CUSTOMER_ROW.page_args(columnar, 'created_at', 'user_id')
+    try:
+        users, next_cursor = fetch_page(db_cursor, query, params, limit, to_row, sort_key, id_key)
+        return jsonify(list_payload('Danh sách khách hàng', 'users', users,
+                                    CUSTOMER_ROW, columnar, next_cursor=next_cursor))
     except Exception as e:
         return jsonify({'message': 'Lỗi server!', 'error': str(e)}), 500
 
 
+def savings_account_row(products):
+    """Mô tả cột cho danh sách sổ; thông tin gói tiết kiệm lấy từ cache theo product_id thay vì JOIN."""
+    def product_field(field, convert=None):
+        def get(product_id):
+            value = products.get(product_id, {}).get(field)
+            return convert(value) if convert and value is not None else value
+        return get
+
+    return RowSerializer([
+        ('account_id',        'int'),
+        ('customer_name',     'str'),
+        ('product_name',      product_field('name'), 2),
+        ('principal_balance', 'money', 3),
+        ('opened_at',         'datetime', 4),
+        ('status',            'str', 5),
+        ('interest_rate',     product_field('interest_rate', float), 2),
+        ('term_months',       product_field('term_months'), 2),
+    ])
+
+
+def savings_accounts_query(after):
+    query = """
+        SELECT 
+            s.account_id, u.full_name AS customer_name, s.product_id,
+            s.principal_balance, s.opened_at, s.status
+        FROM savings_accounts s
+        JOIN users u ON s.user_id = u.user_id
+        WHERE 1=1
+    """
+    params = []
+    if after:
+        query += keyset_clause('s.opened_at', 's.account_id')
+        params.extend(keyset_params(after))
+    query += " ORDER BY s.opened_at DESC, s.account_id DESC"
+    return query, params
+
+
 @transactions_bp.route('/api/savings-accounts', methods=['GET'])
 @require_role(['STAFF', 'ADMIN'])
+@read_only
 def get_all_savings_accounts():
-    """Lấy danh sách toàn bộ sổ tiết kiệm."""
+    """Lấy danh sách sổ tiết kiệm (phân trang keyset theo opened_at)."""
+    streaming = wants_stream(request.args)
     try:
-        db_cursor.execute("""
-            SELECT 
-                s.account_id, u.full_name AS customer_name, p.name AS product_name,
-                s.principal_balance, s.opened_at, s.status, p.interest_rate, p.term_months
-            FROM savings_accounts s
-            JOIN users u ON s.user_id = u.user_id
-            JOIN savings_products p ON s.product_id = p.product_id
-            ORDER BY s.opened_at DESC
-        """)
-        rows = db_cursor.fetchall()
-        accounts = [
-            {
-                'account_id': row[0],
-                'customer_name': row[1],
-                'product_name': row[2],
-                'principal_balance': float(row[3]),
-                'opened_at': str(row[4]),
-                'status': row[5],
-                'interest_rate': float(row[6]),
-                'term_months': row[7]
-            }
-            for row in rows
-        ]
-        return jsonify({
-            'message': 'Danh sách sổ tiết kiệm',
-            'total': len(accounts),
-            'accounts': accounts
-        }), 200
+        after, limit = parse_page_args(request.args, streaming)
+    except CursorError as e:
+        return jsonify({'message': str(e)}), 400
+
+    query, params = savings_accounts_query(after)
+
+    try:
+        serializer = savings_account_row(get_products_by_id())
+
+        if streaming:
+            return stream_ndjson(query, params, limit, serializer.to_dict, 'opened_at', 'account_id')
+
+        columnar = wants_columns(request.args)
+        to_row, sort_key, id_key = serializer.page_args(columnar, 'opened_at', 'account_id')
+        accounts, next_cursor = fetch_page(db_cursor, query, params, limit, to_row, sort_key, id_key)
+        return jsonify(list_payload('Danh sách sổ tiết kiệm', 'accounts', accounts,
+                                    serializer, columnar, next_cursor=next_cursor)), 200
     except Exception as e:
         return jsonify({'message': 'Lỗi server!', 'error': str(e)}), 500
 
 
 @transactions_bp.route('/api/savings-accounts/<int:account_id>', methods=['GET'])
 @require_role(['STAFF', 'ADMIN'])
+@read_only
 def get_savings_account_detail(account_id):
     """Xem chi tiết một sổ tiết kiệm cụ thể."""
     try:
         db_cursor.execute("""
             SELECT 
-                s.account_id, u.full_name, u.identity_card, p.name,
-                s.principal_balance, s.opened_at, s.status, p.interest_rate, p.term_months, p.min_days_hold
+                s.account_id, u.full_name, u.identity_card, s.product_id,
+                s.principal_balance, s.opened_at, s.status
             FROM savings_accounts s
             JOIN users u ON s.user_id = u.user_id
-            JOIN savings_products p ON s.product_id = p.product_id
             WHERE s.account_id = %s
         """, (account_id,))
         row = db_cursor.fetchone()
         
         if not row:
             return jsonify({'message': 'Không tìm thấy sổ tiết kiệm!'}), 404
-            
+
+        product = get_product(row[3]) or {}
+        rate = product.get('interest_rate')
         account = {
             'account_id': row[0],
             'customer_name': row[1],
             'identity_card': row[2],
-            'product_name': row[3],
+            'product_name': product.get('name'),
             'principal_balance': float(row[4]),
             'opened_at': str(row[5]),
             'status': row[6],
-            'interest_rate': float(row[7]),
-            'term_months': row[8],
-            'min_days_hold': row[9]
+            'interest_rate': float(rate) if rate is not None else None,
+            'term_months': product.get('term_months'),
+            'min_days_hold': product.get('min_days_hold')
         }
         return jsonify({
             'message': 'Chi tiết sổ tiết kiệm',
@@ -264,3 +745,85 @@ def get_savings_account_detail(account_id):
     except Exception as e:
         return jsonify({'message': 'Lỗi server!', 'error': str(e)}), 500
 
+
+
+QUOTE_MAX_ACCOUNTS = 5000
+
+
+def _parse_as_of(value):
+    """Ngày tính báo giá (YYYY-MM-DD), mặc định hôm nay."""
+    if not value:
+        return datetime.date.today()
+    return datetime.date.fromisoformat(value)
+
+
+def _load_quote_rows(account_ids):
+    db_cursor.execute(f"""
+        SELECT account_id, product_id, principal_balance, opened_at, status
+        FROM savings_accounts
+        WHERE account_id IN ({_placeholders(account_ids)})
+    """, tuple(account_ids))
+    return db_cursor.fetchall()
+
+
+@transactions_bp.route('/api/savings-accounts/<int:account_id>/quote', methods=['GET'])
+@require_role(['STAFF', 'ADMIN'])
+@read_only
+def quote_savings_account(account_id):
+    """Báo giá tất toán một sổ: tiền gốc + lãi nếu tất toán vào ngày ?as_of= (mặc định hôm nay)."""
+    try:
+        as_of = _parse_as_of(request.args.get('as_of'))
+    except ValueError:
+        return jsonify({'message': 'Tham số as_of không hợp lệ! Định dạng: YYYY-MM-DD'}), 400
+
+    try:
+        rows = _load_quote_rows([account_id])
+        if not rows:
+            return jsonify({'message': 'Không tìm thấy sổ tiết kiệm!'}), 404
+
+        quote = quote_accounts(rows, as_of)[0]
+        if 'error' in quote:
+            return jsonify({'message': quote['error']}), 400
+
+        return jsonify({
+            'message': 'Báo giá tất toán sổ tiết kiệm',
+            'as_of': str(as_of),
+            'quote': quote
+        }), 200
+    except Exception as e:
+        return jsonify({'message': 'Lỗi server!', 'error': str(e)}), 500
+
+
+@transactions_bp.route('/api/savings-accounts/quotes', methods=['POST'])
+@require_role(['STAFF', 'ADMIN'])
+def quote_savings_accounts():
+    """Báo giá tất toán hàng loạt sổ trong một request (body: account_ids, as_of)."""
+    data = request.get_json() or {}
+    account_ids = data.get('account_ids')
+
+    if not isinstance(account_ids, list) or not account_ids \
+            or not all(isinstance(a, int) for a in account_ids):
+        return jsonify({'message': 'Vui lòng gửi account_ids là danh sách số nguyên!'}), 400
+
+    if len(account_ids) > QUOTE_MAX_ACCOUNTS:
+        return jsonify({'message': f'Tối đa {QUOTE_MAX_ACCOUNTS} sổ mỗi lần!'}), 400
+
+    try:
+        as_of = _parse_as_of(data.get('as_of'))
+    except (TypeError, ValueError):
+        return jsonify({'message': 'Tham số as_of không hợp lệ! Định dạng: YYYY-MM-DD'}), 400
+
+    try:
+        account_ids = list(dict.fromkeys(account_ids))
+        rows = _load_quote_rows(account_ids)
+        quotes = {q['account_id']: q for q in quote_accounts(rows, as_of)}
+
+        return jsonify({
+            'message': 'Báo giá tất toán sổ tiết kiệm',
+            'as_of': str(as_of),
+            'total': len(account_ids),
+            'quotes': [quotes.get(a, {'account_id': a, 'error': 'Không tìm thấy sổ tiết kiệm!'})
+                       for a in account_ids]
+        }), 200
+    except Exception as e:
+        return jsonify({'message': 'Lỗi server!', 'error': str(e)}), 500
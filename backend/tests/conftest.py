@@ -0,0 +1,61 @@
+import pytest
+
+
+class FakeCursor:
+    """Cursor giả: mỗi câu SQL được so với danh sách (đoạn SQL, hàm xử lý) theo thứ tự.
+
+    Hàm xử lý nhận params, trả về (rows, rowcount). Câu lệnh đã chạy được lưu
+    trong `executed` (SQL đã gộp khoảng trắng) để test kiểm tra.
+    """
+
+    def __init__(self, handlers=()):
+        self.handlers = list(handlers)
+        self.executed = []
+        self.rowcount = -1
+        self._rows = []
+
+    def on(self, needle, handler):
+        self.handlers.append((needle, handler))
+        return self
+
+    def execute(self, sql, params=()):
+        sql = ' '.join(sql.split())
+        self.executed.append((sql, params))
+        for needle, handler in self.handlers:
+            if needle in sql:
+                rows, self.rowcount = handler(params)
+                self._rows = list(rows)
+                return
+        raise AssertionError(f'SQL không mong đợi: {sql}')
+
+    def fetchone(self):
+        return self._rows.pop(0) if self._rows else None
+
+    def fetchall(self):
+        rows, self._rows = self._rows, []
+        return rows
+
+    def close(self):
+        pass
+
+
+class FakeConn:
+    def __init__(self):
+        self.commits = 0
+        self.rollbacks = 0
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+@pytest.fixture
+def make_cursor():
+    return FakeCursor
+
+
+@pytest.fixture
+def fake_conn():
+    return FakeConn()
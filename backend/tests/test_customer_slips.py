@@ -0,0 +1,35 @@
+from decimal import Decimal
+
+import pytest
+
+pytest.importorskip('flask')
+pytest.importorskip('mysql.connector')
+pytest.importorskip('numpy')
+
+from customer import customer
+
+
+def test_close_is_refused_while_open_slip_is_pending(monkeypatch, make_cursor):
+    cursor = make_cursor([
+        ('FROM savings_accounts WHERE account_id = %s AND user_id = %s',
+         lambda p: ([(7, 2, Decimal('300.00'), None, 'PENDING')], 1)),
+    ])
+    monkeypatch.setattr(customer, 'db_cursor', cursor)
+
+    with pytest.raises(customer.SlipError) as e:
+        customer._prepare_close(user_id=1, account_id=7)
+    assert e.value.code == 409
+
+
+def test_close_is_refused_when_close_slip_already_pending(monkeypatch, make_cursor):
+    cursor = make_cursor([
+        ('FROM savings_accounts WHERE account_id = %s AND user_id = %s',
+         lambda p: ([(7, 2, Decimal('300.00'), None, 'ACTIVE')], 1)),
+        ("transaction_type = 'CLOSE_SAVINGS' AND status = 'PENDING'", lambda p: ([(1,)], 1)),
+    ])
+    monkeypatch.setattr(customer, 'db_cursor', cursor)
+
+    with pytest.raises(customer.SlipError) as e:
+        customer._prepare_close(user_id=1, account_id=7)
+    assert e.value.code == 409
+    assert cursor.executed[1][0].endswith('FOR UPDATE')
@@ -0,0 +1,55 @@
+import pytest
+
+pytest.importorskip('flask')
+pytest.importorskip('mysql.connector')
+
+from common.events import EventBus
+
+
+def test_publish_ignores_already_seen_seq():
+    bus = EventBus()
+    assert bus.publish(5, 'approved', {'id': 1}) is not None
+    assert bus.publish(5, 'approved', {'id': 1}) is None
+    assert bus.publish(3, 'rejected', {'id': 2}) is None
+    assert [e.seq for e in bus.wait(0, timeout=0)] == [5]
+
+
+def test_wait_returns_only_newer_events():
+    bus = EventBus()
+    for seq in (1, 2, 3):
+        bus.publish(seq, 'created', {'seq': seq})
+    assert [e.seq for e in bus.wait(1, timeout=0)] == [2, 3]
+    assert bus.wait(3, timeout=0.01) == []
+
+
+def test_parse_last_id_replay_and_reset():
+    bus = EventBus(buffer_size=3)
+    for seq in range(10, 16):
+        bus.publish(seq, 'created', {})
+
+    assert bus.parse_last_id(None) == 15          # Client mới: chỉ nhận sự kiện sau hiện tại
+    assert bus.parse_last_id('14') == 14          # Nối lại trong bộ đệm
+    assert bus.parse_last_id('12') == 12          # Sự kiện ngay trước phần tử cũ nhất vẫn nối được
+    assert bus.parse_last_id('11') is None        # Đã trôi khỏi bộ đệm -> client phải tải lại
+    assert bus.parse_last_id('abc') is None
+    assert bus.parse_last_id('20') == 20          # Worker khác đã phát tới 20: chờ tiếp từ đó
+
+
+def test_event_id_is_global_seq():
+    bus = EventBus()
+    event = bus.publish(42, 'approved', {})
+    assert bus.event_id(event) == '42'
+
+
+def test_listener_backs_off_only_while_nobody_watches(monkeypatch):
+    from common import events
+    monkeypatch.setattr(events, 'EVENT_POLL_INTERVAL', 0.5)
+    monkeypatch.setattr(events, 'EVENT_IDLE_INTERVAL', 10)
+
+    assert events._next_interval(0.5, got_events=False) == 1.0
+    assert events._next_interval(8, got_events=False) == 10
+    assert events._next_interval(10, got_events=True) == 0.5
+
+    with events.watching():
+        assert events._next_interval(10, got_events=False) == 0.5
+    assert events._next_interval(0.5, got_events=False) == 1.0
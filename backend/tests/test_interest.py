@@ -0,0 +1,134 @@
+import datetime
+from decimal import Decimal
+
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('flask')
+pytest.importorskip('mysql.connector')
+
+from common import interest
+from common.interest import compute_accrual, rate_schedule
+
+OPENED = datetime.date(2024, 1, 1)
+PRINCIPAL_CENTS = 100_000_000     # 1.000.000,00
+
+# Gói 6 tháng, 6%/năm, giữ tối thiểu 30 ngày; lãi không kỳ hạn 1%/năm
+TERM = {'product_id': 2, 'interest_rate': Decimal('6.00'), 'term_months': 6, 'min_days_hold': 30}
+NON_TERM = {'product_id': 1, 'interest_rate': Decimal('1.00'), 'term_months': 0, 'min_days_hold': 0}
+NON_TERM_RATE = 1.0
+
+
+@pytest.fixture(autouse=True)
+def fresh_schedules():
+    interest.clear_rate_schedules()
+    yield
+    interest.clear_rate_schedules()
+
+
+def accrue(product, as_of):
+    result = compute_accrual(
+        principal_cents=np.array([PRINCIPAL_CENTS], dtype=np.int64),
+        opened=np.array([OPENED], dtype='datetime64[D]'),
+        rate=np.array([float(product['interest_rate'])]),
+        term_months=np.array([product['term_months']], dtype=np.int64),
+        min_days_hold=np.array([product['min_days_hold']], dtype=np.int64),
+        as_of=as_of,
+        non_term=NON_TERM_RATE,
+    )
+    return {key: value[0] for key, value in result.items()}
+
+
+def test_non_term_schedule_respects_min_days_hold():
+    table, slope = rate_schedule(3.65, 0, 10, 1.0, 0)
+    assert table[9] == 0
+    assert table[10] == pytest.approx(10 * 0.0001)
+    assert slope == pytest.approx(0.0001)
+
+
+def test_term_schedule_pays_contract_rate_only_at_maturity():
+    table, slope = rate_schedule(7.3, 1, 0, 3.65, 31)
+    assert table[30] == pytest.approx(30 * 0.0001)      # Rút trước hạn: lãi không kỳ hạn
+    assert table[31] == pytest.approx(31 * 0.0002)      # Đáo hạn: lãi hợp đồng
+    assert slope == pytest.approx(0.0001)               # Sau đáo hạn: lãi không kỳ hạn
+
+
+def test_accrual_is_zero_before_min_days_hold():
+    result = accrue(TERM, datetime.date(2024, 1, 21))
+    assert result['accrued_cents'] == 0
+    assert not result['early_withdrawal_eligible']
+
+
+def test_accrual_before_maturity_uses_non_term_rate():
+    result = accrue(TERM, datetime.date(2024, 3, 1))     # 60 ngày
+    assert result['accrued_cents'] == round(PRINCIPAL_CENTS * 0.01 * 60 / 365)
+    assert not result['matured']
+    assert result['early_withdrawal_eligible']
+
+
+def test_accrual_after_maturity_adds_non_term_tail():
+    at_maturity = accrue(TERM, datetime.date(2024, 7, 1))
+    assert at_maturity['matured']
+    assert str(at_maturity['maturity_date']) == '2024-07-01'
+    contract = PRINCIPAL_CENTS * 0.06 * 182 / 365
+    assert at_maturity['accrued_cents'] == round(contract)
+
+    later = accrue(TERM, datetime.date(2024, 7, 11))
+    assert later['accrued_cents'] == round(contract + PRINCIPAL_CENTS * 0.01 * 10 / 365)
+
+
+def test_non_term_accrual_has_no_maturity():
+    result = accrue(NON_TERM, datetime.date(2024, 3, 1))
+    assert result['accrued_cents'] == round(PRINCIPAL_CENTS * 0.01 * 60 / 365)
+    assert np.isnat(result['maturity_date'])
+    assert not result['matured']
+
+
+@pytest.mark.parametrize('as_of', [
+    datetime.date(2024, 1, 21), datetime.date(2024, 3, 1),
+    datetime.date(2024, 7, 1), datetime.date(2025, 2, 1),
+])
+def test_accrual_matches_payout_quote(monkeypatch, as_of):
+    products = {p['product_id']: p for p in (TERM, NON_TERM)}
+    monkeypatch.setattr(interest, 'get_products_by_id', lambda: products)
+    monkeypatch.setattr(interest, 'non_term_rate', lambda: NON_TERM_RATE)
+
+    rows = [(10, 2, Decimal('1000000.00'), OPENED, 'ACTIVE'),
+            (11, 1, Decimal('1000000.00'), OPENED, 'ACTIVE')]
+    quotes = interest.quote_accounts(rows, as_of)
+
+    for quote, product in zip(quotes, (TERM, NON_TERM)):
+        assert round(quote['interest'] * 100) == accrue(product, as_of)['accrued_cents']
+
+
+def test_quote_rejects_closed_or_unknown_accounts(monkeypatch):
+    monkeypatch.setattr(interest, 'get_products_by_id', lambda: {2: TERM})
+    monkeypatch.setattr(interest, 'non_term_rate', lambda: NON_TERM_RATE)
+
+    quotes = interest.quote_accounts([(10, 2, Decimal('5.00'), OPENED, 'CLOSED'),
+                                      (11, 99, Decimal('5.00'), OPENED, 'ACTIVE')],
+                                     datetime.date(2024, 2, 1))
+    assert all('error' in q for q in quotes)
+
+
+def test_run_accrual_updates_only_active_accounts(monkeypatch, make_cursor, fake_conn):
+    class Cursor(make_cursor):
+        def executemany(self, sql, rows):
+            self.executed.append((' '.join(sql.split()), list(rows)))
+
+    accounts = [(7, 2, Decimal('1000000.00'), datetime.datetime(2024, 1, 1, 9, 30))]
+    cursor = Cursor([('FROM savings_accounts', lambda p: (accounts if p[0] == 0 else [], 1))])
+    fake_conn.cursor = lambda: cursor
+    monkeypatch.setattr(interest, 'get_products', lambda: [dict(NON_TERM, is_active=True), dict(TERM, is_active=True)])
+
+    as_of = datetime.date(2024, 3, 1)
+    assert interest.run_accrual(fake_conn, as_of=as_of) == 1
+
+    sql, rows = cursor.executed[1]
+    # Cập nhật tại chỗ, không INSERT: sổ vừa tất toán (status khác ACTIVE) không bị ghi đè hay tạo lại
+    assert sql.startswith('UPDATE savings_accounts SET accrued_interest = %s')
+    assert sql.endswith("WHERE account_id = %s AND status = 'ACTIVE'")
+    expected = accrue(TERM, as_of)
+    assert rows == [(interest._cents_to_str(expected['accrued_cents']), expected['maturity_date'].astype(object),
+                     bool(expected['early_withdrawal_eligible']), as_of, 7)]
+    assert fake_conn.commits == 1
@@ -0,0 +1,190 @@
+import contextlib
+
+import pytest
+
+flask = pytest.importorskip('flask')
+pytest.importorskip('mysql.connector')
+
+from common import jobs
+
+
+class JobsTable:
+    """Bảng jobs giả: job_id -> dict(status, attempt, cancel_requested). `stale` giả lập heartbeat quá hạn."""
+
+    def __init__(self, make_cursor, fake_conn):
+        self.rows = {}
+        self.stale = False
+        self.snapshot = None    # Kết quả SELECT cố định: giả lập runner đọc trước khi runner khác kịp nhận
+        self.conn = fake_conn
+        self.cursor = make_cursor([
+            ('SELECT job_id, job_type, params, created_by, attempt FROM jobs', self._select_queued),
+            ("SET status = 'RUNNING'", self._claim),
+            ('attempt = attempt - 1', self._requeue),
+            ("SET status = 'FAILED', error = 'Runner", self._reclaim_failed),
+            ("SET status = 'QUEUED'", self._reclaim),
+            ('UPDATE jobs SET heartbeat_at = NOW()', self._heartbeat),
+            ('SELECT cancel_requested', lambda p: ([(self.rows[p[0]]['cancel_requested'],)], 1)),
+            ('UPDATE jobs SET progress', lambda p: ([], 1)),
+            ('SET status = %s, result', self._finish),
+        ])
+        self.cursor.lastrowid = None
+        self.conn.cursor = lambda: self.cursor
+
+    def add(self, job_id, job_type='noop'):
+        self.rows[job_id] = {'job_type': job_type, 'status': 'QUEUED', 'attempt': 0,
+                             'cancel_requested': False}
+
+    def _select_queued(self, params):
+        if self.snapshot is not None:
+            return self.snapshot, len(self.snapshot)
+        rows = [(job_id, row['job_type'], '{}', 1, row['attempt'])
+                for job_id, row in sorted(self.rows.items()) if row['status'] == 'QUEUED']
+        return rows[:params[0]], len(rows)
+
+    def _claim(self, params):
+        _, job_id, attempt = params
+        row = self.rows[job_id]
+        if row['status'] != 'QUEUED' or row['attempt'] != attempt:
+            return [], 0
+        row.update(status='RUNNING', attempt=attempt + 1)
+        return [], 1
+
+    def _requeue(self, params):
+        _, job_id, attempt = params
+        row = self.rows[job_id]
+        if row['status'] != 'RUNNING' or row['attempt'] != attempt:
+            return [], 0
+        row.update(status='QUEUED', attempt=attempt - 1)
+        return [], 1
+
+    def _reclaim_failed(self, params):
+        _, _, max_attempts = params
+        matched = [row for row in self.rows.values()
+                   if self.stale and row['status'] == 'RUNNING' and row['attempt'] >= max_attempts]
+        for row in matched:
+            row['status'] = 'FAILED'
+        return [], len(matched)
+
+    def _reclaim(self, params):
+        matched = [row for row in self.rows.values() if self.stale and row['status'] == 'RUNNING']
+        for row in matched:
+            row['status'] = 'QUEUED'
+        return [], len(matched)
+
+    def _heartbeat(self, params):
+        job_id, attempt = params
+        row = self.rows[job_id]
+        return [], int(row['status'] == 'RUNNING' and row['attempt'] == attempt)
+
+    def _finish(self, params):
+        status, _, _, _, _, job_id, attempt = params
+        row = self.rows[job_id]
+        if row['status'] != 'RUNNING' or row['attempt'] != attempt:
+            return [], 0
+        row['status'] = status
+        return [], 1
+
+    @contextlib.contextmanager
+    def connection(self, timeout=None):
+        yield self.conn
+
+
+class Executor:
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, fn, *args):
+        self.submitted.append(args)
+
+
+@pytest.fixture
+def table(monkeypatch, make_cursor, fake_conn):
+    table = JobsTable(make_cursor, fake_conn)
+    monkeypatch.setattr(jobs, 'get_pool', lambda: table)
+    monkeypatch.setattr(jobs, '_active', {})
+    monkeypatch.setitem(jobs._handlers, 'noop', (lambda ctx: {}, frozenset(['ADMIN'])))
+    jobs._shutting_down.clear()
+    return table
+
+
+@pytest.fixture
+def app():
+    return flask.Flask('test-jobs')
+
+
+def test_only_one_runner_claims_a_job(table, app):
+    table.add(1)
+    runner_a, runner_b = Executor(), Executor()
+
+    # Cả hai runner cùng đọc thấy job 1 QUEUED, nhưng chỉ một runner đổi được sang RUNNING
+    rows = table._select_queued((10,))[0]
+    assert jobs.claim_jobs(app, runner_a, 10) == 1
+    table.snapshot = rows
+    assert jobs.claim_jobs(app, runner_b, 10) == 0
+
+    assert len(runner_a.submitted) == 1
+    assert runner_a.submitted[0][-1] == 1     # attempt
+    assert table.rows[1]['status'] == 'RUNNING'
+
+
+def test_stale_runner_loses_job_and_cannot_overwrite_result(table, app):
+    table.add(1)
+    jobs.claim_jobs(app, Executor(), 10)
+    old = jobs.JobContext(1, 'noop', {}, 1, attempt=1)
+
+    # Runner cũ treo quá JOB_STALE_SECONDS: runner khác thu hồi và nhận lại job
+    table.stale = True
+    assert jobs.reclaim_stale_jobs() == (1, 0)
+    table.stale = False
+    jobs.claim_jobs(app, Executor(), 10)
+    assert table.rows[1]['attempt'] == 2
+
+    with pytest.raises(jobs.JobLeaseLost):
+        old.check_cancelled()
+
+    # Lần chạy cũ kết thúc sau đó cũng không ghi đè trạng thái của lần chạy mới
+    jobs._run_job(app, 1, 'noop', {}, 1, attempt=1)
+    assert table.rows[1]['status'] == 'RUNNING'
+    jobs._run_job(app, 1, 'noop', {}, 1, attempt=2)
+    assert table.rows[1]['status'] == 'SUCCEEDED'
+
+
+def test_graceful_shutdown_requeues_without_using_an_attempt(table, app, monkeypatch):
+    def interrupted(ctx):
+        raise jobs.JobInterrupted()
+
+    monkeypatch.setitem(jobs._handlers, 'noop', (interrupted, frozenset(['ADMIN'])))
+    table.add(1)
+    jobs.claim_jobs(app, Executor(), 10)
+
+    jobs._run_job(app, 1, 'noop', {}, 1, attempt=1)
+
+    assert table.rows[1] == {'job_type': 'noop', 'status': 'QUEUED', 'attempt': 0, 'cancel_requested': False}
+
+
+def test_job_failing_repeatedly_is_not_requeued_forever(table, app, monkeypatch):
+    monkeypatch.setattr(jobs, 'JOB_MAX_ATTEMPTS', 2)
+    table.add(1)
+    table.stale = True
+    for _ in range(2):
+        jobs.claim_jobs(app, Executor(), 10)
+        jobs.reclaim_stale_jobs()
+
+    assert table.rows[1]['status'] == 'FAILED'
+    assert table.rows[1]['attempt'] == 2
+
+
+def test_periodic_tasks_run_in_runner_app_context(monkeypatch, app):
+    calls = []
+    monkeypatch.setattr(jobs, '_periodic', [])
+
+    @jobs.periodic_task(60)
+    def task():
+        calls.append(flask.current_app.name)
+        jobs._shutting_down.set()
+
+    jobs._shutting_down.clear()
+    jobs._periodic_loop(app)
+    jobs._shutting_down.clear()
+
+    assert calls == ['test-jobs']
@@ -0,0 +1,58 @@
+from decimal import Decimal
+
+import pytest
+
+from common import ledger
+
+
+def test_delta_goes_to_one_random_slot(make_cursor):
+    cursor = make_cursor([('UPDATE system_balances', lambda p: ([], 1))])
+
+    for _ in range(50):
+        ledger.apply_balance_delta(cursor, wallet_delta=Decimal('10.00'), savings_delta=Decimal('-10.00'))
+
+    slots = {params[2] for _, params in cursor.executed}
+    assert slots <= set(range(1, ledger.BALANCE_SLOTS + 1))
+    assert len(slots) > 1
+    assert all(params[:2] == (Decimal('10.00'), Decimal('-10.00')) for _, params in cursor.executed)
+
+
+def test_missing_slot_row_is_created_instead_of_losing_the_delta(make_cursor):
+    cursor = make_cursor([
+        ('UPDATE system_balances', lambda p: ([], 0)),
+        ('INSERT INTO system_balances', lambda p: ([], 1)),
+    ])
+
+    ledger.apply_balance_delta(cursor, wallet_delta=5)
+
+    (_, update), (insert_sql, insert) = cursor.executed
+    assert 'ON DUPLICATE KEY UPDATE' in insert_sql
+    assert insert == update
+
+
+def test_reconcile_fix_moves_totals_into_first_slot(make_cursor):
+    cursor = make_cursor([
+        ('FROM users', lambda p: ([(Decimal('900.00'),)], 1)),
+        ("FROM savings_accounts WHERE status = 'ACTIVE'", lambda p: ([(Decimal('300.00'),)], 1)),
+        ('SELECT SUM(total_wallet_balance)', lambda p: ([(Decimal('950.00'), Decimal('300.00'))], 1)),
+        ('INSERT INTO system_balances', lambda p: ([], ledger.BALANCE_SLOTS)),
+    ])
+
+    report = ledger.reconcile(cursor, fix=True)
+
+    assert report['total_wallet_balance']['drift'] == Decimal('50.00')
+    values = cursor.executed[-1][1]
+    rows = [values[i:i + 3] for i in range(0, len(values), 3)]
+    assert rows[0] == (1, Decimal('900.00'), Decimal('300.00'))
+    assert rows[1:] == [(slot, 0, 0) for slot in range(2, ledger.BALANCE_SLOTS + 1)]
+
+
+@pytest.mark.parametrize('row, expected', [
+    ((Decimal('1.00'), Decimal('2.00')), (Decimal('1.00'), Decimal('2.00'))),
+    ((None, None), None),      # Chưa có dòng slot nào
+])
+def test_get_balances_sums_slots(make_cursor, row, expected):
+    cursor = make_cursor([('SELECT SUM(total_wallet_balance)', lambda p: ([row], 1))])
+
+    assert ledger.get_balances(cursor) == expected
+    assert cursor.executed[0][1] == (ledger.BALANCE_SLOTS,)
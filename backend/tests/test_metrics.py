@@ -0,0 +1,63 @@
+import json
+
+import pytest
+
+flask = pytest.importorskip('flask')
+pytest.importorskip('jwt')
+pytest.importorskip('mysql.connector')
+
+from common import metrics
+
+DEAD_PID = 2 ** 22 + 1     # Lớn hơn pid_max mặc định: chắc chắn không có tiến trình này
+
+
+@pytest.fixture
+def metrics_dir(monkeypatch, tmp_path):
+    monkeypatch.setattr(metrics, 'METRICS_DIR', str(tmp_path))
+    return tmp_path
+
+
+def write_worker(metrics_dir, pid, slow):
+    (metrics_dir / f'metrics-{pid}.json').write_text(json.dumps({
+        'db_slow_queries_total': {json.dumps(['staff.approve']): slow},
+    }))
+
+
+def slow_total(series):
+    return series['db_slow_queries_total'][json.dumps(['staff.approve'])]
+
+
+def test_collect_sums_every_worker(metrics_dir):
+    write_worker(metrics_dir, 1, 2)          # pid 1 luôn còn sống
+    write_worker(metrics_dir, DEAD_PID, 3)
+    assert slow_total(metrics.collect()) == 5
+
+
+def test_dead_workers_are_archived_without_losing_counts(metrics_dir):
+    write_worker(metrics_dir, 1, 2)
+    write_worker(metrics_dir, DEAD_PID, 3)
+
+    metrics.archive_dead_workers()
+
+    assert not (metrics_dir / f'metrics-{DEAD_PID}.json').exists()
+    assert (metrics_dir / 'metrics-1.json').exists()
+    assert slow_total(metrics.collect()) == 5
+
+
+def test_histograms_merge_bucket_by_bucket(metrics_dir):
+    histogram = metrics.Histogram('h', 'test', ('endpoint',), (1, 2))
+    assert histogram.merge([[1, 2], 1.5, 2], [[0, 1], 1.8, 1]) == [[1, 3], 3.3, 3]
+
+
+def test_metrics_require_authorization(metrics_dir, monkeypatch):
+    monkeypatch.setattr(metrics, 'METRICS_TOKEN', 'secret')
+    app = flask.Flask(__name__)
+    app.config['SECRET_KEY'] = 'test'
+    metrics.init_app(app)
+    client = app.test_client()
+
+    assert client.get('/api/metrics').status_code == 401
+    assert client.get('/api/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+    response = client.get('/api/metrics', headers={'Authorization': 'Bearer secret'})
+    assert response.status_code == 200
+    assert b'# TYPE db_slow_queries_total counter' in response.data
@@ -0,0 +1,50 @@
+import pytest
+
+pytest.importorskip('flask')
+pytest.importorskip('mysql.connector')
+
+from common.pagination import (
+    DEFAULT_LIMIT, MAX_LIMIT, CursorError, keyset_clause, keyset_params, make_cursor, parse_page_args
+)
+
+
+def test_parse_page_args_defaults():
+    assert parse_page_args({}) == (None, DEFAULT_LIMIT)
+    assert parse_page_args({}, streaming=True) == (None, None)
+
+
+def test_parse_page_args_reads_cursor_and_clamps_limit():
+    after, limit = parse_page_args({'after': '2024-05-01 10:00:00,42', 'limit': '100000'})
+    assert after == ('2024-05-01 10:00:00', 42)
+    assert limit == MAX_LIMIT
+
+
+def test_parse_page_args_streaming_keeps_large_limit():
+    assert parse_page_args({'limit': '100000'}, streaming=True) == (None, 100000)
+
+
+@pytest.mark.parametrize('args', [
+    {'after': 'abc'},
+    {'after': 'not-a-date,1'},
+    {'after': '2024-05-01 10:00:00,x'},
+    {'limit': 'ten'},
+    {'limit': '0'},
+])
+def test_parse_page_args_rejects_bad_input(args):
+    with pytest.raises(CursorError):
+        parse_page_args(args)
+
+
+def test_cursor_round_trip():
+    item = {'created_at': '2024-05-01 10:00:00', 'user_id': 7}
+    cursor = make_cursor(item, 'created_at', 'user_id')
+    after, _ = parse_page_args({'after': cursor})
+    assert after == ('2024-05-01 10:00:00', 7)
+
+
+def test_keyset_clause_and_params_match():
+    clause = keyset_clause('t.created_at', 't.transaction_id')
+    params = keyset_params(('2024-05-01 10:00:00', 9))
+    assert clause == " AND (t.created_at < %s OR (t.created_at = %s AND t.transaction_id < %s))"
+    assert clause.count('%s') == len(params)
+    assert params == ['2024-05-01 10:00:00', '2024-05-01 10:00:00', 9]
@@ -0,0 +1,131 @@
+import contextlib
+import types
+
+import pytest
+
+flask = pytest.importorskip('flask')
+pytest.importorskip('mysql.connector')
+
+from common import ratelimit
+from common.ratelimit import TokenBucketLimiter
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(ratelimit, 'time', types.SimpleNamespace(monotonic=lambda: now[0]))
+    return now
+
+
+def test_burst_up_to_capacity_then_wait(clock):
+    limiter = TokenBucketLimiter(rate=2, capacity=3)
+    assert [limiter.acquire('u1')[0] for _ in range(3)] == [True, True, True]
+
+    allowed, retry_after = limiter.acquire('u1')
+    assert not allowed
+    assert retry_after == pytest.approx(0.5)
+
+
+def test_tokens_refill_over_time_but_not_above_capacity(clock):
+    limiter = TokenBucketLimiter(rate=1, capacity=2)
+    limiter.acquire('u1')
+    limiter.acquire('u1')
+    assert not limiter.acquire('u1')[0]
+
+    clock[0] += 1
+    assert limiter.acquire('u1') == (True, 0.0)
+
+    clock[0] += 3600
+    assert [limiter.acquire('u1')[0] for _ in range(3)] == [True, True, False]
+
+
+def test_buckets_are_per_key_and_reset(clock):
+    limiter = TokenBucketLimiter(rate=1, capacity=1)
+    assert limiter.acquire('u1')[0]
+    assert not limiter.acquire('u1')[0]
+    assert limiter.acquire('u2')[0]
+
+    limiter.reset('u1')
+    assert limiter.acquire('u1')[0]
+
+
+def test_oldest_buckets_are_evicted(clock):
+    limiter = TokenBucketLimiter(rate=1, capacity=1, max_keys=2)
+    for key in ('a', 'b', 'c'):
+        limiter.acquire(key)
+    assert list(limiter._buckets) == ['b', 'c']
+
+
+class BucketTable:
+    """Bảng rate_limit_buckets giả, đồng hồ MySQL điều khiển bằng `now`."""
+
+    def __init__(self, make_cursor, fake_conn):
+        self.rows = {}
+        self.now = 1000.0
+        self.conn = fake_conn
+        self.cursor = make_cursor([
+            ('INSERT IGNORE INTO rate_limit_buckets', self._insert),
+            ('SELECT tokens, updated_at', self._select),
+            ('UPDATE rate_limit_buckets', self._update),
+            ('DELETE FROM rate_limit_buckets', lambda p: ([], 0)),
+        ])
+        self.conn.cursor = lambda: self.cursor
+
+    def _insert(self, params):
+        key, capacity = params
+        self.rows.setdefault(key, (capacity, self.now))
+        return [], 1
+
+    def _select(self, params):
+        tokens, updated_at = self.rows[params[0]]
+        return [(tokens, updated_at, self.now)], 1
+
+    def _update(self, params):
+        tokens, now, key = params
+        self.rows[key] = (tokens, now)
+        return [], 1
+
+    @contextlib.contextmanager
+    def connection(self, timeout=None):
+        yield self.conn
+
+
+@pytest.fixture
+def bucket_table(monkeypatch, make_cursor, fake_conn):
+    table = BucketTable(make_cursor, fake_conn)
+    monkeypatch.setattr(ratelimit, 'get_pool', lambda: table)
+    monkeypatch.setattr(ratelimit, 'BUCKET_PRUNE_PROBABILITY', 0)
+    return table
+
+
+def test_shared_limiter_uses_one_bucket_for_all_workers(bucket_table):
+    # Hai instance (hai worker) cùng tên dùng chung một bucket
+    worker_a = ratelimit.SharedTokenBucketLimiter('slips', rate=1, capacity=2)
+    worker_b = ratelimit.SharedTokenBucketLimiter('slips', rate=1, capacity=2)
+
+    assert worker_a.acquire(7)[0]
+    assert worker_b.acquire(7)[0]
+    allowed, retry_after = worker_a.acquire(7)
+    assert not allowed
+    assert retry_after == pytest.approx(1.0)
+    assert list(bucket_table.rows) == ['slips:7']
+
+    bucket_table.now += 1
+    assert worker_b.acquire(7) == (True, 0.0)
+
+
+def test_rate_limit_skips_exempt_requests(bucket_table):
+    limiter = ratelimit.SharedTokenBucketLimiter('slips', rate=1, capacity=1)
+    retry = {'value': False}
+
+    @ratelimit.rate_limit(limiter, exempt=lambda: retry['value'])
+    def view():
+        return 'ok'
+
+    app = flask.Flask(__name__)
+    with app.test_request_context():
+        flask.request.user_data = {'user_id': 7}
+        assert view() == 'ok'
+        assert view()[1] == 429
+        retry['value'] = True
+        assert view() == 'ok'      # Gửi lại phiếu đã lập: không bị chặn, không tiêu token
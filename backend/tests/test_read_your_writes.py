@@ -0,0 +1,64 @@
+import time
+import types
+
+import pytest
+
+flask = pytest.importorskip('flask')
+pytest.importorskip('mysql.connector')
+
+from common import db
+
+SECRET = 'test-secret-key-for-unit-tests-only'
+
+
+@pytest.fixture
+def app(monkeypatch):
+    monkeypatch.setattr(db, 'REPLICA_HOSTS', ['replica-1:3306'])
+    app = flask.Flask('test-read-your-writes')
+    app.config['SECRET_KEY'] = SECRET
+    db.init_app(app)
+    return app
+
+
+def test_last_write_token_is_bound_to_user_and_signature():
+    token = db.sign_last_write(7, 1700000000.5, SECRET)
+
+    assert db.read_last_write(token, 7, SECRET) == 1700000000.5
+    assert db.read_last_write(token, 8, SECRET) is None            # Token của user khác
+    assert db.read_last_write(token, 7, 'other-secret-key-for-tests') is None
+    written_ms, _, signature = token.partition('.')
+    assert db.read_last_write(f'{int(written_ms) + 1}.{signature}', 7, SECRET) is None
+    assert db.read_last_write('abc', 7, SECRET) is None
+
+
+def test_commit_returns_signed_last_write(app, fake_conn):
+    @app.route('/write')
+    def write():
+        flask.request.user_data = {'user_id': 7}
+        db.InstrumentedConnection(fake_conn).commit()
+        return 'ok'
+
+    response = app.test_client().get('/write')
+
+    token = response.headers[db.LAST_WRITE_HEADER]
+    assert db.recently_wrote(token, 7, SECRET)
+    assert f'{db.LAST_WRITE_COOKIE}={token}' in response.headers['Set-Cookie']
+
+
+def test_read_only_request_uses_primary_right_after_a_write(app, monkeypatch):
+    replica = types.SimpleNamespace(available=True)
+    monkeypatch.setattr(db, 'get_replicas', lambda: [replica])
+
+    def pick(headers):
+        with app.test_request_context(headers=headers):
+            flask.request.user_data = {'user_id': 7}
+            flask.g.db_read_only = True
+            return db._pick_replica()
+
+    fresh = db.sign_last_write(7, time.time(), SECRET)
+    old = db.sign_last_write(7, time.time() - db.READ_STICKY_SECONDS - 1, SECRET)
+
+    assert pick({db.LAST_WRITE_HEADER: fresh}) is None
+    assert pick({'Cookie': f'{db.LAST_WRITE_COOKIE}={fresh}'}) is None
+    assert pick({db.LAST_WRITE_HEADER: old}) is replica
+    assert pick({}) is replica
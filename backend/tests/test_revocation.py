@@ -0,0 +1,43 @@
+import pytest
+
+pytest.importorskip('flask')
+pytest.importorskip('jwt')
+pytest.importorskip('mysql.connector')
+
+from common import requireRole
+
+
+@pytest.fixture(autouse=True)
+def clean_state(monkeypatch):
+    monkeypatch.setattr(requireRole, '_token_versions', {})
+    monkeypatch.setattr(requireRole, '_revoked_before', {})
+    monkeypatch.setattr(requireRole, '_locked_users', set())
+    monkeypatch.setattr(requireRole.events, 'publish', lambda *args: None)
+
+
+def test_revocation_does_not_depend_on_iat_second():
+    # Token cũ và token mới cấp cùng một giây với lần đổi role: chỉ phân biệt được bằng ver
+    old_token = {'user_id': 7, 'role': 'STAFF', 'ver': 0, 'iat': 1700000000}
+    new_token = {'user_id': 7, 'role': 'CUSTOMER', 'ver': 1, 'iat': 1700000000}
+
+    requireRole.revoke_user_tokens(7, 1)
+
+    assert requireRole.check_revoked(old_token) == (
+        'Phiên đăng nhập đã hết hiệu lực, vui lòng đăng nhập lại!', 401)
+    assert requireRole.check_revoked(new_token) is None
+    assert requireRole.check_revoked({'user_id': 8, 'ver': 0}) is None
+
+
+def test_older_revocation_event_does_not_lower_version():
+    requireRole._apply_auth_event(None, 'revoked', {'user_id': 7, 'token_version': 3})
+    requireRole._apply_auth_event(None, 'revoked', {'user_id': 7, 'token_version': 2})   # Phát lại sự kiện cũ
+
+    assert requireRole.check_revoked({'user_id': 7, 'ver': 2}) is not None
+    assert requireRole.check_revoked({'user_id': 7, 'ver': 3}) is None
+
+
+def test_legacy_revocation_event_only_applies_to_tokens_without_version():
+    requireRole._apply_auth_event(None, 'revoked', {'user_id': 7, 'revoked_at': 1700000000})
+
+    assert requireRole.check_revoked({'user_id': 7, 'iat': 1699999999}) is not None
+    assert requireRole.check_revoked({'user_id': 7, 'ver': 0, 'iat': 1699999999}) is None
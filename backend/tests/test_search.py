@@ -0,0 +1,40 @@
+import pytest
+
+from common.search import build_user_search, normalize_name
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('Nguyễn Văn Đức', 'nguyen van duc'),
+    ('  TRẦN   thị  Ánh ', 'tran thi anh'),
+    ('', ''),
+    (None, ''),
+])
+def test_normalize_name(text, expected):
+    assert normalize_name(text) == expected
+
+
+def test_search_by_email_prefix_escapes_like():
+    where_sql, where_params, order_sql, order_params = build_user_search('a_b@gmail.com')
+    assert 'email LIKE %s' in where_sql
+    assert where_params == ['a\\_b@gmail.com%']
+    assert order_params == ['a_b@gmail.com']
+
+
+def test_search_by_identity_card():
+    where_sql, where_params, _, order_params = build_user_search(' 0790 ')
+    assert 'identity_card LIKE %s' in where_sql
+    assert where_params == ['0790%']
+    assert order_params == ['0790']
+
+
+def test_search_by_name_uses_fulltext_on_normalized_words():
+    where_sql, where_params, order_sql, order_params = build_user_search('Nguyễn Vă')
+    assert 'MATCH(full_name_search)' in where_sql
+    assert where_params == ['+nguyen +va*']
+    assert order_params == where_params
+    assert order_sql.endswith('DESC, user_id DESC')
+
+
+@pytest.mark.parametrize('text', ['', '   ', '!!!'])
+def test_search_rejects_empty_input(text):
+    assert build_user_search(text) is None
@@ -0,0 +1,249 @@
+from decimal import Decimal
+
+import pytest
+
+pytest.importorskip('flask')
+pytest.importorskip('mysql.connector')
+pytest.importorskip('numpy')
+
+from staff import staff
+
+
+class Bank:
+    """Trạng thái DB giả cho các đường duyệt/từ chối phiếu (một khách hàng, các phiếu và sổ)."""
+
+    def __init__(self, wallet, role='CUSTOMER'):
+        self.user = {'user_id': 1, 'wallet': Decimal(wallet), 'role': role}
+        self.txns = {}
+        self.accounts = {}
+        self.balance_deltas = []
+
+    def slip(self, transaction_id, transaction_type, amount, account_id=None, status='PENDING'):
+        self.txns[transaction_id] = {'type': transaction_type, 'amount': Decimal(amount),
+                                     'account_id': account_id, 'status': status}
+
+    def account(self, account_id, principal, status='ACTIVE'):
+        self.accounts[account_id] = {'principal': Decimal(principal), 'status': status}
+
+    # ---- Đường duyệt từng phiếu (_approve / _reject)
+
+    def _slip_with_user(self, params):
+        txn = self.txns.get(params[0])
+        if not txn:
+            return [], 0
+        return [(1, txn['account_id'], txn['amount'], txn['type'], txn['status'], self.user['role'])], 1
+
+    def _slip_status(self, params):
+        txn = self.txns.get(params[0])
+        return ([(txn['status'], txn['type'], txn['account_id'])], 1) if txn else ([], 0)
+
+    def _active_principal(self, params):
+        account = self.accounts.get(params[0])
+        if account and account['status'] == 'ACTIVE':
+            return [(account['principal'],)], 1
+        return [], 0
+
+    def _close_account(self, params):
+        self.accounts[params[0]]['status'] = 'CLOSED'
+        return [], 1
+
+    def _from_pending(self, status):
+        def handler(params):
+            account = self.accounts.get(params[0])
+            if not account or account['status'] != 'PENDING':
+                return [], 0
+            account['status'] = status
+            return [], 1
+        return handler
+
+    def _debit(self, params):
+        amount = params[0]
+        if self.user['wallet'] < amount:
+            return [], 0
+        self.user['wallet'] -= amount
+        return [], 1
+
+    def _credit(self, params):
+        self.user['wallet'] += params[0]
+        return [], 1
+
+    def _set_status(self, status):
+        def handler(params):
+            staff_id, transaction_id = params
+            txn = self.txns[transaction_id]
+            if txn['status'] != 'PENDING':
+                return [], 0
+            txn['status'] = status
+            return [], 1
+        return handler
+
+    def _balances(self, params):
+        self.balance_deltas.append((params[0], params[1]))
+        return [], 1
+
+    def cursor(self, make_cursor):
+        return make_cursor([
+            ('FROM transactions t JOIN users u', self._slip_with_user),
+            ('SELECT status, transaction_type, account_id FROM transactions', self._slip_status),
+            ('SELECT principal_balance FROM savings_accounts', self._active_principal),
+            ("SET status = 'ACTIVE', opened_at = NOW() WHERE account_id = %s AND status = 'PENDING'",
+             self._from_pending('ACTIVE')),
+            ("SET status = 'CLOSED' WHERE account_id = %s AND status = 'PENDING'", self._from_pending('CLOSED')),
+            ("UPDATE savings_accounts SET status = 'CLOSED' WHERE account_id = %s", self._close_account),
+            ('wallet_balance = wallet_balance - %s', self._debit),
+            ('wallet_balance = wallet_balance + %s', self._credit),
+            ("SET status = 'APPROVED'", self._set_status('APPROVED')),
+            ("SET status = 'REJECTED'", self._set_status('REJECTED')),
+            ('UPDATE system_balances', self._balances),
+        ])
+
+
+@pytest.fixture
+def db(monkeypatch, make_cursor, fake_conn):
+    def install(bank):
+        cursor = bank.cursor(make_cursor)
+        monkeypatch.setattr(staff, 'db_cursor', cursor)
+        monkeypatch.setattr(staff, 'db_conn', fake_conn)
+        return cursor
+    return install
+
+
+def test_approve_close_savings_pays_principal_once(db, fake_conn):
+    bank = Bank('0')
+    bank.account(7, '500.00')
+    bank.slip(1, 'CLOSE_SAVINGS', '520.00', account_id=7)
+    bank.slip(2, 'CLOSE_SAVINGS', '520.00', account_id=7)
+    db(bank)
+
+    assert staff._approve(1, staff_id=99)[1] == 200
+    assert bank.accounts[7]['status'] == 'CLOSED'
+    assert bank.user['wallet'] == Decimal('520.00')
+    assert bank.balance_deltas == [(Decimal('520.00'), Decimal('-500.00'))]
+
+    body, code = staff._approve(2, staff_id=99)
+    assert code == 409
+    assert body['message'] == staff.CLOSED_ACCOUNT_MESSAGE
+    assert bank.user['wallet'] == Decimal('520.00')
+    assert bank.txns[2]['status'] == 'PENDING'
+    assert fake_conn.rollbacks == 1
+
+
+def test_approve_withdraw_requires_funds(db, fake_conn):
+    bank = Bank('100.00')
+    bank.slip(1, 'WITHDRAW_FROM_WALLET', '150.00')
+    db(bank)
+
+    body, code = staff._approve(1, staff_id=99)
+    assert code == 400
+    assert body['message'] == staff.INSUFFICIENT_FUNDS_MESSAGES['WITHDRAW_FROM_WALLET']
+    assert bank.user['wallet'] == Decimal('100.00')
+    assert bank.balance_deltas == []
+    assert (fake_conn.commits, fake_conn.rollbacks) == (0, 1)
+
+
+def test_approve_deposit_updates_system_wallet_for_customers_only(db):
+    bank = Bank('0', role='STAFF')
+    bank.slip(1, 'DEPOSIT_TO_WALLET', '50.00')
+    db(bank)
+
+    assert staff._approve(1, staff_id=99)[1] == 200
+    assert bank.user['wallet'] == Decimal('50.00')
+    assert bank.balance_deltas == []      # Ví của nhân viên không tính vào tổng ví hệ thống
+
+
+def test_approve_rejects_processed_or_missing_slip(db):
+    bank = Bank('0')
+    bank.slip(1, 'DEPOSIT_TO_WALLET', '50.00', status='APPROVED')
+    db(bank)
+
+    assert staff._approve(1, staff_id=99)[1] == 400
+    assert staff._approve(404, staff_id=99)[1] == 404
+    assert bank.user['wallet'] == 0
+
+
+def test_approve_open_savings_activates_account(db):
+    bank = Bank('1000.00')
+    bank.account(7, '300.00', status='PENDING')
+    bank.slip(1, 'OPEN_SAVINGS', '300.00', account_id=7)
+    db(bank)
+
+    assert staff._approve(1, staff_id=99)[1] == 200
+    assert bank.accounts[7]['status'] == 'ACTIVE'
+    assert bank.user['wallet'] == Decimal('700.00')
+    assert bank.balance_deltas == [(Decimal('-300.00'), Decimal('300.00'))]
+
+
+def test_reject_open_savings_cancels_pending_account(db):
+    bank = Bank('0')
+    bank.account(7, '300.00', status='PENDING')
+    bank.slip(1, 'OPEN_SAVINGS', '300.00', account_id=7)
+    db(bank)
+
+    assert staff._reject(1, staff_id=99)[1] == 200
+    assert bank.txns[1]['status'] == 'REJECTED'
+    assert bank.accounts[7]['status'] == 'CLOSED'
+    assert bank.balance_deltas == []      # Sổ chưa từng có tiền
+
+
+def test_close_before_open_is_approved_pays_nothing(db, fake_conn):
+    bank = Bank('0')
+    bank.account(7, '300.00', status='PENDING')
+    bank.slip(1, 'OPEN_SAVINGS', '300.00', account_id=7)
+    bank.slip(2, 'CLOSE_SAVINGS', '300.00', account_id=7)
+    db(bank)
+
+    body, code = staff._approve(2, staff_id=99)
+    assert code == 409
+    assert body['message'] == staff.CLOSED_ACCOUNT_MESSAGE
+    assert staff._reject(1, staff_id=99)[1] == 200
+
+    assert bank.user['wallet'] == 0
+    assert bank.accounts[7]['status'] == 'CLOSED'
+    assert bank.balance_deltas == []
+
+
+def test_batch_close_savings_twice_in_one_batch_pays_once(monkeypatch, make_cursor):
+    cursor = make_cursor([
+        ('FROM transactions WHERE transaction_id IN',
+         lambda p: ([(1, 1, 7, Decimal('520.00'), 'CLOSE_SAVINGS', 'PENDING'),
+                     (2, 1, 7, Decimal('520.00'), 'CLOSE_SAVINGS', 'PENDING')], 2)),
+        ('FROM users WHERE user_id IN', lambda p: ([(1, Decimal('0'), 'CUSTOMER')], 1)),
+        ('FROM savings_accounts WHERE account_id IN', lambda p: ([(7, Decimal('500.00'), 'ACTIVE')], 1)),
+        ('UPDATE', lambda p: ([], 1)),
+    ])
+    monkeypatch.setattr(staff, 'db_cursor', cursor)
+
+    results = staff.process_transaction_batch(
+        [{'transaction_id': 1, 'action': 'approve'}, {'transaction_id': 2, 'action': 'approve'}],
+        staff_id=99,
+    )
+
+    assert [r['success'] for r in results] == [True, False]
+    assert results[1]['message'] == staff.CLOSED_ACCOUNT_MESSAGE
+    wallet_update = next(params for sql, params in cursor.executed if sql.startswith('UPDATE users'))
+    assert wallet_update == (1, Decimal('520.00'), 1)
+    balance_update = next(params for sql, params in cursor.executed if 'system_balances' in sql)
+    assert balance_update[:2] == (Decimal('520.00'), Decimal('-500.00'))
+
+
+def test_batch_open_then_close_in_one_batch(monkeypatch, make_cursor):
+    cursor = make_cursor([
+        ('FROM transactions WHERE transaction_id IN',
+         lambda p: ([(1, 1, 7, Decimal('300.00'), 'CLOSE_SAVINGS', 'PENDING'),
+                     (2, 1, 7, Decimal('300.00'), 'OPEN_SAVINGS', 'PENDING')], 2)),
+        ('FROM users WHERE user_id IN', lambda p: ([(1, Decimal('1000.00'), 'CUSTOMER')], 1)),
+        ('FROM savings_accounts WHERE account_id IN', lambda p: ([(7, Decimal('300.00'), 'PENDING')], 1)),
+        ('UPDATE', lambda p: ([], 1)),
+    ])
+    monkeypatch.setattr(staff, 'db_cursor', cursor)
+
+    # Phiếu tất toán đứng trước phiếu mở sổ: bị từ chối; mở sổ vẫn được duyệt
+    results = staff.process_transaction_batch(
+        [{'transaction_id': 1, 'action': 'approve'}, {'transaction_id': 2, 'action': 'approve'}],
+        staff_id=99,
+    )
+    assert [r['success'] for r in results] == [False, True]
+    assert results[0]['message'] == staff.CLOSED_ACCOUNT_MESSAGE
+    assert any(sql.startswith("UPDATE savings_accounts SET status = 'ACTIVE'") for sql, _ in cursor.executed)
+    balance_update = next(params for sql, params in cursor.executed if 'system_balances' in sql)
+    assert balance_update[:2] == (Decimal('-300.00'), Decimal('300.00'))
@@ -0,0 +1,49 @@
+import pytest
+
+flask = pytest.importorskip('flask')
+jwt = pytest.importorskip('jwt')
+pytest.importorskip('mysql.connector')
+
+from common.requireRole import issue_ticket, require_role, verify_token
+
+STAFF = {'user_id': 5, 'role': 'STAFF'}
+
+
+@pytest.fixture
+def app():
+    app = flask.Flask(__name__)
+    app.config['SECRET_KEY'] = 'test-secret-key-for-unit-tests-only'
+
+    @app.route('/stream')
+    @require_role(['STAFF'], ticket_purpose='transactions-stream')
+    def stream():
+        return 'ok'
+
+    @app.route('/list')
+    @require_role(['STAFF'])
+    def listing():
+        return 'ok'
+
+    return app
+
+
+def test_ticket_only_valid_for_its_purpose(app):
+    with app.app_context():
+        ticket = issue_ticket(STAFF, 'transactions-stream')
+        assert verify_token(ticket, purpose='transactions-stream')['user_id'] == 5
+        with pytest.raises(jwt.InvalidTokenError):
+            verify_token(ticket)                          # Không dùng thay token đăng nhập
+        with pytest.raises(jwt.InvalidTokenError):
+            verify_token(ticket, purpose='exports')
+
+
+def test_stream_accepts_ticket_but_not_login_token_in_url(app):
+    client = app.test_client()
+    with app.app_context():
+        ticket = issue_ticket(STAFF, 'transactions-stream')
+        login_token = jwt.encode(dict(STAFF), 'test-secret-key-for-unit-tests-only', algorithm='HS256')
+
+    assert client.get(f'/stream?ticket={ticket}').status_code == 200
+    assert client.get(f'/stream?ticket={login_token}').status_code == 401
+    assert client.get(f'/stream?token={login_token}').status_code == 401
+    assert client.get('/list', headers={'Authorization': f'Bearer {ticket}'}).status_code == 401
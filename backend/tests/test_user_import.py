@@ -0,0 +1,73 @@
+import io
+from decimal import Decimal
+
+import pytest
+
+pytest.importorskip('flask')
+pytest.importorskip('mysql.connector')
+
+from common.user_import import ImportFormatError, _clean, read_rows
+
+
+def test_clean_normalizes_row():
+    record, error = _clean({
+        'email': ' a@example.com ', 'password': 'secret', 'full_name': ' Nguyễn An ',
+        'role': 'customer', 'wallet_balance': '100.005', 'identity_card': '',
+    })
+    assert error is None
+    assert record == {
+        'email': 'a@example.com',
+        'password': 'secret',
+        'full_name': 'Nguyễn An',
+        'identity_card': None,
+        'role': 'CUSTOMER',
+        'wallet_balance': Decimal('100.00'),
+    }
+
+
+def test_clean_defaults_role_and_balance():
+    record, error = _clean({'email': 'b@example.com', 'password': 'x', 'full_name': 'B', 'wallet_balance': 5})
+    assert error is None
+    assert record['role'] == 'CUSTOMER'
+    assert record['wallet_balance'] == Decimal('5.00')
+
+
+@pytest.mark.parametrize('row', [
+    {'email': 'a@example.com', 'password': '', 'full_name': 'A'},
+    {'email': 'not-an-email', 'password': 'x', 'full_name': 'A'},
+    {'email': 'a@example.com', 'password': 'x', 'full_name': 'A', 'role': 'ROOT'},
+    {'email': 'a@example.com', 'password': 'x', 'full_name': 'A', 'wallet_balance': 'abc'},
+    {'email': 'a@example.com', 'password': 'x', 'full_name': 'A', 'wallet_balance': '-1'},
+    {'email': 'a@example.com', 'password': 'x', 'full_name': 'A', 'role': 'STAFF', 'wallet_balance': '10'},
+])
+def test_clean_rejects_invalid_rows(row):
+    record, error = _clean(row)
+    assert record is None
+    assert error
+
+
+def test_read_rows_csv():
+    text = io.StringIO('email,password,full_name\na@example.com,x,A\nb@example.com,y,B\n')
+    rows = list(read_rows(text, 'csv'))
+    assert [(line, row['email'], error) for line, row, error in rows] == [
+        (2, 'a@example.com', None),
+        (3, 'b@example.com', None),
+    ]
+
+
+def test_read_rows_csv_requires_columns():
+    with pytest.raises(ImportFormatError):
+        list(read_rows(io.StringIO('email,full_name\na@example.com,A\n'), 'csv'))
+
+
+def test_read_rows_ndjson_reports_bad_lines():
+    text = io.StringIO('{"email": "a@example.com"}\n\nnot json\n[1, 2]\n')
+    rows = list(read_rows(text, 'ndjson'))
+    assert rows[0] == (1, {'email': 'a@example.com'}, None)
+    assert [(line, row) for line, row, _ in rows[1:]] == [(3, None), (4, None)]
+    assert all(error for _, _, error in rows[1:])
+
+
+def test_read_rows_unknown_format():
+    with pytest.raises(ImportFormatError):
+        list(read_rows(io.StringIO(''), 'xml'))
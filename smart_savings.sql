@@ -70,4 +70,23 @@ CREATE TABLE transactions (
 
     FOREIGN KEY (user_id) REFERENCES users(user_id),
     FOREIGN KEY (processed_by) REFERENCES users(user_id)
-);
\ No newline at end of file
+);
+
+-- ==========================================
+-- 6. BẢNG TỔNG SỐ DƯ HỆ THỐNG (Cập nhật cùng transaction khi duyệt phiếu)
+-- ==========================================
+CREATE TABLE system_balances (
+    balance_id TINYINT PRIMARY KEY, -- Slot 1..16: mỗi lần ghi cộng vào 1 slot ngẫu nhiên, tổng = SUM các dòng
+    total_wallet_balance DECIMAL(18, 2) NOT NULL DEFAULT 0.00, -- Tổng ví của CUSTOMER
+    total_savings_principal DECIMAL(18, 2) NOT NULL DEFAULT 0.00, -- Tổng gốc các sổ ACTIVE
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
+
+INSERT INTO system_balances (balance_id) VALUES
+    (1), (2), (3), (4), (5), (6), (7), (8), (9), (10), (11), (12), (13), (14), (15), (16);
+
+-- ==========================================
+-- Index và các thay đổi schema tiếp theo nằm trong backend/migrations/
+-- Sau khi chạy file này: cd backend && flask --app app db-upgrade
+-- Kiểm tra truy vấn nóng có dùng index: flask --app app explain-check
+-- ==========================================